@@ -2,9 +2,11 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlmodel import Session, select
 from typing import List, Optional
-from models import User
-from database import get_session
+from models import User, Farmaceutica, Distribuidor, SUS, UBS, Paciente
+from database import run_db
+from cache import CacheTTL
 import jwt
+import os
 from datetime import datetime, timedelta
 
 # Configurações JWT
@@ -14,6 +16,41 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 1440  # 24 horas
 
 security = HTTPBearer()
 
+# Perfil de domínio de cada tipo de usuário (admin não tem perfil a resolver)
+PERFIS = {
+    "farmaceutica": Farmaceutica,
+    "distribuidor": Distribuidor,
+    "sus": SUS,
+    "ubs": UBS,
+    "paciente": Paciente,
+}
+
+# Perfis já resolvidos, por id de usuário
+cache_perfis = CacheTTL(
+    maxsize=int(os.getenv("CACHE_PERFIS_MAX", "4096")),
+    ttl=float(os.getenv("CACHE_PERFIS_TTL", "300"))
+)
+
+# Usuários ativos já autenticados, por id. TTL curto: é o atraso máximo para um processo
+# enxergar uma revogação (versao_token) feita por outro processo. Usuários inativos não
+# entram no cache: a ativação (cadastro do perfil) pode acontecer em outro processo.
+cache_usuarios = CacheTTL(
+    maxsize=int(os.getenv("CACHE_USUARIOS_MAX", "4096")),
+    ttl=float(os.getenv("CACHE_USUARIOS_TTL", "60"))
+)
+
+# Modo stateless: o token só é aceito se versao_token e tipo conferem com as colunas do
+# usuário em cache_versoes, sem carregar a linha inteira. Nome, e-mail e ativo vêm dessas
+# colunas, nunca do token (mudam sem revogar os tokens já emitidos). Revogações feitas
+# em outro processo valem após o TTL desse cache.
+AUTH_STATELESS = os.getenv("AUTH_STATELESS", "false").lower() in ("1", "true", "sim")
+
+# (versao_token, tipo, ativo, nome, email) por id de usuário ativo, para o modo stateless
+cache_versoes = CacheTTL(
+    maxsize=int(os.getenv("CACHE_USUARIOS_MAX", "4096")),
+    ttl=float(os.getenv("CACHE_USUARIOS_TTL", "60"))
+)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Cria um token JWT"""
     to_encode = data.copy()
@@ -27,6 +64,15 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 
+def claims_usuario(user: User) -> dict:
+    """Claims que identificam o usuário no token (usadas pelo modo stateless)"""
+    return {
+        "sub": str(user.id),
+        "tipo": user.tipo,
+        "ver": user.versao_token,
+    }
+
+
 def decode_access_token(token: str):
     """Decodifica um token JWT"""
     try:
@@ -45,28 +91,148 @@ def decode_access_token(token: str):
 
 
 
+def _usuario_da_versao(user_id: int, versao: tuple) -> User:
+    """Monta o usuário a partir das colunas guardadas em cache_versoes"""
+    versao_token, tipo, ativo, nome, email = versao
+    return User(
+        id=user_id,
+        nome=nome,
+        email=email,
+        senha_hash="",
+        tipo=tipo,
+        ativo=ativo,
+        versao_token=versao_token
+    )
+
+
+def _buscar_usuario(session: Session, user_id: int) -> Optional[User]:
+    return session.get(User, user_id)
+
+
+def _buscar_versao(session: Session, user_id: int) -> Optional[tuple]:
+    """Só as colunas usadas pelo modo stateless: (versao_token, tipo, ativo, nome, email)"""
+    return session.exec(
+        select(User.versao_token, User.tipo, User.ativo, User.nome, User.email)
+        .where(User.id == user_id)
+    ).first()
+
+
+async def _versao_usuario(user_id: int) -> Optional[tuple]:
+    versao = cache_versoes.get(user_id)
+    if versao is None:
+        versao = await run_db(_buscar_versao, user_id)
+        if versao is None:
+            return None
+        versao = tuple(versao)
+        # Como em cache_usuarios, inativos são sempre relidos
+        if versao[2]:
+            cache_versoes.set(user_id, versao)
+    return versao
+
+
 async def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    session: Session = Depends(get_session)
+    credentials: HTTPAuthorizationCredentials = Depends(security)
 ) -> User:
     """Dependency para obter o usuário atual a partir do token"""
     token = credentials.credentials
     payload = decode_access_token(token)
     
-    user_id: int = payload.get("sub")
+    user_id = payload.get("sub")
 
     if user_id is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Credenciais inválidas"
         )
-    
-    user = session.get(User, user_id)
-    if user is None:
+    user_id = int(user_id)
+
+    em_cache = cache_usuarios.get(user_id)
+    if em_cache is not None:
+        user = User.model_validate({**em_cache, "senha_hash": ""})
+    elif AUTH_STATELESS and "tipo" in payload:
+        # Tokens com o tipo dispensam carregar o usuário, desde que ele ainda exista
+        # com a mesma versão de token e o mesmo tipo
+        versao = await _versao_usuario(user_id)
+        if versao is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Usuário não encontrado"
+            )
+        if versao[:2] != (payload.get("ver", 0), payload["tipo"]):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Token revogado"
+            )
+        return _usuario_da_versao(user_id, versao)
+    else:
+        # Sem bloquear o event loop: sessão assíncrona ou threadpool (ver run_db)
+        user = await run_db(_buscar_usuario, user_id)
+        if user is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Usuário não encontrado"
+            )
+        # O hash da senha não fica em memória; quem precisar dele busca no banco
+        if user.ativo:
+            cache_usuarios.set(user_id, user.model_dump(exclude={"senha_hash"}))
+
+    if user.versao_token != payload.get("ver", 0):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Usuário não encontrado"
+            detail="Token revogado"
         )
     
     return user
 
+
+def invalidar_usuario(*ids_usuario: int):
+    """Remove do cache os usuários e seus perfis (chamar ao alterar, ativar ou excluir usuários)"""
+    cache_usuarios.invalidate(*ids_usuario)
+    cache_versoes.invalidate(*ids_usuario)
+    cache_perfis.invalidate(*ids_usuario)
+
+
+def invalidar_perfil(*ids_usuario: int):
+    """Remove do cache o perfil dos usuários (chamar ao criar, alterar ou excluir perfis)"""
+    cache_perfis.invalidate(*ids_usuario)
+
+
+async def get_current_profile(current_user: User = Depends(get_current_user)):
+    """
+    Dependency que resolve o perfil de domínio (Farmaceutica, SUS, UBS...) do usuário atual.
+    Retorna None se o usuário ainda não tem perfil cadastrado.
+    """
+    if current_user.tipo not in PERFIS:
+        return None
+
+    perfil = _perfil_em_cache(current_user)
+    if perfil is not None:
+        return perfil
+    return await run_db(carregar_perfil, current_user)
+
+
+def _perfil_em_cache(user: User):
+    # Guardamos só os dados: a instância pertence à sessão da requisição que a carregou
+    modelo = PERFIS.get(user.tipo)
+    em_cache = cache_perfis.get(user.id)
+    if em_cache is not None and em_cache[0] is modelo:
+        return modelo.model_validate(em_cache[1])
+    return None
+
+
+def carregar_perfil(session: Session, user: User):
+    """Perfil de domínio do usuário, passando pelo cache de perfis"""
+    modelo = PERFIS.get(user.tipo)
+    if modelo is None:
+        return None
+
+    perfil = _perfil_em_cache(user)
+    if perfil is not None:
+        return perfil
+
+    perfil = session.exec(
+        select(modelo).where(modelo.id_usuario == user.id)
+    ).first()
+    if perfil is not None:
+        cache_perfis.set(user.id, (modelo, perfil.model_dump()))
+    return perfil
@@ -1,6 +1,15 @@
 from enum import Enum
-from typing import List, Set
-from fastapi import HTTPException, status
+from functools import reduce
+from operator import or_
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple
+from fastapi import Depends, HTTPException, status
+from sqlalchemy import true
+from sqlmodel import select
+from models import (
+    User, UBS, Paciente, Medicamento, Lote, Feedback,
+    DistribuidorParaSUS, SUSParaUBS, UBSParaPaciente
+)
+from auth.dependencies import PERFIS, get_current_user, get_current_profile
 
 class UserType(str, Enum):
     ADMIN = "admin"
@@ -189,50 +198,188 @@ PERMISSIONS_MAP: dict[UserType, Set[Permission]] = {
 }
 
 
+# -------------------------
+# Tabela compilada (montada uma vez, na importação)
+# -------------------------
+# Um bit por permissão e por tipo de usuário
+BIT_PERMISSAO: Dict[Permission, int] = {permissao: 1 << i for i, permissao in enumerate(Permission)}
+BIT_TIPO: Dict[str, int] = {tipo.value: 1 << i for i, tipo in enumerate(UserType)}
+
+# Por tipo de usuário (como vem em User.tipo): máscara das permissões e a lista
+# imutável, em ordem fixa, devolvida no login e em /auth/me
+MASCARA_PERMISSOES: Dict[str, int] = {
+    tipo.value: reduce(or_, (BIT_PERMISSAO[permissao] for permissao in permissoes), 0)
+    for tipo, permissoes in PERMISSIONS_MAP.items()
+}
+LISTA_PERMISSOES: Dict[str, Tuple[str, ...]] = {
+    tipo.value: tuple(permissao.value for permissao in Permission if permissao in permissoes)
+    for tipo, permissoes in PERMISSIONS_MAP.items()
+}
+
+
 def has_permission(user_type: str, permission: Permission) -> bool:
     """Verifica se um tipo de usuário tem uma permissão específica"""
-    try:
-        user_type_enum = UserType(user_type)
-        return permission in PERMISSIONS_MAP.get(user_type_enum, set())
-    except ValueError:
-        return False
-
-
-def require_permissions(required_permissions: List[Permission]):
-    """Decorator para verificar permissões em rotas"""
-    def decorator(func):
-        async def wrapper(*args, **kwargs):
-            # Obtém o usuário atual dos kwargs (injetado por dependency)
-            current_user = kwargs.get('current_user')
-            
-            if not current_user:
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="Não autenticado"
-                )
-            
-            user_type = current_user.tipo
-            
-            # Verifica se o usuário tem todas as permissões necessárias
-            for permission in required_permissions:
-                if not has_permission(user_type, permission):
-                    raise HTTPException(
-                        status_code=status.HTTP_403_FORBIDDEN,
-                        detail=f"Sem permissão: {permission.value}"
-                    )
-            
-            return await func(*args, **kwargs)
-        return wrapper
-    return decorator
-
-
-def get_user_permissions(user_type: str) -> List[str]:
-    """Retorna todas as permissões de um tipo de usuário"""
-    try:
-        user_type_enum = UserType(user_type)
-        return [p.value for p in PERMISSIONS_MAP.get(user_type_enum, set())]
-    except ValueError:
-        return []
+    return bool(MASCARA_PERMISSOES.get(user_type, 0) & BIT_PERMISSAO[permission])
+
+
+def exigir_tipos(*tipos: UserType, detail: str = "Acesso restrito"):
+    """Dependência que libera a rota só para os tipos de usuário informados e devolve o usuário"""
+    mascara = reduce(or_, (BIT_TIPO[UserType(tipo).value] for tipo in tipos), 0)
+
+    async def verificar_tipo(current_user = Depends(get_current_user)):
+        if not BIT_TIPO.get(current_user.tipo, 0) & mascara:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=detail)
+        return current_user
+
+    return verificar_tipo
+
+
+# Chave primária de cada perfil de domínio e a mensagem quando ele ainda não foi cadastrado
+CHAVE_PERFIL: Dict[str, str] = {
+    tipo: modelo.__table__.primary_key.columns.values()[0].name for tipo, modelo in PERFIS.items()
+}
+PERFIL_NAO_ENCONTRADO: Dict[str, str] = {
+    "farmaceutica": "Farmacêutica não encontrada",
+    "distribuidor": "Distribuidor não encontrado",
+    "sus": "SUS não encontrado",
+    "ubs": "UBS não encontrada",
+    "paciente": "Paciente não encontrado",
+}
+
+
+class Escopo:
+    """Quem chama a rota, já autorizado: o usuário e o seu perfil de domínio (admin não tem)"""
+
+    def __init__(self, usuario: User, perfil=None):
+        self.usuario = usuario
+        self.perfil = perfil
+
+    @property
+    def tipo(self) -> str:
+        return self.usuario.tipo
+
+    @property
+    def admin(self) -> bool:
+        return self.usuario.tipo == UserType.ADMIN.value
+
+    @property
+    def id_perfil(self) -> Optional[int]:
+        """id_farmaceutica, id_sus, id_ubs... do perfil; None para admin (sem restrição)"""
+        if self.perfil is None:
+            return None
+        return getattr(self.perfil, CHAVE_PERFIL[self.tipo])
+
+    def filtrar(self, query, modelo):
+        """Restringe a consulta às linhas de modelo visíveis para quem chama"""
+        if self.admin:
+            return query
+        return query.where(compilar_escopo(self.tipo, self.id_perfil, modelo))
+
+    def consulta(self, modelo):
+        """select(modelo) já restrito ao escopo de quem chama"""
+        return self.filtrar(select(modelo), modelo)
+
+
+def require_permissions(
+    *permissoes: Permission,
+    tipos: Sequence[UserType] = (),
+    detail: str = "Sem permissão",
+):
+    """
+    Dependência que autoriza a rota pelos bits pré-calculados, antes de qualquer consulta:
+    tipo de usuário (se tipos for informado), permissões e cadastro ativo. Só então resolve
+    o perfil de domínio (404 se ainda não existe) e devolve o Escopo de quem chama.
+    """
+    mascara_tipos = reduce(or_, (BIT_TIPO[UserType(tipo).value] for tipo in tipos), 0)
+    mascara_permissoes = reduce(or_, (BIT_PERMISSAO[permissao] for permissao in permissoes), 0)
+
+    async def autorizar(current_user: User = Depends(get_current_user)) -> Escopo:
+        if mascara_tipos and not BIT_TIPO.get(current_user.tipo, 0) & mascara_tipos:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=detail)
+
+        faltando = mascara_permissoes & ~MASCARA_PERMISSOES.get(current_user.tipo, 0)
+        if faltando:
+            permissao = next(p for p in permissoes if BIT_PERMISSAO[p] & faltando)
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail=f"Sem permissão: {permissao.value}"
+            )
+
+        if not current_user.ativo:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Finalize seu cadastro")
+
+        if current_user.tipo not in PERFIS:
+            return Escopo(current_user)
+
+        perfil = await get_current_profile(current_user)
+        if perfil is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=PERFIL_NAO_ENCONTRADO.get(current_user.tipo, "Perfil não encontrado")
+            )
+        return Escopo(current_user, perfil)
+
+    return autorizar
+
+
+# -------------------------
+# Escopo de dados (linhas visíveis por tipo de usuário)
+# -------------------------
+def _medicamentos_da_farmaceutica(id_farmaceutica: int):
+    return select(Medicamento.id_medicamento).where(Medicamento.id_farmaceutica == id_farmaceutica)
+
+
+# Para cada modelo, o predicado por tipo de usuário em função do id do perfil. Os vínculos
+# indiretos (SUS → UBS → Paciente, farmacêutica → medicamento) viram semi-joins, então tudo
+# sai numa consulta só e usa os índices das chaves estrangeiras. Admin vê tudo; tipos
+# ausentes não veem nada.
+REGRAS_ESCOPO: Dict[type, Dict[str, Callable[[int], object]]] = {
+    DistribuidorParaSUS: {
+        "distribuidor": lambda id_perfil: DistribuidorParaSUS.id_distribuidor == id_perfil,
+        "sus": lambda id_perfil: DistribuidorParaSUS.id_sus == id_perfil,
+    },
+    SUSParaUBS: {
+        "sus": lambda id_perfil: SUSParaUBS.id_sus == id_perfil,
+        "ubs": lambda id_perfil: SUSParaUBS.id_ubs == id_perfil,
+    },
+    UBSParaPaciente: {
+        "ubs": lambda id_perfil: UBSParaPaciente.id_ubs == id_perfil,
+        "paciente": lambda id_perfil: UBSParaPaciente.id_paciente == id_perfil,
+    },
+    Paciente: {
+        "sus": lambda id_perfil: Paciente.id_ubs.in_(select(UBS.id_ubs).where(UBS.id_sus == id_perfil)),
+        "ubs": lambda id_perfil: Paciente.id_ubs == id_perfil,
+        "paciente": lambda id_perfil: Paciente.id_paciente == id_perfil,
+    },
+    Feedback: {
+        "farmaceutica": lambda id_perfil: Feedback.id_medicamento.in_(_medicamentos_da_farmaceutica(id_perfil)),
+        "paciente": lambda id_perfil: Feedback.id_paciente == id_perfil,
+    },
+    Lote: {
+        "farmaceutica": lambda id_perfil: Lote.id_medicamento.in_(_medicamentos_da_farmaceutica(id_perfil)),
+    },
+}
+
+
+def compilar_escopo(tipo: str, id_perfil: Optional[int], modelo):
+    """Predicado SQL com as linhas de modelo que o tipo de usuário, com esse perfil, pode ver"""
+    if tipo == UserType.ADMIN.value:
+        return true()
+
+    regra = REGRAS_ESCOPO[modelo].get(tipo)
+    if regra is None or id_perfil is None:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Sem permissão")
+    return regra(id_perfil)
+
+
+def exigir_escopo(modelo, detail: str = "Sem permissão"):
+    """require_permissions liberado para admin e para os tipos que têm escopo sobre o modelo"""
+    return require_permissions(tipos=[UserType.ADMIN, *REGRAS_ESCOPO[modelo]], detail=detail)
+
+
+def get_user_permissions(user_type: str) -> Tuple[str, ...]:
+    """Retorna todas as permissões de um tipo de usuário (lista pré-calculada, não alterar)"""
+    return LISTA_PERMISSOES.get(user_type, ())
 
 
 # Permissões específicas por recurso
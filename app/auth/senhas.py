@@ -0,0 +1,82 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+# Custo do scrypt: N (CPU e memória, potência de 2), r (tamanho do bloco) e p (paralelismo).
+# Memória por hash: 128 * N * r bytes (16 MiB no padrão). Hashes com outros parâmetros
+# continuam válidos e são refeitos com os atuais no próximo login.
+SCRYPT_N = int(os.getenv("SENHA_SCRYPT_N", str(2 ** 14)))
+SCRYPT_R = int(os.getenv("SENHA_SCRYPT_R", "8"))
+SCRYPT_P = int(os.getenv("SENHA_SCRYPT_P", "1"))
+
+TAMANHO_SAL = 16
+TAMANHO_HASH = 32
+
+# Hashes calculados ao mesmo tempo por worker: limita a CPU e a memória usadas pelos logins
+# (o scrypt libera o GIL, então as threads rodam em paralelo)
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("SENHA_HASH_THREADS", str(os.cpu_count() or 2))),
+    thread_name_prefix="senhas"
+)
+
+
+def _b64(dados: bytes) -> str:
+    return base64.b64encode(dados).decode()
+
+
+def _scrypt(senha: str, sal: bytes, n: int, r: int, p: int) -> bytes:
+    return hashlib.scrypt(
+        senha.encode(), salt=sal, n=n, r=r, p=p,
+        maxmem=256 * n * r * p, dklen=TAMANHO_HASH
+    )
+
+
+def _legado(senha_hash: str) -> bool:
+    """Hashes antigos: SHA-256 sem sal, em hexadecimal"""
+    return not senha_hash.startswith("scrypt$")
+
+
+def gerar_hash(senha: str) -> str:
+    """Hash da senha no formato scrypt$N$r$p$sal$hash (sal e hash em base64)"""
+    sal = os.urandom(TAMANHO_SAL)
+    derivado = _scrypt(senha, sal, SCRYPT_N, SCRYPT_R, SCRYPT_P)
+    return f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${_b64(sal)}${_b64(derivado)}"
+
+
+def verificar(senha: str, senha_hash: str) -> bool:
+    """Verifica a senha contra o hash guardado (scrypt ou SHA-256 legado), em tempo constante"""
+    if _legado(senha_hash):
+        return hmac.compare_digest(hashlib.sha256(senha.encode()).hexdigest(), senha_hash)
+
+    try:
+        _, n, r, p, sal, esperado = senha_hash.split("$")
+        derivado = _scrypt(senha, base64.b64decode(sal), int(n), int(r), int(p))
+    except ValueError:
+        return False
+    return hmac.compare_digest(derivado, base64.b64decode(esperado))
+
+
+def precisa_atualizar(senha_hash: str) -> bool:
+    """O hash é legado ou foi gerado com parâmetros diferentes dos atuais"""
+    return _legado(senha_hash) or not senha_hash.startswith(f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}$")
+
+
+async def gerar_hash_async(senha: str) -> str:
+    """gerar_hash no pool de hashing, sem bloquear o event loop"""
+    return await asyncio.get_running_loop().run_in_executor(_executor, gerar_hash, senha)
+
+
+async def verificar_async(senha: str, senha_hash: Optional[str]) -> bool:
+    """
+    verificar no pool de hashing. Sem hash (usuário inexistente) calcula um hash mesmo
+    assim, para que o tempo de resposta não revele quais emails estão cadastrados.
+    """
+    loop = asyncio.get_running_loop()
+    if senha_hash is None:
+        await loop.run_in_executor(_executor, gerar_hash, senha)
+        return False
+    return await loop.run_in_executor(_executor, verificar, senha, senha_hash)
@@ -0,0 +1,52 @@
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Hashable, Optional
+
+
+class CacheTTL:
+    """
+    Cache em memória limitado por tamanho (LRU) e por tempo de vida (TTL).
+    Seguro para uso entre threads; cada processo (worker) tem o seu.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._itens: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, chave: Hashable) -> Optional[Any]:
+        """Devolve o valor da chave, ou None se ausente ou expirado"""
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None:
+                return None
+
+            expira_em, valor = item
+            if expira_em < time.monotonic():
+                del self._itens[chave]
+                return None
+
+            self._itens.move_to_end(chave)
+            return valor
+
+    def set(self, chave: Hashable, valor: Any):
+        with self._lock:
+            self._itens[chave] = (time.monotonic() + self.ttl, valor)
+            self._itens.move_to_end(chave)
+            # Descarta os menos usados recentemente
+            while len(self._itens) > self.maxsize:
+                self._itens.popitem(last=False)
+
+    def invalidate(self, *chaves: Hashable):
+        with self._lock:
+            for chave in chaves:
+                self._itens.pop(chave, None)
+
+    def clear(self):
+        with self._lock:
+            self._itens.clear()
+
+    def __len__(self):
+        return len(self._itens)
@@ -0,0 +1,177 @@
+import hashlib
+import json
+import os
+import time
+from functools import lru_cache
+from threading import Lock
+from typing import Any, Dict, Optional, Tuple
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+from cache import CacheTTL
+from database import engine, replica_engine, REPLICA_ATRASO_MAXIMO
+
+# Respostas guardadas: (etag, corpo JSON já serializado, headers extras)
+RespostaGuardada = Tuple[str, bytes, Dict[str, str]]
+
+# Headers da resposta original que também são guardados (ex.: cursor da paginação)
+HEADERS_GUARDADOS = {"x-proximo-cursor"}
+
+ESCOPO_PUBLICO = "publico"
+
+
+class BackendMemoria:
+    """LRU em memória do processo (padrão). Cada worker invalida só o próprio cache."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._itens = CacheTTL(maxsize=maxsize, ttl=ttl)
+        self._versoes: Dict[str, int] = {}
+        self._invalidado_em: Dict[str, float] = {}
+        self._lock = Lock()
+
+    def versao(self, namespace: str) -> int:
+        return self._versoes.get(namespace, 0)
+
+    def incrementar(self, namespace: str, janela: float):
+        with self._lock:
+            self._versoes[namespace] = self._versoes.get(namespace, 0) + 1
+            self._invalidado_em[namespace] = time.monotonic()
+
+    def invalidado_recentemente(self, namespace: str, janela: float) -> bool:
+        return time.monotonic() - self._invalidado_em.get(namespace, float("-inf")) < janela
+
+    def get(self, chave: str) -> Optional[RespostaGuardada]:
+        return self._itens.get(chave)
+
+    def set(self, chave: str, valor: RespostaGuardada):
+        self._itens.set(chave, valor)
+
+
+class BackendRedis:
+    """Redis (ou compatível) compartilhado pelos workers: uma escrita invalida todos"""
+
+    def __init__(self, url: str, ttl: float):
+        import redis  # dependência opcional, só com CACHE_RESPOSTAS_URL
+
+        self._redis = redis.Redis.from_url(url)
+        self.ttl = int(ttl)
+
+    def versao(self, namespace: str) -> int:
+        versao = self._redis.get(f"versao:{namespace}")
+        return int(versao) if versao else 0
+
+    def incrementar(self, namespace: str, janela: float):
+        self._redis.incr(f"versao:{namespace}")
+        if janela > 0:
+            self._redis.set(f"invalidado:{namespace}", 1, px=int(janela * 1000))
+
+    def invalidado_recentemente(self, namespace: str, janela: float) -> bool:
+        return bool(self._redis.exists(f"invalidado:{namespace}"))
+
+    def get(self, chave: str) -> Optional[RespostaGuardada]:
+        valor = self._redis.get(chave)
+        if valor is None:
+            return None
+        etag, headers, corpo = valor.split(b"\n", 2)
+        return etag.decode(), corpo, json.loads(headers)
+
+    def set(self, chave: str, valor: RespostaGuardada):
+        etag, corpo, headers = valor
+        self._redis.set(
+            chave, b"\n".join([etag.encode(), json.dumps(headers).encode(), corpo]), ex=self.ttl
+        )
+
+
+@lru_cache(maxsize=None)
+def _adaptador(tipo) -> TypeAdapter:
+    return TypeAdapter(tipo)
+
+
+def _etag_confere(request: Request, etag: str) -> bool:
+    recebidas = request.headers.get("if-none-match")
+    if not recebidas:
+        return False
+    recebidas = {valor.strip().removeprefix("W/") for valor in recebidas.split(",")}
+    return etag in recebidas or "*" in recebidas
+
+
+class CacheRespostas:
+    """
+    Cache das respostas já serializadas de listagens pouco alteradas, por namespace.
+    Cada namespace tem uma versão na chave: as escritas a incrementam (invalidar),
+    e as respostas antigas deixam de ser encontradas e expiram pelo TTL.
+    """
+
+    def __init__(self, backend, janela_replica: float = 0):
+        self.backend = backend
+        # Logo após uma escrita a réplica pode ainda não tê-la: nesse intervalo as
+        # respostas não são guardadas, para não fixar dados antigos na nova versão
+        self.janela_replica = janela_replica
+
+    def buscar(self, request: Request, namespace: str, escopo: str = ESCOPO_PUBLICO) -> Tuple[Optional[Response], str]:
+        """
+        Resposta em cache para a requisição (200 ou 304 conforme If-None-Match), ou None.
+        Devolve também a chave, a ser passada para guardar() se não houver resposta.
+        """
+        consulta = "&".join(sorted(f"{nome}={valor}" for nome, valor in request.query_params.multi_items()))
+        chave = f"{namespace}:{self.backend.versao(namespace)}:{escopo}:{request.url.path}?{consulta}"
+
+        guardada = self.backend.get(chave)
+        if guardada is None:
+            return None, chave
+        return self._responder(request, guardada, escopo), chave
+
+    def guardar(
+        self,
+        request: Request,
+        chave: str,
+        conteudo: Any,
+        tipo,
+        response: Optional[Response] = None,
+        escopo: str = ESCOPO_PUBLICO,
+    ) -> Response:
+        """Serializa o conteúdo uma única vez, guarda na chave obtida em buscar() e responde"""
+        corpo = _adaptador(tipo).dump_json(conteudo)
+        etag = f'"{hashlib.blake2b(corpo, digest_size=16).hexdigest()}"'
+        headers = {}
+        if response is not None:
+            headers = {
+                nome: valor for nome, valor in response.headers.items()
+                if nome.lower() in HEADERS_GUARDADOS
+            }
+
+        guardada = (etag, corpo, headers)
+        namespace = chave.split(":", 1)[0]
+        if not (self.janela_replica and self.backend.invalidado_recentemente(namespace, self.janela_replica)):
+            self.backend.set(chave, guardada)
+        return self._responder(request, guardada, escopo)
+
+    def invalidar(self, *namespaces: str):
+        """Chamar após o commit das escritas que alteram os dados do namespace"""
+        for namespace in namespaces:
+            self.backend.incrementar(namespace, self.janela_replica)
+
+    def _responder(self, request: Request, guardada: RespostaGuardada, escopo: str) -> Response:
+        etag, corpo, headers = guardada
+        headers = {
+            **headers,
+            "ETag": etag,
+            # O cliente sempre revalida (If-None-Match); respostas com escopo são privadas
+            "Cache-Control": "no-cache" if escopo == ESCOPO_PUBLICO else "private, no-cache",
+        }
+        if _etag_confere(request, etag):
+            return Response(status_code=304, headers=headers)
+        return Response(content=corpo, media_type="application/json", headers=headers)
+
+
+def _criar_backend():
+    ttl = float(os.getenv("CACHE_RESPOSTAS_TTL", "60"))
+    url = os.getenv("CACHE_RESPOSTAS_URL")
+    if url:
+        return BackendRedis(url, ttl)
+    return BackendMemoria(maxsize=int(os.getenv("CACHE_RESPOSTAS_MAX", "2048")), ttl=ttl)
+
+
+cache_respostas = CacheRespostas(
+    _criar_backend(),
+    janela_replica=REPLICA_ATRASO_MAXIMO if replica_engine is not engine else 0
+)
@@ -1,7 +1,15 @@
-from sqlmodel import create_engine, Session, SQLModel
-from typing import Generator
+from sqlmodel import create_engine, Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+from starlette.concurrency import run_in_threadpool
+from typing import Any, Callable, Generator
+from threading import Lock
+from contextvars import ContextVar
 from dotenv import load_dotenv
+import importlib.util
 import os
+import time
 
 # Carrega variáveis do arquivo .env
 load_dotenv()
@@ -12,18 +20,226 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise ValueError("Variável de ambiente DATABASE_URL não definida no .env")
 
+# Só para desenvolvimento: aplica as migrações ao subir a aplicação.
+# Em produção rode "python app/migrate.py upgrade" uma vez por deploy.
+MIGRAR_AO_INICIAR = os.getenv("DB_MIGRAR_AO_INICIAR", "false").lower() in ("1", "true", "sim")
+
+# Perfis de configuração do engine. "dev" loga todas as consultas;
+# "prod" desliga o log e dimensiona o pool para vários workers.
+PERFIS_ENGINE = {
+    "dev": {
+        "echo": True,
+        "pool_size": 5,
+        "max_overflow": 10,
+        "pool_timeout": 30,
+        "pool_recycle": -1,
+        "pool_pre_ping": True,
+    },
+    "prod": {
+        "echo": False,
+        "pool_size": 10,
+        "max_overflow": 5,
+        "pool_timeout": 10,
+        "pool_recycle": 1800,
+        "pool_pre_ping": True,
+    },
+}
+DB_PROFILE = os.getenv("DB_PROFILE", "dev")
+
+# Variáveis de ambiente que sobrescrevem valores do perfil
+VARIAVEIS_ENGINE = {
+    "echo": ("DB_ECHO", bool),
+    "pool_size": ("DB_POOL_SIZE", int),
+    "max_overflow": ("DB_MAX_OVERFLOW", int),
+    "pool_timeout": ("DB_POOL_TIMEOUT", float),
+    "pool_recycle": ("DB_POOL_RECYCLE", int),
+    "pool_pre_ping": ("DB_POOL_PRE_PING", bool),
+}
+
+
+def configuracao_engine() -> dict:
+    """Parâmetros do engine: perfil escolhido em DB_PROFILE mais os ajustes do ambiente"""
+    if DB_PROFILE not in PERFIS_ENGINE:
+        raise ValueError(f"DB_PROFILE inválido: {DB_PROFILE}. Use: {', '.join(PERFIS_ENGINE)}")
+
+    config = dict(PERFIS_ENGINE[DB_PROFILE])
+    for parametro, (variavel, tipo) in VARIAVEIS_ENGINE.items():
+        valor = os.getenv(variavel)
+        if valor is None:
+            continue
+        if tipo is bool:
+            config[parametro] = valor.lower() in ("1", "true", "sim")
+        else:
+            config[parametro] = tipo(valor)
+    return config
+
+
+class PoolMedido(QueuePool):
+    """QueuePool que mede quantas conexões foram pedidas e quanto se esperou por elas"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._lock_metricas = Lock()
+        self.checkouts = 0
+        self.espera_total = 0.0
+        self.espera_maxima = 0.0
+        self.timeouts = 0
+
+    def _do_get(self):
+        inicio = time.perf_counter()
+        try:
+            return super()._do_get()
+        except Exception:
+            with self._lock_metricas:
+                self.timeouts += 1
+            raise
+        finally:
+            espera = time.perf_counter() - inicio
+            with self._lock_metricas:
+                self.checkouts += 1
+                self.espera_total += espera
+                self.espera_maxima = max(self.espera_maxima, espera)
+
+    def metricas(self) -> dict:
+        with self._lock_metricas:
+            return {
+                "tamanho": self.size(),
+                "em_uso": self.checkedout(),
+                "ociosas": self.checkedin(),
+                "overflow": self.overflow(),
+                "checkouts": self.checkouts,
+                "espera_media_ms": round(self.espera_total / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                "espera_maxima_ms": round(self.espera_maxima * 1000, 3),
+                "timeouts": self.timeouts,
+            }
+
+
+class PoolMedidoAssincrono(PoolMedido, AsyncAdaptedQueuePool):
+    """PoolMedido para o engine assíncrono"""
+
+
 # Cria engine do banco de dados
 engine = create_engine(
     DATABASE_URL,
-    echo=True,
-    pool_pre_ping=True
+    poolclass=PoolMedido,
+    **configuracao_engine()
 )
 
+# Réplica de leitura, opcional. Dashboards e listagens leem dela; escritas,
+# autenticação e /confirmar continuam no primário.
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL")
+
+replica_engine = engine
+if DATABASE_REPLICA_URL:
+    replica_engine = create_engine(
+        DATABASE_REPLICA_URL,
+        poolclass=PoolMedido,
+        **configuracao_engine()
+    )
+
+# Por quantos segundos, após uma escrita, o cliente volta a ler do primário
+# (read-your-writes). Deve cobrir o atraso de replicação.
+REPLICA_ATRASO_MAXIMO = int(os.getenv("DB_REPLICA_ATRASO_MAXIMO", "5"))
+
+# Definido por requisição (middleware em main.py): ler do primário mesmo nas rotas de leitura
+_ler_do_primario: ContextVar[bool] = ContextVar("ler_do_primario", default=False)
+
+# Engine assíncrono (asyncpg; aiosqlite em SQLite), opcional. Com ele as rotas assíncronas não ocupam
+# o threadpool enquanto esperam o banco: a concorrência passa a ser limitada pelo pool.
+DB_ASYNC = os.getenv("DB_ASYNC", "false").lower() in ("1", "true", "sim")
+
+# Driver assíncrono de cada banco: (dialeto do SQLAlchemy, pacote que precisa estar instalado)
+DRIVERS_ASSINCRONOS = {
+    "postgresql": ("postgresql+asyncpg", "asyncpg"),
+    "sqlite": ("sqlite+aiosqlite", "aiosqlite"),
+}
+
+
+def _criar_engine_assincrono(database_url: str):
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    url = make_url(database_url)
+    banco = url.get_backend_name()
+    if banco not in DRIVERS_ASSINCRONOS:
+        raise ValueError(f"DB_ASYNC não suporta o banco {banco}. Use: {', '.join(DRIVERS_ASSINCRONOS)}")
+
+    # Falha ao subir, com a instrução, em vez de na primeira consulta
+    driver, pacote = DRIVERS_ASSINCRONOS[banco]
+    if importlib.util.find_spec(pacote) is None:
+        raise ImportError(f"DB_ASYNC=true com {banco} requer o pacote {pacote}: pip install {pacote}")
+
+    return create_async_engine(
+        url.set(drivername=driver),
+        poolclass=PoolMedidoAssincrono,
+        **configuracao_engine()
+    )
+
+
+async_engine = None
+async_replica_engine = None
+if DB_ASYNC:
+    async_engine = _criar_engine_assincrono(DATABASE_URL)
+    async_replica_engine = async_engine
+    if DATABASE_REPLICA_URL:
+        async_replica_engine = _criar_engine_assincrono(DATABASE_REPLICA_URL)
+
 def create_db_and_tables():
-    """Cria todas as tabelas no banco de dados"""
-    SQLModel.metadata.create_all(engine)
+    """Aplica as migrações pendentes (tabelas, colunas e índices)"""
+    from migrations import aplicar_migracoes
+    aplicar_migracoes(engine)
 
 def get_session() -> Generator[Session, None, None]:
     """Dependency para obter sessão do banco de dados"""
     with Session(engine) as session:
-        yield session
\ No newline at end of file
+        yield session
+
+
+def ler_do_primario(ativo: bool = True):
+    """Faz as leituras da requisição atual irem ao primário (read-your-writes)"""
+    _ler_do_primario.set(ativo)
+
+
+def engine_leitura():
+    """Engine para consultas só de leitura: a réplica, salvo read-your-writes"""
+    return engine if _ler_do_primario.get() else replica_engine
+
+
+def get_read_session() -> Generator[Session, None, None]:
+    """Dependency para rotas só de leitura (listagens): sessão na réplica, se houver"""
+    with Session(engine_leitura()) as session:
+        yield session
+
+
+async def run_db(fn: Callable[..., Any], *args, leitura: bool = False) -> Any:
+    """
+    Executa fn(session, *args) sem bloquear o event loop.
+    Com DB_ASYNC usa a sessão assíncrona (run_sync); senão roda a função no threadpool.
+    Com leitura=True a consulta vai à réplica (se configurada).
+    Os objetos devolvidos continuam utilizáveis após o commit.
+    """
+    primario = not leitura or _ler_do_primario.get()
+
+    if async_engine is not None:
+        alvo = async_engine if primario else async_replica_engine
+        async with AsyncSession(alvo, expire_on_commit=False) as session:
+            return await session.run_sync(fn, *args)
+
+    alvo = engine if primario else replica_engine
+
+    def executar():
+        with Session(alvo, expire_on_commit=False) as session:
+            return fn(session, *args)
+
+    return await run_in_threadpool(executar)
+
+
+def metricas_pool() -> dict:
+    """Situação atual do pool de conexões deste processo"""
+    metricas = {"perfil": DB_PROFILE, **engine.pool.metricas()}
+    if replica_engine is not engine:
+        metricas["replica"] = replica_engine.pool.metricas()
+    if async_engine is not None:
+        metricas["assincrono"] = async_engine.pool.metricas()
+    if async_replica_engine is not async_engine:
+        metricas["assincrono_replica"] = async_replica_engine.pool.metricas()
+    return metricas
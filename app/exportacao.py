@@ -0,0 +1,79 @@
+import csv
+import io
+import json
+from datetime import datetime
+from fastapi import Query
+from fastapi.responses import StreamingResponse
+from sqlmodel import Session
+from database import engine_leitura
+
+# Linhas buscadas por vez no cursor do servidor e escritas por bloco na resposta
+LINHAS_POR_LOTE = 1000
+
+FORMATOS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+
+def parametro_formato(
+    formato: str = Query("ndjson", pattern="^(ndjson|csv)$", description="ndjson ou csv")
+) -> str:
+    return formato
+
+
+def _valor_json(valor):
+    if isinstance(valor, datetime):
+        return valor.isoformat()
+    return str(valor)
+
+
+def exportar(query, modelo, formato: str, nome_arquivo: str) -> StreamingResponse:
+    """
+    Transmite o resultado da consulta como NDJSON ou CSV sem montá-lo em memória.
+    A consulta (já com o escopo do usuário) é reescrita para buscar só as colunas
+    da tabela, em ordem de chave primária, usando cursor do lado do servidor.
+    """
+    tabela = modelo.__table__
+    colunas = list(tabela.columns)
+    chave = list(tabela.primary_key.columns)[0]
+
+    # Mantém os filtros da consulta original, trocando as entidades pelas colunas
+    consulta = (
+        query.with_only_columns(*colunas)
+        .order_by(chave)
+        .execution_options(yield_per=LINHAS_POR_LOTE)
+    )
+    nomes = [coluna.name for coluna in colunas]
+    # Decidido agora, dentro da requisição (réplica, salvo read-your-writes)
+    alvo = engine_leitura()
+
+    def linhas():
+        # Sessão própria: a da requisição é encerrada antes do fim da transmissão
+        with Session(alvo) as session:
+            # Execução direta na conexão: linhas simples, sem montar objetos do ORM
+            resultado = session.connection().execute(consulta)
+            buffer = io.StringIO()
+            escritor = csv.writer(buffer) if formato == "csv" else None
+            if escritor:
+                escritor.writerow(nomes)
+
+            for bloco in resultado.partitions():
+                for linha in bloco:
+                    if escritor:
+                        escritor.writerow(linha)
+                    else:
+                        buffer.write(json.dumps(dict(zip(nomes, linha)), default=_valor_json))
+                        buffer.write("\n")
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+
+            if buffer.tell():
+                yield buffer.getvalue()
+
+    return StreamingResponse(
+        linhas(),
+        media_type=FORMATOS[formato],
+        headers={"Content-Disposition": f'attachment; filename="{nome_arquivo}.{formato}"'}
+    )
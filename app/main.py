@@ -1,6 +1,16 @@
-from fastapi import FastAPI
+import time
+_inicio = time.perf_counter()
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from database import create_db_and_tables
+from database import (
+    create_db_and_tables, metricas_pool, async_engine, async_replica_engine, replica_engine,
+    engine, ler_do_primario, run_db, REPLICA_ATRASO_MAXIMO, MIGRAR_AO_INICIAR
+)
+from services.snapshots import atualizar_snapshots
+from services.estoque import EstoqueInsuficiente
+from services.validade import atualizar_situacao_lotes, INTERVALO_VARREDURA
 from routes import (
     user,   
     farmaceutica,
@@ -15,18 +25,70 @@ from routes import (
     auth,
     admin, 
     educacional,
-    movimentacoes
+    movimentacoes,
+    estoque
 )
 from contextlib import asynccontextmanager
+import asyncio
+import logging
+import os
+
+logger = logging.getLogger("uvicorn.error")
+
+# Intervalo (segundos) entre as atualizações dos snapshots dos dashboards; 0 desliga
+INTERVALO_SNAPSHOTS = float(os.getenv("DASHBOARD_SNAPSHOT_INTERVALO", "30"))
+
+
+async def atualizar_snapshots_periodicamente():
+    """Recalcula em segundo plano os snapshots sujos ou velhos demais"""
+    while True:
+        await asyncio.sleep(INTERVALO_SNAPSHOTS)
+        try:
+            atualizados = await run_db(atualizar_snapshots)
+            if atualizados:
+                logger.info("Snapshots de dashboard atualizados: %s", atualizados)
+        except Exception:
+            logger.exception("Falha ao atualizar os snapshots dos dashboards")
+
+
+async def varrer_validade_periodicamente():
+    """Atualiza a faixa de vencimento dos lotes e registra cada transição uma única vez"""
+    while True:
+        try:
+            transicoes = await run_db(atualizar_situacao_lotes)
+            for situacao, lotes in transicoes.items():
+                logger.warning("Lotes que passaram para %s: %s", situacao, lotes)
+        except Exception:
+            logger.exception("Falha na varredura de validade dos lotes")
+        await asyncio.sleep(INTERVALO_VARREDURA)
+
 
 # Lifespan para startup/shutdown
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Código de startup
-    create_db_and_tables()
+    # O esquema é aplicado no deploy (python app/migrate.py upgrade), não a cada worker
+    if MIGRAR_AO_INICIAR:
+        create_db_and_tables()
+
+    app.state.tempo_inicializacao_ms = round((time.perf_counter() - _inicio) * 1000, 1)
+    logger.info("Aplicação pronta em %s ms", app.state.tempo_inicializacao_ms)
+
+    tarefa_snapshots = None
+    if INTERVALO_SNAPSHOTS > 0:
+        tarefa_snapshots = asyncio.create_task(atualizar_snapshots_periodicamente())
+    tarefa_validade = None
+    if INTERVALO_VARREDURA > 0:
+        tarefa_validade = asyncio.create_task(varrer_validade_periodicamente())
     yield
-    # Código de shutdown (opcional)
-    # Por exemplo: fechar conexões, limpar recursos, etc.
+    # Código de shutdown
+    for tarefa in (tarefa_snapshots, tarefa_validade):
+        if tarefa is not None:
+            tarefa.cancel()
+    if async_engine is not None:
+        await async_engine.dispose()
+    if async_replica_engine is not async_engine:
+        await async_replica_engine.dispose()
 
 # Criar aplicação FastAPI
 app = FastAPI(
@@ -43,8 +105,45 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Proximo-Cursor", "X-Total-Count"],
 )
 
+# Read-your-writes: depois de uma escrita o cliente lê do primário por alguns segundos
+# (cookie), ou quando pede explicitamente com o header X-Ler-Primario: 1
+COOKIE_LER_PRIMARIO = "ler_primario"
+HEADER_LER_PRIMARIO = "X-Ler-Primario"
+METODOS_LEITURA = {"GET", "HEAD", "OPTIONS"}
+
+@app.middleware("http")
+async def roteamento_replica(request: Request, call_next):
+    if replica_engine is engine:
+        return await call_next(request)
+
+    ler_do_primario(
+        request.headers.get(HEADER_LER_PRIMARIO) == "1"
+        or COOKIE_LER_PRIMARIO in request.cookies
+    )
+    response = await call_next(request)
+
+    if request.method not in METODOS_LEITURA and response.status_code < 400:
+        response.set_cookie(
+            COOKIE_LER_PRIMARIO, "1", max_age=REPLICA_ATRASO_MAXIMO, httponly=True, samesite="lax"
+        )
+    return response
+
+@app.exception_handler(EstoqueInsuficiente)
+async def estoque_insuficiente(request: Request, erro: EstoqueInsuficiente):
+    return JSONResponse(
+        status_code=409,
+        content={
+            "detail": "Estoque insuficiente para o envio",
+            "faltas": [
+                {"tipo_detentor": tipo, "id_detentor": id_detentor, "id_lote": id_lote}
+                for tipo, id_detentor, id_lote in erro.faltas
+            ]
+        }
+    )
+
 # Registrar todos os routers
 app.include_router(user.router)
 app.include_router(auth.router)
@@ -59,6 +158,7 @@ app.include_router(paciente.router)
 app.include_router(movimentacoes.router_dps)
 app.include_router(movimentacoes.router_spu)
 app.include_router(movimentacoes.router_upp)
+app.include_router(estoque.router)
 app.include_router(feedback.router)
 app.include_router(dashboard.router)
 app.include_router(educacional.router)
@@ -75,7 +175,15 @@ def read_root():
 
 @app.get("/health")
 def health_check():
-    return {"status": "healthy"}
+    return {
+        "status": "healthy",
+        "tempo_inicializacao_ms": getattr(app.state, "tempo_inicializacao_ms", None)
+    }
+
+@app.get("/health/pool")
+def health_pool():
+    """Métricas do pool de conexões deste worker, para dimensionar DB_POOL_SIZE"""
+    return metricas_pool()
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,31 @@
+import sys
+from database import engine
+from migrations import aplicar_migracoes, listar_migracoes, versoes_aplicadas
+
+
+def upgrade():
+    """Aplica as migrações pendentes"""
+    aplicadas = aplicar_migracoes(engine)
+    if not aplicadas:
+        print("Banco já está na versão mais recente")
+    for nome in aplicadas:
+        print(f"Aplicada: {nome}")
+
+
+def status():
+    """Lista as migrações e indica quais já foram aplicadas"""
+    with engine.begin() as conn:
+        ja_aplicadas = versoes_aplicadas(conn)
+    for versao, nome, _ in listar_migracoes():
+        marcador = "x" if versao in ja_aplicadas else " "
+        print(f"[{marcador}] {versao:04d}_{nome}")
+
+
+COMANDOS = {"upgrade": upgrade, "status": status}
+
+if __name__ == "__main__":
+    comando = sys.argv[1] if len(sys.argv) > 1 else "upgrade"
+    if comando not in COMANDOS:
+        print(f"Uso: python app/migrate.py [{'|'.join(COMANDOS)}]")
+        sys.exit(1)
+    COMANDOS[comando]()
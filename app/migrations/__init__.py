@@ -0,0 +1,54 @@
+import importlib
+import pkgutil
+from datetime import datetime
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, insert, select
+from sqlalchemy.engine import Connection, Engine
+
+# Tabela de controle das versões aplicadas (fora do metadata do SQLModel,
+# para não ser criada por engano junto com as tabelas da aplicação)
+_metadata = MetaData()
+schema_migracoes = Table(
+    "schema_migracoes",
+    _metadata,
+    Column("versao", Integer, primary_key=True),
+    Column("nome", String, nullable=False),
+    Column("aplicada_em", DateTime, nullable=False),
+)
+
+
+def listar_migracoes() -> list:
+    """Retorna as migrações do pacote ordenadas por versão: [(versao, nome, modulo)]"""
+    migracoes = []
+    for info in pkgutil.iter_modules(__path__):
+        if not info.name.startswith("v"):
+            continue
+        versao, _, nome = info.name[1:].partition("_")
+        modulo = importlib.import_module(f"{__name__}.{info.name}")
+        migracoes.append((int(versao), nome, modulo))
+    return sorted(migracoes, key=lambda migracao: migracao[0])
+
+
+def versoes_aplicadas(conn: Connection) -> set:
+    """Versões já registradas no banco"""
+    schema_migracoes.create(conn, checkfirst=True)
+    return set(conn.execute(select(schema_migracoes.c.versao)).scalars())
+
+
+def aplicar_migracoes(engine: Engine) -> list:
+    """Aplica, em uma única transação, as migrações ainda pendentes"""
+    aplicadas = []
+    with engine.begin() as conn:
+        # Impede que dois processos apliquem as mesmas migrações ao mesmo tempo
+        if conn.dialect.name == "postgresql":
+            conn.exec_driver_sql("SELECT pg_advisory_xact_lock(7358209)")
+
+        ja_aplicadas = versoes_aplicadas(conn)
+        for versao, nome, modulo in listar_migracoes():
+            if versao in ja_aplicadas:
+                continue
+            modulo.upgrade(conn)
+            conn.execute(
+                insert(schema_migracoes).values(versao=versao, nome=nome, aplicada_em=datetime.now())
+            )
+            aplicadas.append(f"{versao:04d}_{nome}")
+    return aplicadas
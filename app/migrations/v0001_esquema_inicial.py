@@ -0,0 +1,154 @@
+from sqlalchemy import (
+    Boolean, Column, DateTime, Float, ForeignKey, Integer, MetaData, String, Table, UniqueConstraint
+)
+from sqlalchemy.engine import Connection
+
+# Esquema desta versão, fixo: mudanças posteriores dos modelos entram em migrações novas.
+# Os índices ficam na v0003.
+_metadata = MetaData()
+
+Table(
+    "user", _metadata,
+    Column("id", Integer, primary_key=True),
+    Column("nome", String, nullable=False),
+    Column("email", String, nullable=False),
+    Column("senha_hash", String, nullable=False),
+    Column("tipo", String, nullable=False),
+    Column("ativo", Boolean, nullable=False),
+)
+Table(
+    "administrador", _metadata,
+    Column("id_administrador", Integer, primary_key=True),
+    Column("nome", String, nullable=False),
+    Column("email", String, nullable=False),
+    Column("contato", String, nullable=False),
+    Column("id_usuario", Integer, ForeignKey("user.id"), nullable=False),
+)
+Table(
+    "distribuidor", _metadata,
+    Column("id_distribuidor", Integer, primary_key=True),
+    Column("nome", String, nullable=False),
+    Column("localizacao", String, nullable=False),
+    Column("contato", String, nullable=False),
+    Column("id_usuario", Integer, ForeignKey("user.id"), nullable=False),
+)
+Table(
+    "farmaceutica", _metadata,
+    Column("id_farmaceutica", Integer, primary_key=True),
+    Column("nome", String, nullable=False),
+    Column("cnpj", String, nullable=False),
+    Column("contato", String, nullable=False),
+    Column("id_usuario", Integer, ForeignKey("user.id"), nullable=False),
+)
+Table(
+    "sus", _metadata,
+    Column("id_sus", Integer, primary_key=True),
+    Column("regiao", String, nullable=False),
+    Column("contato_gestor", String, nullable=False),
+    Column("nome_gestor", String, nullable=False),
+    Column("id_usuario", Integer, ForeignKey("user.id"), nullable=False),
+)
+Table(
+    "medicamento", _metadata,
+    Column("id_medicamento", Integer, primary_key=True),
+    Column("nome", String, nullable=False),
+    Column("ingestao", String),
+    Column("dosagem", String),
+    Column("preco", Float, nullable=False),
+    Column("alto_custo", Boolean, nullable=False),
+    Column("id_farmaceutica", Integer, ForeignKey("farmaceutica.id_farmaceutica"), nullable=False),
+)
+Table(
+    "ubs", _metadata,
+    Column("id_ubs", Integer, primary_key=True),
+    Column("nome", String, nullable=False),
+    Column("contato", String, nullable=False),
+    Column("endereco", String, nullable=False),
+    Column("id_sus", Integer, ForeignKey("sus.id_sus"), nullable=False),
+    Column("id_usuario", Integer, ForeignKey("user.id"), nullable=False),
+)
+Table(
+    "conteudoeducacional", _metadata,
+    Column("id_conteudo", Integer, primary_key=True),
+    Column("id_medicamento", Integer, ForeignKey("medicamento.id_medicamento"), nullable=False),
+    Column("titulo", String, nullable=False),
+    Column("tipo", String, nullable=False),
+    Column("conteudo", String, nullable=False),
+    Column("data_criacao", DateTime, nullable=False),
+)
+Table(
+    "lote", _metadata,
+    Column("id_lote", Integer, primary_key=True),
+    Column("codigo_lote", String, nullable=False),
+    Column("data_fabricacao", DateTime, nullable=False),
+    Column("data_vencimento", DateTime, nullable=False),
+    Column("quantidade", Integer, nullable=False),
+    Column("id_medicamento", Integer, ForeignKey("medicamento.id_medicamento"), nullable=False),
+)
+Table(
+    "paciente", _metadata,
+    Column("id_paciente", Integer, primary_key=True),
+    Column("nome", String, nullable=False),
+    Column("sobrenome", String, nullable=False),
+    Column("cpf", String, nullable=False),
+    Column("contato", String, nullable=False),
+    Column("id_ubs", Integer, ForeignKey("ubs.id_ubs"), nullable=False),
+    Column("id_usuario", Integer, ForeignKey("user.id"), nullable=False),
+)
+Table(
+    "feedback", _metadata,
+    Column("id_feedback", Integer, primary_key=True),
+    Column("comentario", String, nullable=False),
+    Column("tipo", String, nullable=False),
+    Column("id_paciente", Integer, ForeignKey("paciente.id_paciente"), nullable=False),
+    Column("id_medicamento", Integer, ForeignKey("medicamento.id_medicamento"), nullable=False),
+    Column("data", DateTime, nullable=False),
+)
+Table(
+    "distribuidorparasus", _metadata,
+    Column("id_dps", Integer, primary_key=True),
+    Column("id_distribuidor", Integer, ForeignKey("distribuidor.id_distribuidor"), nullable=False),
+    Column("id_sus", Integer, ForeignKey("sus.id_sus"), nullable=False),
+    Column("id_lote", Integer, ForeignKey("lote.id_lote"), nullable=False),
+    Column("quantidade", Integer, nullable=False),
+    Column("data_envio", DateTime, nullable=False),
+    Column("data_recebimento", DateTime),
+    Column("status", String, nullable=False),
+)
+Table(
+    "susparaubs", _metadata,
+    Column("id_spu", Integer, primary_key=True),
+    Column("id_sus", Integer, ForeignKey("sus.id_sus"), nullable=False),
+    Column("id_ubs", Integer, ForeignKey("ubs.id_ubs"), nullable=False),
+    Column("id_lote", Integer, ForeignKey("lote.id_lote"), nullable=False),
+    Column("quantidade", Integer, nullable=False),
+    Column("data_envio", DateTime, nullable=False),
+    Column("data_recebimento", DateTime),
+    Column("status", String, nullable=False),
+)
+Table(
+    "ubsparapaciente", _metadata,
+    Column("id_upp", Integer, primary_key=True),
+    Column("id_ubs", Integer, ForeignKey("ubs.id_ubs"), nullable=False),
+    Column("id_paciente", Integer, ForeignKey("paciente.id_paciente"), nullable=False),
+    Column("id_lote", Integer, ForeignKey("lote.id_lote"), nullable=False),
+    Column("quantidade", Integer, nullable=False),
+    Column("data_envio", DateTime, nullable=False),
+    Column("data_recebimento", DateTime),
+    Column("status", String, nullable=False),
+)
+Table(
+    "estoque", _metadata,
+    Column("id_estoque", Integer, primary_key=True),
+    Column("tipo_detentor", String, nullable=False),
+    Column("id_detentor", Integer, nullable=False),
+    Column("id_lote", Integer, ForeignKey("lote.id_lote"), nullable=False),
+    Column("quantidade", Integer, nullable=False),
+    Column("em_transito", Integer, nullable=False),
+    UniqueConstraint("tipo_detentor", "id_detentor", "id_lote"),
+)
+
+
+def upgrade(conn: Connection):
+    """Cria as tabelas que ainda não existem (bancos anteriores às migrações já as têm)"""
+    _metadata.create_all(conn)
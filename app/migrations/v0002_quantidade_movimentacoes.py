@@ -0,0 +1,58 @@
+from collections import defaultdict
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection
+
+# Etapas como eram nesta versão: (tabela, detentor de origem, coluna da origem,
+# detentor de destino, coluna do destino). O distribuidor só tinha saldo em trânsito.
+ETAPAS = [
+    ("distribuidorparasus", "distribuidor", "id_distribuidor", "sus", "id_sus"),
+    ("susparaubs", "sus", "id_sus", "ubs", "id_ubs"),
+    ("ubsparapaciente", "ubs", "id_ubs", None, None),
+]
+
+
+def upgrade(conn: Connection):
+    """Adiciona quantidade às movimentações SUS→UBS e UBS→Paciente e preenche o estoque"""
+    inspetor = inspect(conn)
+    for tabela in ["susparaubs", "ubsparapaciente"]:
+        colunas = {coluna["name"] for coluna in inspetor.get_columns(tabela)}
+        if "quantidade" not in colunas:
+            conn.exec_driver_sql(
+                f"ALTER TABLE {tabela} ADD COLUMN quantidade INTEGER NOT NULL DEFAULT 1"
+            )
+
+    # Movimentações anteriores ao estoque ainda não têm lançamento: refaz o estoque a partir delas
+    saldos = defaultdict(lambda: [0, 0])
+    for tabela, origem, coluna_origem, destino, coluna_destino in ETAPAS:
+        colunas = f"{coluna_origem}, id_lote, status" + (f", {coluna_destino}" if destino else "")
+        linhas = conn.execute(text(
+            f"SELECT {colunas}, SUM(quantidade) FROM {tabela} GROUP BY {colunas}"
+        )).all()
+
+        for linha in linhas:
+            id_origem, id_lote, status = linha[0], linha[1], linha[2]
+            quantidade = linha[-1] or 0
+
+            if origem != "distribuidor":
+                saldos[(origem, id_origem, id_lote)][0] -= quantidade
+            if status == "recebido":
+                if destino:
+                    saldos[(destino, linha[3], id_lote)][0] += quantidade
+            else:
+                saldos[(origem, id_origem, id_lote)][1] += quantidade
+
+    conn.execute(text("DELETE FROM estoque"))
+    if saldos:
+        conn.execute(
+            text(
+                "INSERT INTO estoque (tipo_detentor, id_detentor, id_lote, quantidade, em_transito)"
+                " VALUES (:tipo_detentor, :id_detentor, :id_lote, :quantidade, :em_transito)"
+            ),
+            [
+                {
+                    "tipo_detentor": tipo_detentor, "id_detentor": id_detentor, "id_lote": id_lote,
+                    "quantidade": quantidade, "em_transito": em_transito
+                }
+                for (tipo_detentor, id_detentor, id_lote), (quantidade, em_transito) in saldos.items()
+            ]
+        )
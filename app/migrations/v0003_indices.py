@@ -0,0 +1,47 @@
+from sqlalchemy.engine import Connection
+
+# Índices criados por esta versão: (nome, tabela, colunas, único). Lista fixa: índices
+# novos dos modelos entram em migrações próprias, junto com as colunas que usam.
+INDICES = [
+    ("ix_user_email", "user", ["email"], True),
+    ("ix_administrador_id_usuario", "administrador", ["id_usuario"], False),
+    ("ix_distribuidor_id_usuario", "distribuidor", ["id_usuario"], False),
+    ("ix_farmaceutica_cnpj", "farmaceutica", ["cnpj"], True),
+    ("ix_farmaceutica_id_usuario", "farmaceutica", ["id_usuario"], False),
+    ("ix_sus_id_usuario", "sus", ["id_usuario"], False),
+    ("ix_medicamento_id_farmaceutica", "medicamento", ["id_farmaceutica"], False),
+    ("ix_ubs_id_sus", "ubs", ["id_sus"], False),
+    ("ix_ubs_id_usuario", "ubs", ["id_usuario"], False),
+    ("ix_conteudoeducacional_id_medicamento", "conteudoeducacional", ["id_medicamento"], False),
+    ("ix_lote_data_vencimento", "lote", ["data_vencimento"], False),
+    ("ix_lote_id_medicamento", "lote", ["id_medicamento"], False),
+    ("ix_paciente_cpf", "paciente", ["cpf"], True),
+    ("ix_paciente_id_ubs", "paciente", ["id_ubs"], False),
+    ("ix_paciente_id_usuario", "paciente", ["id_usuario"], False),
+    ("ix_feedback_id_paciente", "feedback", ["id_paciente"], False),
+    ("ix_feedback_id_medicamento", "feedback", ["id_medicamento"], False),
+    ("ix_distribuidorparasus_id_lote", "distribuidorparasus", ["id_lote"], False),
+    ("ix_distribuidorparasus_status", "distribuidorparasus", ["status"], False),
+    ("ix_distribuidorparasus_id_distribuidor_status", "distribuidorparasus", ["id_distribuidor", "status"], False),
+    ("ix_distribuidorparasus_id_sus_status", "distribuidorparasus", ["id_sus", "status"], False),
+    ("ix_susparaubs_id_lote", "susparaubs", ["id_lote"], False),
+    ("ix_susparaubs_status", "susparaubs", ["status"], False),
+    ("ix_susparaubs_id_sus_status", "susparaubs", ["id_sus", "status"], False),
+    ("ix_susparaubs_id_ubs_status", "susparaubs", ["id_ubs", "status"], False),
+    ("ix_ubsparapaciente_id_lote", "ubsparapaciente", ["id_lote"], False),
+    ("ix_ubsparapaciente_status", "ubsparapaciente", ["status"], False),
+    ("ix_ubsparapaciente_id_ubs_status", "ubsparapaciente", ["id_ubs", "status"], False),
+    ("ix_ubsparapaciente_id_paciente_status", "ubsparapaciente", ["id_paciente", "status"], False),
+]
+
+
+def upgrade(conn: Connection):
+    """
+    Cria os índices de chaves estrangeiras e filtros que ainda não existem no banco.
+    Os índices únicos (email, cpf, cnpj) falham se houver duplicados: corrija os dados e rode de novo.
+    """
+    for nome, tabela, colunas, unico in INDICES:
+        conn.exec_driver_sql(
+            f'CREATE {"UNIQUE " if unico else ""}INDEX IF NOT EXISTS {nome} '
+            f'ON "{tabela}" ({", ".join(colunas)})'
+        )
@@ -0,0 +1,11 @@
+from sqlalchemy import inspect
+from sqlalchemy.engine import Connection
+
+
+def upgrade(conn: Connection):
+    """Adiciona ao usuário a versão dos tokens, usada para revogá-los"""
+    colunas = {coluna["name"] for coluna in inspect(conn).get_columns("user")}
+    if "versao_token" not in colunas:
+        conn.exec_driver_sql(
+            'ALTER TABLE "user" ADD COLUMN versao_token INTEGER NOT NULL DEFAULT 0'
+        )
@@ -0,0 +1,19 @@
+from sqlalchemy import JSON, Boolean, Column, DateTime, Integer, MetaData, String, Table
+from sqlalchemy.engine import Connection
+
+_metadata = MetaData()
+
+dashboardsnapshot = Table(
+    "dashboardsnapshot", _metadata,
+    Column("painel", String, primary_key=True),
+    Column("id_escopo", Integer, primary_key=True),
+    Column("dados", JSON, nullable=False),
+    Column("atualizado_em", DateTime, nullable=False),
+    Column("sujo", Boolean, nullable=False, index=True),
+    Column("versao", Integer, nullable=False),
+)
+
+
+def upgrade(conn: Connection):
+    """Cria a tabela de snapshots dos dashboards (e seus índices)"""
+    dashboardsnapshot.create(conn, checkfirst=True)
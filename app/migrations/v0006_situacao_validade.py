@@ -0,0 +1,28 @@
+from datetime import datetime, timedelta
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection
+
+
+def upgrade(conn: Connection):
+    """Adiciona ao lote a faixa de vencimento (indexada) e classifica os lotes existentes"""
+    colunas = {coluna["name"] for coluna in inspect(conn).get_columns("lote")}
+    if "situacao_validade" not in colunas:
+        conn.exec_driver_sql(
+            "ALTER TABLE lote ADD COLUMN situacao_validade VARCHAR NOT NULL DEFAULT 'valido'"
+        )
+    conn.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_lote_situacao_validade ON lote (situacao_validade)"
+    )
+
+    # Faixas como eram nesta versão; a varredura periódica mantém os lotes atualizados depois
+    agora = datetime.now()
+    conn.execute(
+        text(
+            "UPDATE lote SET situacao_validade = CASE"
+            " WHEN data_vencimento < :hoje THEN 'vencido'"
+            " WHEN data_vencimento < :em_30_dias THEN 'vence_em_30_dias'"
+            " WHEN data_vencimento < :em_60_dias THEN 'vence_em_60_dias'"
+            " ELSE 'valido' END"
+        ),
+        {"hoje": agora, "em_30_dias": agora + timedelta(days=30), "em_60_dias": agora + timedelta(days=60)}
+    )
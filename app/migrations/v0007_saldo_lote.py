@@ -0,0 +1,17 @@
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+
+def upgrade(conn: Connection):
+    """
+    Abre no estoque a linha do saldo não distribuído de cada lote (detentor 'lote'):
+    a quantidade do lote menos o que os distribuidores já enviaram dele
+    """
+    conn.execute(text(
+        "INSERT INTO estoque (tipo_detentor, id_detentor, id_lote, quantidade, em_transito)"
+        " SELECT 'lote', lote.id_lote, lote.id_lote,"
+        " lote.quantidade - COALESCE((SELECT SUM(distribuidorparasus.quantidade) FROM distribuidorparasus"
+        " WHERE distribuidorparasus.id_lote = lote.id_lote), 0), 0"
+        " FROM lote WHERE NOT EXISTS (SELECT 1 FROM estoque"
+        " WHERE estoque.tipo_detentor = 'lote' AND estoque.id_lote = lote.id_lote)"
+    ))
@@ -1,4 +1,5 @@
 from sqlmodel import SQLModel, Field, Relationship
+from sqlalchemy import JSON, Column, Index, UniqueConstraint
 from typing import Optional, List
 from datetime import datetime
 
@@ -7,7 +8,7 @@ from datetime import datetime
 # -------------------------
 class UserBase(SQLModel):
     nome: str
-    email: str
+    email: str = Field(index=True, unique=True)
     senha_hash: str
     tipo: str  # 'farmaceutica', 'distribuidor', 'sus', 'ubs', 'paciente', 'admin'
 
@@ -15,6 +16,8 @@ class UserBase(SQLModel):
 class User(UserBase, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     ativo: bool = Field(default=False)
+    # Incrementada para revogar os tokens já emitidos (ex.: troca de senha)
+    versao_token: int = Field(default=0)
 
 
 # -------------------------
@@ -26,7 +29,7 @@ class Administrador(SQLModel, table=True):
     nome: str
     email: str
     contato: str
-    id_usuario: int = Field(foreign_key="user.id")
+    id_usuario: int = Field(foreign_key="user.id", index=True)
 
 
 # -------------------------
@@ -35,9 +38,9 @@ class Administrador(SQLModel, table=True):
 class Farmaceutica(SQLModel, table=True):
     id_farmaceutica: Optional[int] = Field(default=None, primary_key=True)
     nome: str
-    cnpj: str
+    cnpj: str = Field(index=True, unique=True)
     contato: str
-    id_usuario: int = Field(foreign_key="user.id")
+    id_usuario: int = Field(foreign_key="user.id", index=True)
 
     medicamentos: List["Medicamento"] = Relationship(back_populates="farmaceutica")
 
@@ -55,7 +58,7 @@ class Medicamento(SQLModel, table=True):
     dosagem: Optional[str] = None
     preco: float
     alto_custo: bool
-    id_farmaceutica: int = Field(foreign_key="farmaceutica.id_farmaceutica")
+    id_farmaceutica: int = Field(foreign_key="farmaceutica.id_farmaceutica", index=True)
 
     farmaceutica: Optional[Farmaceutica] = Relationship(back_populates="medicamentos")
     lotes: List["Lote"] = Relationship(back_populates="medicamento")
@@ -64,16 +67,31 @@ class Medicamento(SQLModel, table=True):
 class LoteBase(SQLModel):
     codigo_lote: str
     data_fabricacao: datetime
-    data_vencimento: datetime
+    data_vencimento: datetime = Field(index=True)
     quantidade: int
-    id_medicamento: int = Field(foreign_key="medicamento.id_medicamento")
+    id_medicamento: int = Field(foreign_key="medicamento.id_medicamento", index=True)
 
 
 class Lote(LoteBase, table=True):
     id_lote: Optional[int] = Field(default=None, primary_key=True)
+    # Faixa de vencimento (services/validade.py), mantida pela varredura periódica
+    situacao_validade: str = Field(default="valido", index=True)
     
     medicamento: Optional[Medicamento] = Relationship(back_populates="lotes")
 
+
+class LinhaImportacao(SQLModel):
+    linha: int  # posição no JSON (a partir de 1) ou linha do arquivo CSV
+    id_lote: Optional[int] = None
+    erro: Optional[str] = None
+
+
+class ResultadoImportacao(SQLModel):
+    total: int
+    inseridos: int
+    erros: int
+    linhas: List[LinhaImportacao]
+
 # -------------------------
 # DISTRIBUIDOR
 # -------------------------
@@ -82,7 +100,7 @@ class Distribuidor(SQLModel, table=True):
     nome: str
     localizacao: str
     contato: str
-    id_usuario: int = Field(foreign_key="user.id")
+    id_usuario: int = Field(foreign_key="user.id", index=True)
 
 class DistribuidorCreate(SQLModel):
     nome: str
@@ -97,7 +115,7 @@ class SUS(SQLModel, table=True):
     regiao: str
     contato_gestor: str
     nome_gestor: str
-    id_usuario: int = Field(foreign_key="user.id")
+    id_usuario: int = Field(foreign_key="user.id", index=True)
 
     ubs: List["UBS"] = Relationship(back_populates="sus")
 
@@ -114,8 +132,8 @@ class UBS(SQLModel, table=True):
     nome: str
     contato: str
     endereco: str
-    id_sus: int = Field(foreign_key="sus.id_sus")
-    id_usuario: int = Field(foreign_key="user.id")
+    id_sus: int = Field(foreign_key="sus.id_sus", index=True)
+    id_usuario: int = Field(foreign_key="user.id", index=True)
 
     sus: Optional[SUS] = Relationship(back_populates="ubs")
     pacientes: List["Paciente"] = Relationship(back_populates="ubs")
@@ -133,10 +151,10 @@ class Paciente(SQLModel, table=True):
     id_paciente: Optional[int] = Field(default=None, primary_key=True)
     nome: str
     sobrenome: str
-    cpf: str
+    cpf: str = Field(index=True, unique=True)
     contato: str
-    id_ubs: int = Field(foreign_key="ubs.id_ubs")
-    id_usuario: int = Field(foreign_key="user.id")
+    id_ubs: int = Field(foreign_key="ubs.id_ubs", index=True)
+    id_usuario: int = Field(foreign_key="user.id", index=True)
 
     ubs: Optional[UBS] = Relationship(back_populates="pacientes")
 
@@ -151,36 +169,87 @@ class PacienteCreate(SQLModel):
 # MOVIMENTAÇÕES
 # -------------------------
 class DistribuidorParaSUS(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_distribuidorparasus_id_distribuidor_status", "id_distribuidor", "status"),
+        Index("ix_distribuidorparasus_id_sus_status", "id_sus", "status"),
+    )
+
     id_dps: Optional[int] = Field(default=None, primary_key=True)
     id_distribuidor: int = Field(foreign_key="distribuidor.id_distribuidor")
     id_sus: int = Field(foreign_key="sus.id_sus")
-    id_lote: int = Field(foreign_key="lote.id_lote")
+    id_lote: int = Field(foreign_key="lote.id_lote", index=True)
     quantidade: int
     data_envio: datetime
     data_recebimento: Optional[datetime] = None
-    status: str
+    status: str = Field(index=True)
     
 
 class SUSParaUBSBase(SQLModel):
     id_sus: int = Field(foreign_key="sus.id_sus")
     id_ubs: int = Field(foreign_key="ubs.id_ubs")
-    id_lote: int = Field(foreign_key="lote.id_lote")
+    id_lote: int = Field(foreign_key="lote.id_lote", index=True)
+    quantidade: int = 1
     data_envio: datetime
     data_recebimento: Optional[datetime] = None
-    status: str
+    status: str = Field(index=True)
 
 class SUSParaUBS(SUSParaUBSBase, table=True):
+    __table_args__ = (
+        Index("ix_susparaubs_id_sus_status", "id_sus", "status"),
+        Index("ix_susparaubs_id_ubs_status", "id_ubs", "status"),
+    )
+
     id_spu: Optional[int] = Field(default=None, primary_key=True)
 
 
 class UBSParaPaciente(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_ubsparapaciente_id_ubs_status", "id_ubs", "status"),
+        Index("ix_ubsparapaciente_id_paciente_status", "id_paciente", "status"),
+    )
+
     id_upp: Optional[int] = Field(default=None, primary_key=True)
     id_ubs: int = Field(foreign_key="ubs.id_ubs")
     id_paciente: int = Field(foreign_key="paciente.id_paciente")
-    id_lote: int = Field(foreign_key="lote.id_lote")
+    id_lote: int = Field(foreign_key="lote.id_lote", index=True)
+    quantidade: int = 1
     data_envio: datetime
     data_recebimento: Optional[datetime] = None
-    status: str
+    status: str = Field(index=True)
+
+
+class ItemEnvio(SQLModel):
+    id_destino: int  # SUS, UBS ou paciente, conforme a etapa
+    id_lote: int
+    quantidade: int = Field(default=1, gt=0)
+
+
+class EnvioEmMassa(SQLModel):
+    id_origem: Optional[int] = None  # só para admin; os demais enviam como a própria entidade
+    itens: List[ItemEnvio]
+
+
+class ConfirmacaoEmMassa(SQLModel):
+    ids: List[int]
+
+
+class ResultadoConfirmacao(SQLModel):
+    id: int
+    resultado: str  # "confirmado", "ja_confirmado" ou "nao_encontrado"
+
+
+# -------------------------
+# ESTOQUE
+# -------------------------
+class Estoque(SQLModel, table=True):
+    __table_args__ = (UniqueConstraint("tipo_detentor", "id_detentor", "id_lote"),)
+
+    id_estoque: Optional[int] = Field(default=None, primary_key=True)
+    tipo_detentor: str  # 'lote' (saldo não distribuído), 'distribuidor', 'sus', 'ubs'
+    id_detentor: int
+    id_lote: int = Field(foreign_key="lote.id_lote")
+    quantidade: int = 0  # unidades em posse do detentor
+    em_transito: int = 0  # unidades enviadas pelo detentor aguardando confirmação
 
 
 # -------------------------
@@ -203,8 +272,8 @@ class FeedbackUpdate(SQLModel):
 
 class Feedback(FeedbackBase, table=True):
     id_feedback: Optional[int] = Field(default=None, primary_key=True)
-    id_paciente: int = Field(foreign_key="paciente.id_paciente")
-    id_medicamento: int = Field(foreign_key="medicamento.id_medicamento")
+    id_paciente: int = Field(foreign_key="paciente.id_paciente", index=True)
+    id_medicamento: int = Field(foreign_key="medicamento.id_medicamento", index=True)
     data: datetime = Field(default_factory=datetime.utcnow)
 
 # -------------------------
@@ -213,8 +282,20 @@ class Feedback(FeedbackBase, table=True):
 
 class ConteudoEducacional(SQLModel, table=True):
     id_conteudo: Optional[int] = Field(default=None, primary_key=True)
-    id_medicamento: int = Field(foreign_key="medicamento.id_medicamento")
+    id_medicamento: int = Field(foreign_key="medicamento.id_medicamento", index=True)
     titulo: str
     tipo: str  # 'doenca', 'medicamento', 'uso_correto', 'efeitos_colaterais'
     conteudo: str
     data_criacao: datetime
+
+
+# -------------------------
+# SNAPSHOTS DOS DASHBOARDS
+# -------------------------
+class DashboardSnapshot(SQLModel, table=True):
+    painel: str = Field(primary_key=True)  # 'farmaceutica', 'distribuidor', 'sus', 'ubs'
+    id_escopo: int = Field(primary_key=True)  # id da entidade dona do painel; 0 = visão do admin
+    dados: dict = Field(default_factory=dict, sa_column=Column(JSON, nullable=False))
+    atualizado_em: datetime
+    sujo: bool = Field(default=False, index=True)  # alguma escrita mudou os dados desde o cálculo
+    versao: int = 0  # incrementada a cada marcação; o recálculo só limpa a versão que leu
@@ -0,0 +1,42 @@
+from fastapi import Query, Response
+from sqlmodel import Session
+from typing import Optional
+
+LIMITE_PADRAO = 100
+LIMITE_MAXIMO = 500
+
+# Header com o cursor da próxima página (ausente na última página)
+HEADER_PROXIMO_CURSOR = "X-Proximo-Cursor"
+
+# Header com o total de itens da listagem, nas que o informam
+HEADER_TOTAL = "X-Total-Count"
+
+
+class Paginacao:
+    """Parâmetros de paginação por cursor (keyset) comuns às listagens"""
+
+    def __init__(
+        self,
+        cursor: Optional[int] = Query(
+            None, ge=0, description="Id do último item recebido (header X-Proximo-Cursor)"
+        ),
+        limit: int = Query(LIMITE_PADRAO, ge=1, le=LIMITE_MAXIMO),
+    ):
+        self.cursor = cursor
+        self.limit = limit
+
+
+def paginar(session: Session, query, coluna_id, paginacao: Paginacao, response: Response) -> list:
+    """
+    Aplica a paginação por cursor à consulta, ordenada pela chave primária.
+    Busca um item a mais para saber se existe próxima página.
+    """
+    if paginacao.cursor is not None:
+        query = query.where(coluna_id > paginacao.cursor)
+
+    itens = session.exec(query.order_by(coluna_id).limit(paginacao.limit + 1)).all()
+
+    if len(itens) > paginacao.limit:
+        itens = itens[:paginacao.limit]
+        response.headers[HEADER_PROXIMO_CURSOR] = str(getattr(itens[-1], coluna_id.key))
+    return itens
@@ -1,32 +1,28 @@
 from fastapi import APIRouter, HTTPException, Depends
 from sqlmodel import Session, select
 from typing import List
-from auth.dependencies import get_current_user
+from auth.permissions import exigir_tipos, UserType
 from models import Administrador
-from database import get_session
+from database import get_session, get_read_session
 
 router = APIRouter(prefix="/admin", tags=["Admins"])
 
+apenas_admin = exigir_tipos(UserType.ADMIN, detail="Acesso restrito")
+
 @router.post("/", response_model=Administrador)
-def create_admin(admin: Administrador, session: Session = Depends(get_session), current_user = Depends(get_current_user)):
-    if current_user.tipo != "admin":
-        raise HTTPException(status_code=403, detail="Acesso restrito")
+def create_admin(admin: Administrador, session: Session = Depends(get_session), current_user = Depends(apenas_admin)):
     session.add(admin)
     session.commit()
     session.refresh(admin)
     return admin
 
 @router.get("/", response_model=List[Administrador])
-def list_admins(session: Session = Depends(get_session), current_user = Depends(get_current_user)):
-    if current_user.tipo != "admin":
-        raise HTTPException(status_code=403, detail="Acesso restrito")
+def list_admins(session: Session = Depends(get_read_session), current_user = Depends(apenas_admin)):
     admins = session.exec(select(Administrador)).all()
     return admins
 
 @router.get("/{admin_id}", response_model=Administrador)
-def get_admin(admin_id: int, session: Session = Depends(get_session), current_user = Depends(get_current_user)):
-    if current_user.tipo != "admin":
-        raise HTTPException(status_code=403, detail="Acesso restrito")
+def get_admin(admin_id: int, session: Session = Depends(get_session), current_user = Depends(apenas_admin)):
     admin = session.get(Administrador, admin_id)
     if not admin:
         raise HTTPException(status_code=404, detail="Administrador não encontrado")
@@ -37,10 +33,8 @@ def update_admin(
     admin_id: int, 
     admin: Administrador, 
     session: Session = Depends(get_session), 
-    current_user = Depends(get_current_user)
+    current_user = Depends(apenas_admin)
 ):
-    if current_user.tipo != "admin":
-        raise HTTPException(status_code=403, detail="Acesso restrito")
     db_admin = session.get(Administrador, admin_id)
     if not db_admin:
         raise HTTPException(status_code=404, detail="Administrador não encontrado")
@@ -55,10 +49,7 @@ def update_admin(
     return db_admin
 
 @router.delete("/{admin_id}")
-def delete_admin(admin_id: int, session: Session = Depends(get_session), current_user = Depends(get_current_user)):
-    if current_user.tipo != "admin":
-        raise HTTPException(status_code=403, detail="Acesso restrito")
-    
+def delete_admin(admin_id: int, session: Session = Depends(get_session), current_user = Depends(apenas_admin)):
     admin = session.get(Administrador, admin_id)
     if not admin:
         raise HTTPException(status_code=404, detail="Administrador não encontrado")
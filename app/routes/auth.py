@@ -1,11 +1,14 @@
 from fastapi import APIRouter, HTTPException, Depends, status
-from sqlmodel import Session, select
+from sqlmodel import Session, select, update
 from pydantic import BaseModel
+from typing import Optional
 from models import User, UserBase
-from database import get_session
-from auth.dependencies import create_access_token, get_current_user
+from database import run_db
+from auth.dependencies import (
+    create_access_token, get_current_user, claims_usuario, invalidar_usuario
+)
 from auth.permissions import get_user_permissions
-import hashlib
+from auth.senhas import gerar_hash_async, precisa_atualizar, verificar_async
 
 router = APIRouter(prefix="/auth", tags=["Autenticação"])
 
@@ -26,26 +29,32 @@ class RegisterRequest(BaseModel):
     tipo: str
 
 
-def hash_password(password: str) -> str:
-    """Hash da senha usando SHA256"""
-    return hashlib.sha256(password.encode()).hexdigest()
+def _buscar_por_email(session: Session, email: str) -> Optional[User]:
+    return session.exec(select(User).where(User.email == email)).first()
 
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verifica se a senha corresponde ao hash"""
-    return hash_password(plain_password) == hashed_password
+def _atualizar_hash(session: Session, user_id: int, hash_anterior: str, novo_hash: str):
+    """Troca o hash da senha, se ela não foi alterada nesse meio tempo"""
+    session.exec(
+        update(User)
+        .where(User.id == user_id, User.senha_hash == hash_anterior)
+        .values(senha_hash=novo_hash)
+    )
+    session.commit()
+
+
+def _gravar_usuario(session: Session, user: User) -> User:
+    session.add(user)
+    session.commit()
+    session.refresh(user)
+    return user
 
 
 @router.post("/register", response_model=User)
-def register(
-    user_data: RegisterRequest,
-    session: Session = Depends(get_session)
-):
+async def register(user_data: RegisterRequest):
     """Registra um novo usuário"""
     # Verifica se o email já existe
-    existing_user = session.exec(
-        select(User).where(User.email == user_data.email)
-    ).first()
+    existing_user = await run_db(_buscar_por_email, user_data.email)
     
     if existing_user:
         raise HTTPException(
@@ -61,45 +70,35 @@ def register(
             detail=f"Tipo de usuário inválido. Use: {', '.join(valid_types)}"
         )
     
-    # Cria o usuário com senha hasheada
+    # Cria o usuário com senha hasheada (no pool de hashing, fora do event loop)
     user = User(
         nome=user_data.nome,
         email=user_data.email,
-        senha_hash=hash_password(user_data.senha),  # Assumindo que vem como senha plain
+        senha_hash=await gerar_hash_async(user_data.senha),
         tipo=user_data.tipo,
         ativo=False
     )
     
-    session.add(user)
-    session.commit()
-    session.refresh(user)
-    
-    return user
+    return await run_db(_gravar_usuario, user)
 
 
 @router.post("/login", response_model=LoginResponse)
-def login(
-    login_data: LoginRequest,
-    session: Session = Depends(get_session)
-):
+async def login(login_data: LoginRequest):
     """Faz login e retorna o token JWT"""
     # Busca o usuário pelo email
-    user = session.exec(
-        select(User).where(User.email == login_data.email)
-    ).first()
-    
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Email ou senha incorretos"
-        )
-    
-    # Verifica a senha
-    if not verify_password(login_data.senha, user.senha_hash):
+    user = await run_db(_buscar_por_email, login_data.email)
+
+    # Verifica a senha (no pool de hashing, fora do event loop)
+    if not await verificar_async(login_data.senha, user.senha_hash if user else None):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Email ou senha incorretos"
         )
+
+    # Hashes legados (SHA-256) ou com custo antigo são refeitos com a senha recém-validada
+    if precisa_atualizar(user.senha_hash):
+        novo_hash = await gerar_hash_async(login_data.senha)
+        await run_db(_atualizar_hash, user.id, user.senha_hash, novo_hash)
     
     # if not user.ativo:
     #     raise HTTPException(
@@ -107,8 +106,8 @@ def login(
     #         detail="Cadastro incompleto. Finalize o registro antes de fazer login."
     #     )
     
-    # Cria o token
-    access_token = create_access_token(data={"sub": str(user.id), "tipo": user.tipo})
+    # Cria o token já com as claims que dispensam consultar o usuário a cada requisição
+    access_token = create_access_token(data=claims_usuario(user))
     
     # Obtém as permissões do usuário
     permissions = get_user_permissions(user.tipo)
@@ -141,24 +140,47 @@ def get_me(current_user: User = Depends(get_current_user)):
     }
 
 
+def _buscar_usuario(session: Session, user_id: int) -> Optional[User]:
+    return session.get(User, user_id)
+
+
+def _trocar_senha(session: Session, user_id: int, hash_anterior: str, novo_hash: str) -> bool:
+    """Troca o hash e revoga os tokens, se a senha não foi alterada nesse meio tempo"""
+    resultado = session.exec(
+        update(User)
+        .where(User.id == user_id, User.senha_hash == hash_anterior)
+        .values(senha_hash=novo_hash, versao_token=User.versao_token + 1)
+    )
+    session.commit()
+    return resultado.rowcount == 1
+
+
 @router.post("/change-password")
-def change_password(
+async def change_password(
     old_password: str,
     new_password: str,
-    current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session)
+    current_user: User = Depends(get_current_user)
 ):
-    """Altera a senha do usuário"""
+    """Altera a senha do usuário e revoga os tokens já emitidos"""
+    # O usuário autenticado pode ter vindo do cache, sem o hash da senha
+    user = await run_db(_buscar_usuario, current_user.id)
+    if not user:
+        raise HTTPException(status_code=404, detail="Usuário não encontrado")
+
     # Verifica a senha antiga
-    if not verify_password(old_password, current_user.senha_hash):
+    if not await verificar_async(old_password, user.senha_hash):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Senha atual incorreta"
         )
     
     # Atualiza a senha
-    current_user.senha_hash = hash_password(new_password)
-    session.add(current_user)
-    session.commit()
+    novo_hash = await gerar_hash_async(new_password)
+    if not await run_db(_trocar_senha, user.id, user.senha_hash, novo_hash):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A senha foi alterada por outra requisição"
+        )
+    invalidar_usuario(user.id)
     
-    return {"message": "Senha alterada com sucesso"}
\ No newline at end of file
+    return {"message": "Senha alterada com sucesso. Faça login novamente"}
@@ -2,8 +2,8 @@ from fastapi import APIRouter, HTTPException, Depends
 from sqlmodel import Session, select
 from typing import List
 from models import Distribuidor, DistribuidorCreate, User
-from database import get_session
-from auth.dependencies import get_current_user
+from database import get_session, get_read_session
+from auth.dependencies import get_current_user, get_current_profile, invalidar_perfil, invalidar_usuario
 
 router = APIRouter(prefix="/distribuidores", tags=["Distribuidores"])
 
@@ -38,14 +38,16 @@ def create_distribuidor(
     session.commit()
     session.refresh(novo_distribuidor)
     session.refresh(user)
+    invalidar_usuario(current_user.id)
 
     return novo_distribuidor
 
 
 @router.get("/", response_model=List[Distribuidor])
 def list_distribuidores(
-    session: Session = Depends(get_session),
-    current_user = Depends(get_current_user)
+    session: Session = Depends(get_read_session),
+    current_user = Depends(get_current_user),
+    perfil = Depends(get_current_profile)
 ):
     if current_user.tipo not in ["admin", "distribuidor"]:
         raise HTTPException(status_code=403, detail="Acesso restrito a distribuidores")
@@ -54,9 +56,7 @@ def list_distribuidores(
         raise HTTPException(status_code=403, detail="Finalize seu cadastro")
 
     if current_user.tipo == "distribuidor":
-        distribuidores = session.exec(
-            select(Distribuidor).where(Distribuidor.id_usuario == current_user.id)
-        ).all()
+        distribuidores = [perfil] if perfil else []
     else:
         distribuidores = session.exec(select(Distribuidor)).all()
     
@@ -105,6 +105,7 @@ def update_distribuidor(
     if current_user.tipo == "distribuidor" and db_distribuidor.id_usuario != current_user.id:
         raise HTTPException(status_code=403, detail="Você só pode alterar seus próprios dados")
 
+    id_usuario_anterior = db_distribuidor.id_usuario
     distribuidor_data = distribuidor.model_dump(exclude_unset=True, exclude={"id_distribuidor"})
     for key, value in distribuidor_data.items():
         setattr(db_distribuidor, key, value)
@@ -112,6 +113,7 @@ def update_distribuidor(
     session.add(db_distribuidor)
     session.commit()
     session.refresh(db_distribuidor)
+    invalidar_perfil(id_usuario_anterior, db_distribuidor.id_usuario)
     return db_distribuidor
 
 
@@ -136,4 +138,5 @@ def delete_distribuidor(
 
     session.delete(distribuidor)
     session.commit()
+    invalidar_perfil(distribuidor.id_usuario)
     return {"message": "Distribuidor deletado com sucesso"}
@@ -1,26 +1,48 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlmodel import SQLModel, Session, select
 from typing import List, Optional
 from datetime import datetime
 from models import ConteudoEducacional, Farmaceutica, Medicamento, User
-from database import get_session
-from auth.dependencies import get_current_user
+from database import get_session, get_read_session, run_db
+from auth.dependencies import get_current_user, get_current_profile
+from paginacao import Paginacao, paginar
+from cache_respostas import cache_respostas
 
 router = APIRouter(prefix="/conteudo", tags=["Conteúdo Educacional"])
 
 
 @router.get("/", response_model=List[ConteudoEducacional])
-def listar_conteudos(session: Session = Depends(get_session)):
-    return session.exec(select(ConteudoEducacional)).all()
+async def listar_conteudos(
+    request: Request,
+    response: Response,
+    id_medicamento: Optional[int] = None,
+    tipo: Optional[str] = None,
+    paginacao: Paginacao = Depends()
+):
+    em_cache, chave = cache_respostas.buscar(request, "conteudos")
+    if em_cache:
+        return em_cache
+
+    query = select(ConteudoEducacional)
+    if id_medicamento is not None:
+        query = query.where(ConteudoEducacional.id_medicamento == id_medicamento)
+    if tipo is not None:
+        query = query.where(ConteudoEducacional.tipo == tipo)
+
+    conteudos = await run_db(paginar, query, ConteudoEducacional.id_conteudo, paginacao, response, leitura=True)
+    return cache_respostas.guardar(request, chave, conteudos, List[ConteudoEducacional], response)
 
 
 @router.get("/{conteudo_id}", response_model=ConteudoEducacional)
-def obter_conteudo(conteudo_id: int, session: Session = Depends(get_session)):
-    
+def obter_conteudo(conteudo_id: int, request: Request, session: Session = Depends(get_read_session)):
+    em_cache, chave = cache_respostas.buscar(request, "conteudos")
+    if em_cache:
+        return em_cache
+
     conteudo = session.get(ConteudoEducacional, conteudo_id)
     if not conteudo:
         raise HTTPException(status_code=404, detail="Conteúdo não encontrado")
-    return conteudo
+    return cache_respostas.guardar(request, chave, conteudo, ConteudoEducacional)
 
 
 @router.post("/", response_model=ConteudoEducacional)
@@ -30,6 +52,7 @@ def criar_conteudo(
     tipo: str,
     conteudo: str,
     current_user: User = Depends(get_current_user),
+    perfil = Depends(get_current_profile),
     session: Session = Depends(get_session)
 ):
     if current_user.tipo not in ["admin", "farmaceutica"]:
@@ -43,9 +66,7 @@ def criar_conteudo(
         raise HTTPException(status_code=404, detail="Medicamento não encontrado")
 
     if current_user.tipo == "farmaceutica":
-        farmaceutica = session.exec(
-            select(Farmaceutica).where(Farmaceutica.id_usuario == current_user.id)
-        ).first()
+        farmaceutica = perfil
         if not farmaceutica or medicamento.id_farmaceutica != farmaceutica.id_farmaceutica:
             raise HTTPException(status_code=403, detail="Você só pode criar conteúdo sobre seus próprios medicamentos")
         
@@ -63,6 +84,7 @@ def criar_conteudo(
     session.add(novo_conteudo)
     session.commit()
     session.refresh(novo_conteudo)
+    cache_respostas.invalidar("conteudos")
     return novo_conteudo
 
 
@@ -73,6 +95,7 @@ def atualizar_conteudo(
     tipo: Optional[str] = None,
     conteudo: Optional[str] = None,
     current_user: User = Depends(get_current_user),
+    perfil = Depends(get_current_profile),
     session: Session = Depends(get_session)
 ):
     if current_user.tipo not in ["admin", "farmaceutica"]:
@@ -88,9 +111,7 @@ def atualizar_conteudo(
     medicamento = session.get(Medicamento, conteudo_obj.id_medicamento)
 
     if current_user.tipo == "farmaceutica":
-        farmaceutica = session.exec(
-            select(Farmaceutica).where(Farmaceutica.id_usuario == current_user.id)
-        ).first()
+        farmaceutica = perfil
         if not farmaceutica or medicamento.id_farmaceutica != farmaceutica.id_farmaceutica:
             raise HTTPException(status_code=403, detail="Você só pode atualizar conteúdos dos seus próprios medicamentos")
         
@@ -107,6 +128,7 @@ def atualizar_conteudo(
     session.add(conteudo_obj)
     session.commit()
     session.refresh(conteudo_obj)
+    cache_respostas.invalidar("conteudos")
     return conteudo_obj
 
 # ------------------------------
@@ -116,6 +138,7 @@ def atualizar_conteudo(
 def deletar_conteudo(
     conteudo_id: int,
     current_user: User = Depends(get_current_user),
+    perfil = Depends(get_current_profile),
     session: Session = Depends(get_session)
 ):
     if current_user.tipo not in ["admin", "farmaceutica"]:
@@ -131,12 +154,11 @@ def deletar_conteudo(
     medicamento = session.get(Medicamento, conteudo_obj.id_medicamento)
 
     if current_user.tipo == "farmaceutica":
-        farmaceutica = session.exec(
-            select(Farmaceutica).where(Farmaceutica.id_usuario == current_user.id)
-        ).first()
+        farmaceutica = perfil
         if not farmaceutica or medicamento.id_farmaceutica != farmaceutica.id_farmaceutica:
             raise HTTPException(status_code=403, detail="Você só pode deletar conteúdos dos seus próprios medicamentos")
 
     session.delete(conteudo_obj)
     session.commit()
+    cache_respostas.invalidar("conteudos")
     return {"message": "Conteúdo deletado com sucesso"}
@@ -0,0 +1,29 @@
+from fastapi import APIRouter, Depends
+from sqlmodel import Session, select
+from typing import List, Optional
+from auth.permissions import Escopo, UserType, require_permissions
+from models import Estoque
+from database import get_read_session
+
+router = APIRouter(prefix="/estoque", tags=["Estoque"])
+
+
+@router.get("/", response_model=List[Estoque])
+def list_estoque(
+    id_lote: Optional[int] = None,
+    escopo: Escopo = Depends(require_permissions(
+        tipos=[UserType.ADMIN, UserType.DISTRIBUIDOR, UserType.SUS, UserType.UBS],
+        detail="Acesso restrito a distribuidores, SUS, UBS e administradores"
+    )),
+    session: Session = Depends(get_read_session)
+):
+    query = select(Estoque)
+
+    # Cada detentor só vê o próprio saldo
+    if not escopo.admin:
+        query = query.where(Estoque.tipo_detentor == escopo.tipo, Estoque.id_detentor == escopo.id_perfil)
+
+    if id_lote is not None:
+        query = query.where(Estoque.id_lote == id_lote)
+
+    return session.exec(query).all()
@@ -1,9 +1,9 @@
 from fastapi import APIRouter, HTTPException, Depends
 from sqlmodel import Session, select
 from typing import List
-from auth.dependencies import get_current_user
+from auth.dependencies import get_current_user, get_current_profile, invalidar_perfil, invalidar_usuario
 from models import Farmaceutica, FarmaceuticaCreate, User
-from database import get_session
+from database import get_session, get_read_session
 
 router = APIRouter(prefix="/farmaceuticas", tags=["Farmacêuticas"])
 
@@ -39,12 +39,13 @@ def create_farmaceutica(farmaceutica: FarmaceuticaCreate,
 
     session.refresh(nova_farmaceutica)
     session.refresh(user)
+    invalidar_usuario(current_user.id)
 
     return nova_farmaceutica
 
 
 @router.get("/", response_model=List[Farmaceutica])
-def list_farmaceuticas(session: Session = Depends(get_session), current_user = Depends(get_current_user)):
+def list_farmaceuticas(session: Session = Depends(get_read_session), current_user = Depends(get_current_user), perfil = Depends(get_current_profile)):
     if current_user.tipo != "farmaceutica" and current_user.tipo != "admin":
         raise HTTPException(status_code=403, detail="Acesso restrito a farmacêuticas")
     
@@ -52,9 +53,7 @@ def list_farmaceuticas(session: Session = Depends(get_session), current_user = D
         raise HTTPException(status_code=403, detail="Finalize seu cadastro")
     
     if current_user.tipo == "farmaceutica":
-        farmaceutica = session.exec(
-            select(Farmaceutica).where(Farmaceutica.id_usuario == current_user.id)
-        ).first()
+        farmaceutica = perfil
 
         if not farmaceutica:
             raise HTTPException(status_code=404, detail="Farmacêutica não encontrada")
@@ -66,7 +65,7 @@ def list_farmaceuticas(session: Session = Depends(get_session), current_user = D
 
 
 @router.get("/{farmaceutica_id}", response_model=Farmaceutica)
-def get_farmaceutica(farmaceutica_id: int, session: Session = Depends(get_session), current_user = Depends(get_current_user)):
+def get_farmaceutica(farmaceutica_id: int, session: Session = Depends(get_session), current_user = Depends(get_current_user), perfil = Depends(get_current_profile)):
     if current_user.tipo != "farmaceutica" and current_user.tipo != "admin":
         raise HTTPException(status_code=403, detail="Acesso restrito a farmacêuticas")
     
@@ -78,9 +77,7 @@ def get_farmaceutica(farmaceutica_id: int, session: Session = Depends(get_sessio
         raise HTTPException(status_code=404, detail="Farmacêutica não encontrada")
 
     if current_user.tipo == "farmaceutica":
-        user_farmaceutica = session.exec(
-            select(Farmaceutica).where(Farmaceutica.id_usuario == current_user.id)
-        ).first()
+        user_farmaceutica = perfil
 
         if not user_farmaceutica or user_farmaceutica.id_farmaceutica != farmaceutica_id:
             raise HTTPException(
@@ -96,7 +93,8 @@ def update_farmaceutica(
     farmaceutica_id: int, 
     farmaceutica: Farmaceutica, 
     session: Session = Depends(get_session), 
-    current_user = Depends(get_current_user)
+    current_user = Depends(get_current_user),
+    perfil = Depends(get_current_profile)
 ):
     if current_user.tipo != "farmaceutica" and current_user.tipo != "admin":
         raise HTTPException(status_code=403, detail="Acesso restrito a farmacêuticas")
@@ -109,9 +107,7 @@ def update_farmaceutica(
         raise HTTPException(status_code=404, detail="Farmacêutica não encontrada")
 
     if current_user.tipo == "farmaceutica":
-        user_farmaceutica = session.exec(
-            select(Farmaceutica).where(Farmaceutica.id_usuario == current_user.id)
-        ).first()
+        user_farmaceutica = perfil
 
         if not user_farmaceutica or user_farmaceutica.id_farmaceutica != farmaceutica_id:
             raise HTTPException(
@@ -119,6 +115,7 @@ def update_farmaceutica(
                 detail="Você só pode alterar os dados da sua própria farmacêutica"
             )
 
+    id_usuario_anterior = db_farmaceutica.id_usuario
     farmaceutica_data = farmaceutica.model_dump(
         exclude_unset=True,
         exclude={"id_farmaceutica"}
@@ -129,12 +126,13 @@ def update_farmaceutica(
     session.add(db_farmaceutica)
     session.commit()
     session.refresh(db_farmaceutica)
+    invalidar_perfil(id_usuario_anterior, db_farmaceutica.id_usuario)
 
     return db_farmaceutica
 
 
 @router.delete("/{farmaceutica_id}")
-def delete_farmaceutica(farmaceutica_id: int, session: Session = Depends(get_session), current_user = Depends(get_current_user)):
+def delete_farmaceutica(farmaceutica_id: int, session: Session = Depends(get_session), current_user = Depends(get_current_user), perfil = Depends(get_current_profile)):
     if current_user.tipo != "farmaceutica" and current_user.tipo != "admin":
         raise HTTPException(status_code=403, detail="Acesso restrito a farmacêuticas")
     
@@ -146,9 +144,7 @@ def delete_farmaceutica(farmaceutica_id: int, session: Session = Depends(get_ses
         raise HTTPException(status_code=404, detail="Farmacêutica não encontrada")
     
     if current_user.tipo == "farmaceutica":
-        user_farmaceutica = session.exec(
-            select(Farmaceutica).where(Farmaceutica.id_usuario == current_user.id)
-        ).first()
+        user_farmaceutica = perfil
 
         if not user_farmaceutica or user_farmaceutica.id_farmaceutica != farmaceutica_id:
             raise HTTPException(
@@ -158,4 +154,5 @@ def delete_farmaceutica(farmaceutica_id: int, session: Session = Depends(get_ses
     
     session.delete(farmaceutica)
     session.commit()
+    invalidar_perfil(farmaceutica.id_usuario)
     return {"message": "Farmacêutica deletada com sucesso"}
\ No newline at end of file
@@ -1,9 +1,12 @@
-from fastapi import APIRouter, HTTPException, Depends
-from sqlmodel import Session, select
-from typing import List
-from auth.dependencies import get_current_user
+from fastapi import APIRouter, HTTPException, Depends, Response
+from sqlmodel import Session
+from typing import List, Optional
+from auth.dependencies import get_current_user, get_current_profile
+from auth.permissions import Escopo, exigir_escopo
 from models import Farmaceutica, Feedback, FeedbackCreate, FeedbackUpdate, Medicamento, Paciente
-from database import get_session
+from database import get_session, run_db
+from paginacao import Paginacao, paginar
+from services.snapshots import marcar_feedback
 from datetime import datetime
 
 
@@ -15,7 +18,8 @@ router = APIRouter(prefix="/feedbacks", tags=["Feedbacks"])
 def create_feedback(
     feedback: FeedbackCreate,
     session: Session = Depends(get_session),
-    current_user = Depends(get_current_user)
+    current_user = Depends(get_current_user),
+    perfil = Depends(get_current_profile)
 ):
     # Apenas pacientes podem criar feedback
     if current_user.tipo != "paciente":
@@ -24,9 +28,7 @@ def create_feedback(
     if not current_user.ativo:
         raise HTTPException(status_code=403, detail="Finalize seu cadastro")
 
-    paciente = session.exec(
-        select(Paciente).where(Paciente.id_usuario == current_user.id)
-    ).first()
+    paciente = perfil
     
     if not paciente:
         raise HTTPException(404, "Paciente não encontrado")
@@ -37,6 +39,7 @@ def create_feedback(
     )
 
     session.add(feedback_obj)
+    marcar_feedback(session, feedback_obj.id_medicamento)
     session.commit()
     session.refresh(feedback_obj)
     return feedback_obj
@@ -44,54 +47,32 @@ def create_feedback(
 
 # READ -----------------------------------------------------------
 @router.get("/", response_model=List[Feedback])
-def list_feedbacks(
-    session: Session = Depends(get_session),
-    current_user = Depends(get_current_user)
+async def list_feedbacks(
+    response: Response,
+    id_medicamento: Optional[int] = None,
+    data_de: Optional[datetime] = None,
+    data_ate: Optional[datetime] = None,
+    paginacao: Paginacao = Depends(),
+    escopo: Escopo = Depends(exigir_escopo(Feedback, detail="Você não tem permissão para ver feedbacks."))
 ):
-    if not current_user.ativo:
-        raise HTTPException(status_code=403, detail="Finalize seu cadastro")
-    
-    if current_user.tipo == "admin":
-        return session.exec(select(Feedback)).all()
+    query = escopo.consulta(Feedback)
 
-    if current_user.tipo == "farmaceutica":
-        farmaceutica = session.exec(
-            select(Farmaceutica).where(Farmaceutica.id_usuario == current_user.id)
-        ).first()
-
-        if not farmaceutica:
-            raise HTTPException(404, "Farmacêutica não encontrada")
-
-        medicamentos_ids = session.exec(
-            select(Medicamento.id_medicamento).where(
-                Medicamento.id_farmaceutica == farmaceutica.id_farmaceutica
-            )
-        ).all()
-
-        return session.exec(
-            select(Feedback).where(Feedback.id_medicamento.in_(medicamentos_ids))
-        ).all()
-
-    if current_user.tipo == "paciente":
-        paciente = session.exec(
-            select(Paciente).where(Paciente.id_usuario == current_user.id)
-        ).first()
-        
-        if not paciente:
-            raise HTTPException(404, "Paciente não encontrado")
-        
-        return session.exec(
-            select(Feedback).where(Feedback.id_paciente == paciente.id_paciente)
-        ).all()
+    if id_medicamento is not None:
+        query = query.where(Feedback.id_medicamento == id_medicamento)
+    if data_de is not None:
+        query = query.where(Feedback.data >= data_de)
+    if data_ate is not None:
+        query = query.where(Feedback.data <= data_ate)
 
-    raise HTTPException(403, "Você não tem permissão para ver feedbacks.")
+    return await run_db(paginar, query, Feedback.id_feedback, paginacao, response, leitura=True)
 
 
 @router.get("/{feedback_id}", response_model=Feedback)
 def get_feedback(
     feedback_id: int,
     session: Session = Depends(get_session),
-    current_user = Depends(get_current_user)
+    current_user = Depends(get_current_user),
+    perfil = Depends(get_current_profile)
 ):
     if not current_user.ativo:
         raise HTTPException(status_code=403, detail="Finalize seu cadastro")
@@ -106,9 +87,7 @@ def get_feedback(
 
     # PACIENTE só vê seus próprios
     if current_user.tipo == "paciente":
-        paciente = session.exec(
-            select(Paciente).where(Paciente.id_usuario == current_user.id)
-        ).first()
+        paciente = perfil
         
         if not paciente:
             raise HTTPException(404, "Paciente não encontrado")
@@ -119,9 +98,7 @@ def get_feedback(
 
     # FARMACÊUTICA só vê feedbacks dos seus medicamentos
     if current_user.tipo == "farmaceutica":
-        farmaceutica = session.exec(
-            select(Farmaceutica).where(Farmaceutica.id_usuario == current_user.id)
-        ).first()
+        farmaceutica = perfil
         
         if not farmaceutica:
             raise HTTPException(404, "Farmacêutica não encontrada")
@@ -145,7 +122,8 @@ def update_feedback(
     feedback_id: int,
     feedback: FeedbackUpdate,
     session: Session = Depends(get_session),
-    current_user = Depends(get_current_user)
+    current_user = Depends(get_current_user),
+    perfil = Depends(get_current_profile)
 ):
     if not current_user.ativo:
         raise HTTPException(status_code=403, detail="Finalize seu cadastro")
@@ -158,9 +136,7 @@ def update_feedback(
     if current_user.tipo != "paciente":
         raise HTTPException(403, "Somente pacientes podem alterar feedbacks")
 
-    paciente = session.exec(
-        select(Paciente).where(Paciente.id_usuario == current_user.id)
-    ).first()
+    paciente = perfil
     
     if not paciente:
         raise HTTPException(404, "Paciente não encontrado")
@@ -183,7 +159,8 @@ def update_feedback(
 def delete_feedback(
     feedback_id: int,
     session: Session = Depends(get_session),
-    current_user = Depends(get_current_user)
+    current_user = Depends(get_current_user),
+    perfil = Depends(get_current_profile)
 ):
     if not current_user.ativo:
         raise HTTPException(status_code=403, detail="Finalize seu cadastro") 
@@ -196,9 +173,7 @@ def delete_feedback(
     if current_user.tipo != "paciente":
         raise HTTPException(403, "Somente pacientes podem deletar feedbacks")
 
-    paciente = session.exec(
-        select(Paciente).where(Paciente.id_usuario == current_user.id)
-    ).first()
+    paciente = perfil
     
     if not paciente:
         raise HTTPException(404, "Paciente não encontrado")
@@ -206,6 +181,7 @@ def delete_feedback(
     if feedback.id_paciente != paciente.id_paciente:
         raise HTTPException(403, "Você só pode deletar seus próprios feedbacks")
 
+    marcar_feedback(session, feedback.id_medicamento)
     session.delete(feedback)
     session.commit()
     return {"message": "Feedback deletado com sucesso"}
\ No newline at end of file
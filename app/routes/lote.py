@@ -1,14 +1,27 @@
-from fastapi import APIRouter, HTTPException, Depends
-from sqlmodel import Session, select
-from typing import List
+from fastapi import APIRouter, HTTPException, Depends, Response, Body, File, UploadFile
+from sqlmodel import Session
+from typing import List, Optional
+import csv
 from datetime import datetime
-from models import Lote, LoteBase
-from database import get_session
-from auth.dependencies import get_current_user
+from models import Lote, LoteBase, ResultadoImportacao
+from database import get_session, run_db
+from auth.dependencies import get_current_user, get_current_profile
+from auth.permissions import Escopo, UserType, exigir_escopo, require_permissions
 from models import User, Farmaceutica, Medicamento
+from paginacao import Paginacao, paginar
+from services.snapshots import marcar_lote
+from services.importacao import importar_lotes, ler_csv
+from services.estoque import EstoqueInsuficiente, ajustar_saldo_lote, criar_saldo_lote, remover_saldo_lote
+from services.validade import situacao_validade
 
 router = APIRouter(prefix="/lotes", tags=["Lotes"])
 
+# Cadastro e importação de lotes: admin ou a farmacêutica dona do medicamento
+cadastro_lotes = require_permissions(
+    tipos=[UserType.ADMIN, UserType.FARMACEUTICA], detail="Acesso restrito a administradores e farmacêuticas."
+)
+leitura_lotes = exigir_escopo(Lote, detail="Acesso restrito a administradores e farmacêuticas.")
+
 
 
 # -------------------------
@@ -17,100 +30,109 @@ router = APIRouter(prefix="/lotes", tags=["Lotes"])
 @router.post("/", response_model=Lote)
 def create_lote(
     lote: LoteBase, 
-    session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_user)
+    escopo: Escopo = Depends(cadastro_lotes),
+    session: Session = Depends(get_session)
 ):
-    if current_user.tipo not in ["admin", "farmaceutica"]:
-        raise HTTPException(status_code=403, detail="Acesso restrito a administradores e farmacêuticas.")
-    
-    if not current_user.ativo:
-        raise HTTPException(status_code=403, detail="Finalize seu cadastro")
-
-    if current_user.tipo == "farmaceutica":
-        farmaceutica = session.exec(
-            select(Farmaceutica).where(Farmaceutica.id_usuario == current_user.id)
-        ).first()
-        if not farmaceutica:
-            raise HTTPException(status_code=404, detail="Farmacêutica não encontrada.")
-
+    if not escopo.admin:
         medicamento = session.get(Medicamento, lote.id_medicamento)
         if not medicamento:
             raise HTTPException(status_code=404, detail="Medicamento não encontrado.")
-        if medicamento.id_farmaceutica != farmaceutica.id_farmaceutica:
+        if medicamento.id_farmaceutica != escopo.id_perfil:
             raise HTTPException(status_code=403, detail="Você não pode criar lotes para medicamentos de outras farmacêuticas.")
 
     # Converte LoteBase em Lote (model de tabela)
     db_lote = Lote.model_validate(lote)
+    db_lote.situacao_validade = situacao_validade(db_lote.data_vencimento)
     
     session.add(db_lote)
+    session.flush()
+    criar_saldo_lote(session, db_lote.id_lote, db_lote.quantidade)
+    marcar_lote(session, db_lote.id_medicamento)
     session.commit()
     session.refresh(db_lote)
     return db_lote
 
 
+# -------------------------
+# Importar lotes em massa
+# -------------------------
+# Máximo de linhas por requisição de importação
+MAXIMO_LINHAS_IMPORTACAO = 10000
+
+
+def _verificar_tamanho(registros: list):
+    if len(registros) > MAXIMO_LINHAS_IMPORTACAO:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Importe no máximo {MAXIMO_LINHAS_IMPORTACAO} lotes por requisição."
+        )
+
+
+@router.post("/importar", response_model=ResultadoImportacao)
+def importar_lotes_json(
+    lotes: List[dict] = Body(..., description="Lista de lotes no formato de LoteBase"),
+    escopo: Escopo = Depends(cadastro_lotes),
+    session: Session = Depends(get_session)
+):
+    """Cria vários lotes de uma vez; erros são informados por linha (posição na lista, a partir de 1)"""
+    # Admin (id_perfil None) importa para qualquer farmacêutica
+    id_farmaceutica = escopo.id_perfil
+    _verificar_tamanho(lotes)
+    return importar_lotes(session, enumerate(lotes, start=1), id_farmaceutica)
+
+
+@router.post("/importar/csv", response_model=ResultadoImportacao)
+def importar_lotes_csv(
+    arquivo: UploadFile = File(..., description="CSV com cabeçalho: codigo_lote, data_fabricacao, data_vencimento, quantidade, id_medicamento"),
+    escopo: Escopo = Depends(cadastro_lotes),
+    session: Session = Depends(get_session)
+):
+    """Cria vários lotes a partir de um CSV; erros são informados pela linha do arquivo"""
+    # Admin (id_perfil None) importa para qualquer farmacêutica
+    id_farmaceutica = escopo.id_perfil
+
+    try:
+        registros = ler_csv(arquivo.file.read())
+    except (UnicodeDecodeError, csv.Error):
+        raise HTTPException(status_code=400, detail="Envie um arquivo CSV em UTF-8.")
+
+    _verificar_tamanho(registros)
+    return importar_lotes(session, registros, id_farmaceutica)
+
+
 # -------------------------
 # Listar todos os lotes
 # -------------------------
 @router.get("/", response_model=List[Lote])
-def list_lotes(
-    session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_user)
+async def list_lotes(
+    response: Response,
+    id_medicamento: Optional[int] = None,
+    vencimento_de: Optional[datetime] = None,
+    vencimento_ate: Optional[datetime] = None,
+    paginacao: Paginacao = Depends(),
+    escopo: Escopo = Depends(leitura_lotes)
 ):
-    if not current_user.ativo:
-        raise HTTPException(status_code=403, detail="Finalize seu cadastro")
-    
-    if current_user.tipo == "admin":
-        return session.exec(select(Lote)).all()
+    query = escopo.consulta(Lote)
 
-    elif current_user.tipo == "farmaceutica":
-        farmaceutica = session.exec(
-            select(Farmaceutica).where(Farmaceutica.id_usuario == current_user.id)
-        ).first()
-        if not farmaceutica:
-            raise HTTPException(status_code=404, detail="Farmacêutica não encontrada.")
-
-        query = (
-            select(Lote)
-            .join(Medicamento)
-            .where(Medicamento.id_farmaceutica == farmaceutica.id_farmaceutica)
-        )
-        return session.exec(query).all()
+    if id_medicamento is not None:
+        query = query.where(Lote.id_medicamento == id_medicamento)
+    if vencimento_de is not None:
+        query = query.where(Lote.data_vencimento >= vencimento_de)
+    if vencimento_ate is not None:
+        query = query.where(Lote.data_vencimento <= vencimento_ate)
 
-    else:
-        raise HTTPException(status_code=403, detail="Acesso restrito a administradores e farmacêuticas.")
+    return await run_db(paginar, query, Lote.id_lote, paginacao, response, leitura=True)
     
 
 @router.get("/vencidos/", response_model=List[Lote])
-def list_lotes_vencidos(
-    session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_user)
+async def list_lotes_vencidos(
+    response: Response,
+    paginacao: Paginacao = Depends(),
+    escopo: Escopo = Depends(leitura_lotes)
 ):
-    now = datetime.now()
-    if not current_user.ativo:
-        raise HTTPException(status_code=403, detail="Finalize seu cadastro")
-    
-    # Admin vê tudo
-    if current_user.tipo == "admin":
-        query = select(Lote).where(Lote.data_vencimento < now)
-        return session.exec(query).all()
-
-    # Farmacêutica vê só os lotes dos seus medicamentos
-    if current_user.tipo == "farmaceutica":
-        farmaceutica = session.exec(
-            select(Farmaceutica).where(Farmaceutica.id_usuario == current_user.id)
-        ).first()
-        if not farmaceutica:
-            raise HTTPException(status_code=404, detail="Farmacêutica não encontrada.")
-
-        query = (
-            select(Lote)
-            .join(Medicamento)
-            .where(
-                Medicamento.id_farmaceutica == farmaceutica.id_farmaceutica,
-                Lote.data_vencimento < now
-            )
-        )
-        return session.exec(query).all()
+    # Admin vê tudo; farmacêutica só os lotes dos seus medicamentos
+    query = escopo.consulta(Lote).where(Lote.situacao_validade == "vencido")
+    return await run_db(paginar, query, Lote.id_lote, paginacao, response, leitura=True)
 
 
 # -------------------------
@@ -120,7 +142,8 @@ def list_lotes_vencidos(
 def get_lote(
     lote_id: int,
     session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    perfil = Depends(get_current_profile)
 ):
     if not current_user.ativo:
         raise HTTPException(status_code=403, detail="Finalize seu cadastro")
@@ -133,9 +156,7 @@ def get_lote(
         return lote
 
     if current_user.tipo == "farmaceutica":
-        farmaceutica = session.exec(
-            select(Farmaceutica).where(Farmaceutica.id_usuario == current_user.id)
-        ).first()
+        farmaceutica = perfil
         medicamento = session.get(Medicamento, lote.id_medicamento)
         if medicamento.id_farmaceutica != farmaceutica.id_farmaceutica:
             raise HTTPException(status_code=403, detail="Acesso negado a este lote.")
@@ -152,7 +173,8 @@ def update_lote(
     lote_id: int,
     lote: LoteBase,
     session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    perfil = Depends(get_current_profile)
 ):
     if not current_user.ativo:
         raise HTTPException(status_code=403, detail="Finalize seu cadastro")
@@ -166,20 +188,30 @@ def update_lote(
         pass
     # Farmacêutica pode editar só seus lotes
     elif current_user.tipo == "farmaceutica":
-        farmaceutica = session.exec(
-            select(Farmaceutica).where(Farmaceutica.id_usuario == current_user.id)
-        ).first()
+        farmaceutica = perfil
         medicamento = session.get(Medicamento, db_lote.id_medicamento)
         if medicamento.id_farmaceutica != farmaceutica.id_farmaceutica:
             raise HTTPException(status_code=403, detail="Você não pode editar lotes de outras farmacêuticas.")
     else:
         raise HTTPException(status_code=403, detail="Acesso negado.")
 
+    id_medicamento_anterior = db_lote.id_medicamento
     lote_data = lote.model_dump(exclude_unset=True, exclude={"id_lote"})
+
+    # A mudança de quantidade vale também para o saldo ainda não distribuído
+    try:
+        ajustar_saldo_lote(session, lote_id, lote_data.get("quantidade", db_lote.quantidade) - db_lote.quantidade)
+    except EstoqueInsuficiente:
+        raise HTTPException(status_code=409, detail="A quantidade do lote não pode ser menor que a já distribuída.")
+
     for key, value in lote_data.items():
         setattr(db_lote, key, value)
+    db_lote.situacao_validade = situacao_validade(db_lote.data_vencimento)
 
     session.add(db_lote)
+    marcar_lote(session, id_medicamento_anterior, ids_lote=[lote_id])
+    if db_lote.id_medicamento != id_medicamento_anterior:
+        marcar_lote(session, db_lote.id_medicamento)
     session.commit()
     session.refresh(db_lote)
     return db_lote
@@ -192,7 +224,8 @@ def update_lote(
 def delete_lote(
     lote_id: int,
     session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    perfil = Depends(get_current_profile)
 ):
     if not current_user.ativo:
         raise HTTPException(status_code=403, detail="Finalize seu cadastro")
@@ -204,15 +237,15 @@ def delete_lote(
     if current_user.tipo == "admin":
         pass
     elif current_user.tipo == "farmaceutica":
-        farmaceutica = session.exec(
-            select(Farmaceutica).where(Farmaceutica.id_usuario == current_user.id)
-        ).first()
+        farmaceutica = perfil
         medicamento = session.get(Medicamento, lote.id_medicamento)
         if medicamento.id_farmaceutica != farmaceutica.id_farmaceutica:
             raise HTTPException(status_code=403, detail="Você não pode deletar lotes de outras farmacêuticas.")
     else:
         raise HTTPException(status_code=403, detail="Acesso negado.")
 
+    remover_saldo_lote(session, lote_id)
+    marcar_lote(session, lote.id_medicamento, ids_lote=[lote_id])
     session.delete(lote)
     session.commit()
     return {"message": "Lote deletado com sucesso"}
@@ -1,9 +1,11 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request, Response
 from sqlmodel import Session, select
-from typing import List
-from auth.dependencies import get_current_user
+from typing import List, Optional
+from auth.dependencies import get_current_user, get_current_profile
 from models import Farmaceutica, Medicamento
-from database import get_session
+from database import get_session, get_read_session, run_db
+from paginacao import Paginacao, paginar
+from cache_respostas import cache_respostas
 
 router = APIRouter(prefix="/medicamentos", tags=["Medicamentos"])
 
@@ -11,7 +13,7 @@ router = APIRouter(prefix="/medicamentos", tags=["Medicamentos"])
 # ////////////////////////////////////////////////////////////
 
 @router.post("/", response_model=Medicamento)
-def create_medicamento(medicamento: Medicamento, current_user = Depends(get_current_user), session: Session = Depends(get_session)):
+def create_medicamento(medicamento: Medicamento, current_user = Depends(get_current_user), perfil = Depends(get_current_profile), session: Session = Depends(get_session)):
     if current_user.tipo != "admin" and current_user.tipo != "farmaceutica":
         raise HTTPException(status_code=403, detail="Você não tem permissão para criar medicamentos")
     
@@ -19,9 +21,7 @@ def create_medicamento(medicamento: Medicamento, current_user = Depends(get_curr
         raise HTTPException(status_code=403, detail="Finalize seu cadastro")
 
     if current_user.tipo == "farmaceutica":
-        farmaceutica = session.exec(
-            select(Farmaceutica).where(Farmaceutica.id_usuario == current_user.id)
-        ).first()
+        farmaceutica = perfil
 
         if not farmaceutica:
             raise HTTPException(status_code=404, detail="Farmacêutica não encontrada")
@@ -31,6 +31,7 @@ def create_medicamento(medicamento: Medicamento, current_user = Depends(get_curr
     session.add(medicamento)
     session.commit()
     session.refresh(medicamento)
+    cache_respostas.invalidar("medicamentos")
     return medicamento
 
 
@@ -41,31 +42,47 @@ def create_medicamento(medicamento: Medicamento, current_user = Depends(get_curr
 # ///////////////////////////////////////////////////////////
 
 @router.get("/", response_model=List[Medicamento])
-def list_medicamentos(session: Session = Depends(get_session), current_user = Depends(get_current_user)):
+async def list_medicamentos(
+    request: Request,
+    response: Response,
+    alto_custo: Optional[bool] = None,
+    id_farmaceutica: Optional[int] = None,
+    paginacao: Paginacao = Depends(),
+    current_user = Depends(get_current_user),
+    perfil = Depends(get_current_profile)
+):
     if current_user.tipo != "admin" and current_user.tipo != "farmaceutica":
         raise HTTPException(status_code=403, detail="Você não tem permissão para criar medicamentos")
     
     if not current_user.ativo:
         raise HTTPException(status_code=403, detail="Finalize seu cadastro")
 
-    medicamentos = session.exec(select(Medicamento)).all()
+    query = select(Medicamento)
+    escopo = "admin"
     if current_user.tipo == "farmaceutica":
-        farmaceutica = session.exec(
-            select(Farmaceutica).where(Farmaceutica.id_usuario == current_user.id)
-        ).first()
+        farmaceutica = perfil
 
         if not farmaceutica:
             raise HTTPException(status_code=404, detail="Farmacêutica não encontrada")
         
-        medicamentos = session.exec(
-            select(Medicamento).where(Medicamento.id_farmaceutica == farmaceutica.id_farmaceutica)
-        ).all()
+        query = query.where(Medicamento.id_farmaceutica == farmaceutica.id_farmaceutica)
+        escopo = f"farmaceutica:{farmaceutica.id_farmaceutica}"
+    elif id_farmaceutica is not None:
+        query = query.where(Medicamento.id_farmaceutica == id_farmaceutica)
+
+    em_cache, chave = cache_respostas.buscar(request, "medicamentos", escopo)
+    if em_cache:
+        return em_cache
+
+    if alto_custo is not None:
+        query = query.where(Medicamento.alto_custo == alto_custo)
     
-    return medicamentos
+    medicamentos = await run_db(paginar, query, Medicamento.id_medicamento, paginacao, response, leitura=True)
+    return cache_respostas.guardar(request, chave, medicamentos, List[Medicamento], response, escopo)
 
 
 @router.get("/{medicamento_id}", response_model=Medicamento)
-def get_medicamento(medicamento_id: int, session: Session = Depends(get_session), current_user = Depends(get_current_user)):
+def get_medicamento(medicamento_id: int, session: Session = Depends(get_session), current_user = Depends(get_current_user), perfil = Depends(get_current_profile)):
     if current_user.tipo != "admin" and current_user.tipo != "farmaceutica":
         raise HTTPException(status_code=403, detail="Você não tem permissão para criar medicamentos")
     
@@ -77,9 +94,7 @@ def get_medicamento(medicamento_id: int, session: Session = Depends(get_session)
         raise HTTPException(status_code=404, detail="Medicamento não encontrado")
     
     if current_user.tipo == "farmaceutica":
-        farmaceutica = session.exec(
-            select(Farmaceutica).where(Farmaceutica.id_usuario == current_user.id)
-        ).first()
+        farmaceutica = perfil
 
         if not farmaceutica:
             raise HTTPException(status_code=404, detail="Farmacêutica não encontrada")
@@ -93,7 +108,7 @@ def get_medicamento(medicamento_id: int, session: Session = Depends(get_session)
 @router.get("/farmaceutica/{farmaceutica_id}", response_model=List[Medicamento])
 def list_medicamentos_by_farmaceutica(
     farmaceutica_id: int, 
-    session: Session = Depends(get_session), 
+    session: Session = Depends(get_read_session), 
     current_user = Depends(get_current_user)
 ):
     if current_user.tipo != "admin":
@@ -110,8 +125,10 @@ def list_medicamentos_by_farmaceutica(
 
 @router.get("/alto_custo/", response_model=List[Medicamento])
 def list_medicamentos_alto_custo(
-    session: Session = Depends(get_session), 
-    current_user = Depends(get_current_user)
+    request: Request,
+    session: Session = Depends(get_read_session), 
+    current_user = Depends(get_current_user),
+    perfil = Depends(get_current_profile)
 ):
     if current_user.tipo != "admin" and current_user.tipo != "farmaceutica":
         raise HTTPException(status_code=403, detail="Você não tem permissão para ver estes medicamentos")
@@ -119,26 +136,24 @@ def list_medicamentos_alto_custo(
     if not current_user.ativo:
         raise HTTPException(status_code=403, detail="Finalize seu cadastro")
 
-    medicamentos = session.exec(
-        select(Medicamento).where(Medicamento.alto_custo == True)
-    ).all() 
+    query = select(Medicamento).where(Medicamento.alto_custo == True)
+    escopo = "admin"
 
     if current_user.tipo == "farmaceutica":
-        farmaceutica = session.exec(
-            select(Farmaceutica).where(Farmaceutica.id_usuario == current_user.id)
-        ).first()
+        farmaceutica = perfil
 
         if not farmaceutica:
             raise HTTPException(status_code=404, detail="Farmacêutica não encontrada")
         
-        medicamentos = session.exec(
-            select(Medicamento).where(
-                Medicamento.alto_custo == True,
-                Medicamento.id_farmaceutica == farmaceutica.id_farmaceutica
-            )
-        ).all()
-    
-    return medicamentos
+        query = query.where(Medicamento.id_farmaceutica == farmaceutica.id_farmaceutica)
+        escopo = f"farmaceutica:{farmaceutica.id_farmaceutica}"
+
+    em_cache, chave = cache_respostas.buscar(request, "medicamentos", escopo)
+    if em_cache:
+        return em_cache
+
+    medicamentos = session.exec(query).all()
+    return cache_respostas.guardar(request, chave, medicamentos, List[Medicamento], escopo=escopo)
 
 
 # ///////////////////////////////////////////////////////////
@@ -152,7 +167,8 @@ def update_medicamento(
     medicamento_id: int, 
     medicamento: Medicamento, 
     session: Session = Depends(get_session),
-    current_user = Depends(get_current_user)
+    current_user = Depends(get_current_user),
+    perfil = Depends(get_current_profile)
 ):
     if current_user.tipo != "admin" and current_user.tipo != "farmaceutica":
         raise HTTPException(status_code=403, detail="Você não tem permissão para alterar medicamentos")
@@ -165,9 +181,7 @@ def update_medicamento(
         raise HTTPException(status_code=404, detail="Medicamento não encontrado")
     
     if current_user.tipo == "farmaceutica":
-        farmaceutica = session.exec(
-            select(Farmaceutica).where(Farmaceutica.id_usuario == current_user.id)
-        ).first()
+        farmaceutica = perfil
 
         if not farmaceutica:
             raise HTTPException(status_code=404, detail="Farmacêutica não encontrada")
@@ -182,6 +196,7 @@ def update_medicamento(
     session.add(db_medicamento)
     session.commit()
     session.refresh(db_medicamento)
+    cache_respostas.invalidar("medicamentos")
     
     return db_medicamento
 
@@ -192,7 +207,7 @@ def update_medicamento(
 # ///////////////////////////////////////////////////////////
 
 @router.delete("/{medicamento_id}")
-def delete_medicamento(medicamento_id: int, session: Session = Depends(get_session), current_user = Depends(get_current_user)):
+def delete_medicamento(medicamento_id: int, session: Session = Depends(get_session), current_user = Depends(get_current_user), perfil = Depends(get_current_profile)):
 
     if current_user.tipo != "admin" and current_user.tipo != "farmaceutica":
         raise HTTPException(status_code=403, detail="Você não tem permissão para deletar medicamentos")
@@ -205,9 +220,7 @@ def delete_medicamento(medicamento_id: int, session: Session = Depends(get_sessi
         raise HTTPException(status_code=404, detail="Medicamento não encontrado")
 
     if current_user.tipo == "farmaceutica":
-        farmaceutica = session.exec(
-            select(Farmaceutica).where(Farmaceutica.id_usuario == current_user.id)
-        ).first()
+        farmaceutica = perfil
 
         if not farmaceutica:
             raise HTTPException(status_code=404, detail="Farmacêutica não encontrada")
@@ -220,4 +233,5 @@ def delete_medicamento(medicamento_id: int, session: Session = Depends(get_sessi
 
     session.delete(medicamento)
     session.commit()
+    cache_respostas.invalidar("medicamentos")
     return {"message": "Medicamento deletado com sucesso"}
\ No newline at end of file
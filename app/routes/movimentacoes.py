@@ -1,10 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlmodel import Session, select
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from sqlmodel import Session, select, update
+from typing import List, Optional
 from datetime import datetime
 from models import (
+    ConfirmacaoEmMassa,
     DistribuidorParaSUS,
+    EnvioEmMassa,
+    Lote,
     Paciente,
+    ResultadoConfirmacao,
     SUSParaUBS,
     SUSParaUBSBase,
     UBSParaPaciente,
@@ -13,14 +17,245 @@ from models import (
     UBS,
     User,
 )
-from database import get_session
-from auth.dependencies import get_current_user
+from database import get_session, run_db
+from auth.dependencies import get_current_user, get_current_profile
+from auth.permissions import Escopo, UserType, exigir_escopo, require_permissions
+from services.estoque import (
+    aplicar_envios, aplicar_movimentacao, estornar_movimentacao, refazer_movimentacao,
+    registrar_recebimento, registrar_recebimentos
+)
+from paginacao import Paginacao, paginar
+from exportacao import exportar, parametro_formato
 
 # Routers separados
 router_dps = APIRouter(prefix="/distribuidores-sus", tags=["Distribuidor → SUS"])
 router_spu = APIRouter(prefix="/sus-ubs", tags=["SUS → UBS"])
 router_upp = APIRouter(prefix="/ubs-pacientes", tags=["UBS → Paciente"])
 
+# Quem pode enviar e quem confirma o recebimento em cada etapa (além do admin)
+envio_dps = require_permissions(
+    tipos=[UserType.ADMIN, UserType.DISTRIBUIDOR], detail="Acesso restrito a distribuidores e administradores"
+)
+envio_spu = require_permissions(tipos=[UserType.ADMIN, UserType.SUS], detail="Acesso restrito a SUS e administradores")
+envio_upp = require_permissions(tipos=[UserType.ADMIN, UserType.UBS], detail="Acesso restrito a UBS e administradores")
+recebimento_dps = require_permissions(tipos=[UserType.ADMIN, UserType.SUS], detail="Acesso restrito a SUS")
+recebimento_spu = require_permissions(tipos=[UserType.ADMIN, UserType.UBS], detail="Acesso restrito a UBS")
+recebimento_upp = require_permissions(tipos=[UserType.ADMIN, UserType.PACIENTE], detail="Acesso restrito a pacientes")
+
+# Quem vê as movimentações de cada etapa (listagem e exportação)
+leitura_dps = exigir_escopo(DistribuidorParaSUS, detail="Sem permissão para visualizar")
+leitura_spu = exigir_escopo(SUSParaUBS, detail="Sem permissão")
+leitura_upp = exigir_escopo(UBSParaPaciente, detail="Sem permissão")
+
+
+class FiltrosMovimentacao:
+    """Filtros comuns às listagens de movimentações"""
+
+    def __init__(
+        self,
+        status: Optional[str] = None,
+        id_lote: Optional[int] = None,
+        enviado_de: Optional[datetime] = None,
+        enviado_ate: Optional[datetime] = None,
+    ):
+        self.status = status
+        self.id_lote = id_lote
+        self.enviado_de = enviado_de
+        self.enviado_ate = enviado_ate
+
+    def aplicar(self, query, modelo):
+        if self.status is not None:
+            query = query.where(modelo.status == self.status)
+        if self.id_lote is not None:
+            query = query.where(modelo.id_lote == self.id_lote)
+        if self.enviado_de is not None:
+            query = query.where(modelo.data_envio >= self.enviado_de)
+        if self.enviado_ate is not None:
+            query = query.where(modelo.data_envio <= self.enviado_ate)
+        return query
+
+
+def _confirmar_recebimento(session: Session, modelo, id_movimentacao: int, campo_destino: str, id_destino: Optional[int]):
+    """Confirma o recebimento da movimentação pelo destinatário (id_destino None: admin)"""
+    movimentacao = session.get(modelo, id_movimentacao)
+    if not movimentacao:
+        raise HTTPException(status_code=404, detail="Movimentação não encontrada")
+
+    if id_destino is not None and getattr(movimentacao, campo_destino) != id_destino:
+        raise HTTPException(status_code=403, detail="Você não é o destinatário desta movimentação")
+
+    # O status no WHERE garante que uma confirmação concorrente não credite o destino duas vezes
+    coluna_id = modelo.__table__.primary_key.columns[0]
+    confirmada = session.exec(
+        update(modelo)
+        .where(coluna_id == id_movimentacao, modelo.status != "recebido")
+        .values(status="recebido", data_recebimento=datetime.now())
+        .returning(coluna_id)
+        .execution_options(synchronize_session=False)
+    ).first()
+    if confirmada is None:
+        return {"message": "Recebimento já confirmado"}
+
+    registrar_recebimento(session, movimentacao)
+    session.commit()
+    return {"message": "Recebimento confirmado com sucesso"}
+
+
+def _confirmar_em_massa(
+    session: Session,
+    modelo,
+    campo_id: str,
+    ids: List[int],
+    campo_destino: str,
+    id_destino: Optional[int]
+):
+    """
+    Confirma de uma vez o recebimento de várias movimentações do destinatário (id_destino None: admin).
+    As que não existem ou são de outro destinatário aparecem como nao_encontrado.
+    """
+    coluna_id = getattr(modelo, campo_id)
+    ids = list(dict.fromkeys(ids))
+    condicoes = [coluna_id.in_(ids)]
+    if id_destino is not None:
+        condicoes.append(getattr(modelo, campo_destino) == id_destino)
+
+    movimentacoes = {
+        getattr(movimentacao, campo_id): movimentacao
+        for movimentacao in session.exec(select(modelo).where(*condicoes)).all()
+    }
+    pendentes = [id_mov for id_mov, movimentacao in movimentacoes.items() if movimentacao.status != "recebido"]
+
+    confirmadas = set()
+    if pendentes:
+        # O status no WHERE garante que uma confirmação concorrente não credite o destino duas vezes
+        confirmadas = set(session.exec(
+            update(modelo)
+            .where(*condicoes, coluna_id.in_(pendentes), modelo.status != "recebido")
+            .values(status="recebido", data_recebimento=datetime.now())
+            .returning(coluna_id)
+            .execution_options(synchronize_session=False)
+        ).scalars().all())
+
+    if confirmadas:
+        registrar_recebimentos(session, [movimentacoes[id_mov] for id_mov in confirmadas])
+        session.commit()
+
+    resultados = []
+    for id_mov in ids:
+        if id_mov in confirmadas:
+            resultado = "confirmado"
+        elif id_mov in movimentacoes:
+            resultado = "ja_confirmado"
+        else:
+            resultado = "nao_encontrado"
+        resultados.append(ResultadoConfirmacao(id=id_mov, resultado=resultado))
+    return resultados
+
+
+# Máximo de itens por envio ou confirmação em massa
+MAXIMO_ITENS_ENVIO = 5000
+
+
+def _verificar_quantidade(itens: list):
+    if len(itens) > MAXIMO_ITENS_ENVIO:
+        raise HTTPException(status_code=413, detail=f"Envie no máximo {MAXIMO_ITENS_ENVIO} itens por requisição")
+
+
+def _origem_do_envio(escopo: Escopo, envio: EnvioEmMassa) -> int:
+    """Entidade que envia a remessa: o próprio perfil, ou a informada em id_origem pelo admin"""
+    _verificar_quantidade(envio.itens)
+
+    if escopo.admin:
+        if envio.id_origem is None:
+            raise HTTPException(status_code=400, detail="Informe id_origem")
+        return envio.id_origem
+    return escopo.id_perfil
+
+
+# Destinos válidos de cada etapa, entre os informados: consultas usadas tanto pelos envios
+# individuais quanto pelos em massa, para que as duas rotas apliquem as mesmas regras
+def _destinos_dps(ids_sus):
+    return select(SUS.id_sus).where(SUS.id_sus.in_(ids_sus))
+
+
+def _destinos_spu(id_sus: int, ids_ubs):
+    """Só UBS da região do SUS que envia"""
+    return select(UBS.id_ubs).where(UBS.id_ubs.in_(ids_ubs), UBS.id_sus == id_sus)
+
+
+def _destinos_upp(id_ubs: int, ids_pacientes):
+    """Só pacientes cadastrados na UBS que envia"""
+    return select(Paciente.id_paciente).where(
+        Paciente.id_paciente.in_(ids_pacientes),
+        Paciente.id_ubs == id_ubs
+    )
+
+
+ERRO_DESTINO_DPS = "SUS não encontrado"
+ERRO_DESTINO_SPU = "UBS não encontrada na região deste SUS"
+ERRO_DESTINO_UPP = "Paciente não cadastrado nesta UBS"
+
+
+def _validar_destino(session: Session, destinos, erro: str):
+    """Envio individual: o destino precisa estar entre os válidos da etapa"""
+    if session.exec(destinos).first() is None:
+        raise HTTPException(status_code=400, detail=erro)
+
+
+def _enviar_em_massa(
+    session: Session,
+    modelo,
+    modelo_origem,
+    campo_origem: str,
+    id_origem: int,
+    campo_destino: str,
+    destinos,
+    erro_destino: str,
+    envio: EnvioEmMassa
+):
+    """
+    Cria todas as movimentações da remessa em uma única transação, ou nenhuma.
+    destinos: consulta com os ids de destino válidos entre os informados.
+    Itens inválidos são reportados juntos, pela posição na lista (a partir de 0).
+    """
+    if modelo_origem is not None and not session.get(modelo_origem, id_origem):
+        raise HTTPException(status_code=404, detail="Origem não encontrada")
+
+    lotes = set(session.exec(
+        select(Lote.id_lote).where(Lote.id_lote.in_({item.id_lote for item in envio.itens}))
+    ).all())
+    destinos = set(session.exec(destinos).all())
+
+    erros = []
+    for indice, item in enumerate(envio.itens):
+        if item.id_lote not in lotes:
+            erros.append({"item": indice, "erro": "Lote não encontrado"})
+        elif item.id_destino not in destinos:
+            erros.append({"item": indice, "erro": erro_destino})
+    if erros:
+        raise HTTPException(status_code=400, detail=erros)
+
+    agora = datetime.now()
+    movimentacoes = [
+        modelo(**{
+            campo_origem: id_origem,
+            campo_destino: item.id_destino,
+            "id_lote": item.id_lote,
+            "quantidade": item.quantidade,
+            "data_envio": agora,
+            "status": "em transito",
+        })
+        for item in envio.itens
+    ]
+    session.add_all(movimentacoes)
+    session.flush()
+    aplicar_envios(session, movimentacoes)
+
+    # Serializa antes do commit, que expiraria os objetos (uma consulta por item ao ler)
+    criadas = [movimentacao.model_dump() for movimentacao in movimentacoes]
+    session.commit()
+    return criadas
+
 # ==========================================================
 # DISTRIBUIDOR → SUS
 # ==========================================================
@@ -28,67 +263,65 @@ router_upp = APIRouter(prefix="/ubs-pacientes", tags=["UBS → Paciente"])
 @router_dps.post("/", response_model=DistribuidorParaSUS, status_code=status.HTTP_201_CREATED)
 def create_dps(
     dps: DistribuidorParaSUS,
-    session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_user)
+    escopo: Escopo = Depends(envio_dps),
+    session: Session = Depends(get_session)
 ):
-    if current_user.tipo not in ["admin", "distribuidor"]:
-        raise HTTPException(status_code=403, detail="Acesso restrito a distribuidores e administradores")
-    
-    if not current_user.ativo:
-        raise HTTPException(status_code=403, detail="Finalize seu cadastro")
-
-    if current_user.tipo == "distribuidor":
-        distribuidor = session.exec(
-            select(Distribuidor).where(Distribuidor.id_usuario == current_user.id)
-        ).first()
-        if not distribuidor:
-            raise HTTPException(status_code=404, detail="Distribuidor não encontrado")
-        dps.id_distribuidor = distribuidor.id_distribuidor
+    if not escopo.admin:
+        dps.id_distribuidor = escopo.id_perfil
+    _validar_destino(session, _destinos_dps([dps.id_sus]), ERRO_DESTINO_DPS)
 
     dps.data_envio = datetime.now()
     dps.status = "em transito"
 
     session.add(dps)
+    aplicar_movimentacao(session, dps)
     session.commit()
     session.refresh(dps)
     return dps
 
 
-@router_dps.get("/", response_model=List[DistribuidorParaSUS])
-def list_dps(session: Session = Depends(get_session), current_user: User = Depends(get_current_user)):
-    if not current_user.ativo:
-        raise HTTPException(status_code=403, detail="Finalize seu cadastro")
-
-    query = select(DistribuidorParaSUS)
-
-    # DISTRIBUIDOR só vê as dele
-    if current_user.tipo == "distribuidor":
-        distribuidor = session.exec(
-            select(Distribuidor).where(Distribuidor.id_usuario == current_user.id)
-        ).first()
+@router_dps.post("/em-massa", response_model=List[DistribuidorParaSUS], status_code=status.HTTP_201_CREATED)
+async def create_dps_em_massa(
+    envio: EnvioEmMassa,
+    escopo: Escopo = Depends(envio_dps)
+):
+    """Remessa do distribuidor para vários SUS (id_destino: id_sus)"""
+    id_distribuidor = _origem_do_envio(escopo, envio)
+    destinos = _destinos_dps({item.id_destino for item in envio.itens})
 
-        if not distribuidor:
-            raise HTTPException(404, "Distribuidor não encontrado")
+    return await run_db(
+        _enviar_em_massa, DistribuidorParaSUS,
+        Distribuidor if escopo.admin else None,
+        "id_distribuidor", id_distribuidor, "id_sus",
+        destinos, ERRO_DESTINO_DPS, envio
+    )
 
-        query = query.where(DistribuidorParaSUS.id_distribuidor == distribuidor.id_distribuidor)
 
-    # SUS só vê movimentações destinadas a ele
-    if current_user.tipo == "sus":
-        sus = session.exec(select(SUS).where(SUS.id_usuario == current_user.id)).first()
-    
-        if not sus:
-            raise HTTPException(404, "SUS não encontrado")
-        query = query.where(DistribuidorParaSUS.id_sus == sus.id_sus)
+@router_dps.get("/", response_model=List[DistribuidorParaSUS])
+async def list_dps(
+    response: Response,
+    filtros: FiltrosMovimentacao = Depends(),
+    paginacao: Paginacao = Depends(),
+    escopo: Escopo = Depends(leitura_dps)
+):
+    query = filtros.aplicar(escopo.consulta(DistribuidorParaSUS), DistribuidorParaSUS)
+    return await run_db(paginar, query, DistribuidorParaSUS.id_dps, paginacao, response, leitura=True)
 
-    if current_user.tipo not in ["admin", "distribuidor", "sus"]:
-        raise HTTPException(403, "Sem permissão para visualizar")
 
-    return session.exec(query).all()
+@router_dps.get("/exportar")
+def exportar_dps(
+    formato: str = Depends(parametro_formato),
+    filtros: FiltrosMovimentacao = Depends(),
+    escopo: Escopo = Depends(leitura_dps)
+):
+    """Exporta todas as movimentações visíveis em NDJSON ou CSV, transmitidas aos poucos"""
+    query = filtros.aplicar(escopo.consulta(DistribuidorParaSUS), DistribuidorParaSUS)
+    return exportar(query, DistribuidorParaSUS, formato, "distribuidores-sus")
 
 
 
 @router_dps.get("/{id_dps}", response_model=DistribuidorParaSUS)
-def get_dps(id_dps: int, session: Session = Depends(get_session), current_user: User = Depends(get_current_user)):
+def get_dps(id_dps: int, session: Session = Depends(get_session), current_user: User = Depends(get_current_user), perfil = Depends(get_current_profile)):
     if not current_user.ativo:
         raise HTTPException(status_code=403, detail="Finalize seu cadastro")
     
@@ -100,9 +333,7 @@ def get_dps(id_dps: int, session: Session = Depends(get_session), current_user:
         return dps
 
     if current_user.tipo == "distribuidor":
-        distribuidor = session.exec(
-            select(Distribuidor).where(Distribuidor.id_usuario == current_user.id)
-        ).first()
+        distribuidor = perfil
     
         if not distribuidor:
             raise HTTPException(404, "Distribuidor não encontrado")
@@ -111,7 +342,7 @@ def get_dps(id_dps: int, session: Session = Depends(get_session), current_user:
         return dps
 
     if current_user.tipo == "sus":
-        sus = session.exec(select(SUS).where(SUS.id_usuario == current_user.id)).first()
+        sus = perfil
     
         if not sus:
             raise HTTPException(404, "SUS não encontrado")
@@ -123,7 +354,7 @@ def get_dps(id_dps: int, session: Session = Depends(get_session), current_user:
 
 
 @router_dps.put("/{id_dps}", response_model=DistribuidorParaSUS)
-def update_dps(id_dps: int, dps_data: DistribuidorParaSUS, session: Session = Depends(get_session), current_user: User = Depends(get_current_user)):
+def update_dps(id_dps: int, dps_data: DistribuidorParaSUS, session: Session = Depends(get_session), current_user: User = Depends(get_current_user), perfil = Depends(get_current_profile)):
     if not current_user.ativo:
         raise HTTPException(status_code=403, detail="Finalize seu cadastro")
     
@@ -135,18 +366,15 @@ def update_dps(id_dps: int, dps_data: DistribuidorParaSUS, session: Session = De
         raise HTTPException(403, "Sem permissão")
 
     if current_user.tipo == "distribuidor":
-        distribuidor = session.exec(
-            select(Distribuidor).where(Distribuidor.id_usuario == current_user.id)
-        ).first()
+        distribuidor = perfil
     
         if not distribuidor:
             raise HTTPException(404, "Distribuidor não encontrado")
         if dps.id_distribuidor != distribuidor.id_distribuidor:
             raise HTTPException(403, "Você só pode alterar suas próprias movimentações")
 
-    # aplica atualização
-    for k, v in dps_data.model_dump(exclude_unset=True, exclude={"id_dps"}).items():
-        setattr(dps, k, v)
+    # aplica atualização (refazendo o lançamento no estoque)
+    refazer_movimentacao(session, dps, dps_data.model_dump(exclude_unset=True, exclude={"id_dps"}))
 
     session.add(dps)
     session.commit()
@@ -155,7 +383,7 @@ def update_dps(id_dps: int, dps_data: DistribuidorParaSUS, session: Session = De
 
 
 @router_dps.delete("/{id_dps}", status_code=204)
-def delete_dps(id_dps: int, session: Session = Depends(get_session), current_user: User = Depends(get_current_user)):
+def delete_dps(id_dps: int, session: Session = Depends(get_session), current_user: User = Depends(get_current_user), perfil = Depends(get_current_profile)):
     if not current_user.ativo:
         raise HTTPException(status_code=403, detail="Finalize seu cadastro")
     
@@ -167,48 +395,35 @@ def delete_dps(id_dps: int, session: Session = Depends(get_session), current_use
         raise HTTPException(403, "Sem permissão")
 
     if current_user.tipo == "distribuidor":
-        distribuidor = session.exec(
-            select(Distribuidor).where(Distribuidor.id_usuario == current_user.id)
-        ).first()
+        distribuidor = perfil
     
         if not distribuidor:
             raise HTTPException(404, "Distribuidor não encontrado")
         if dps.id_distribuidor != distribuidor.id_distribuidor:
             raise HTTPException(403, "Você só pode excluir suas próprias movimentações")
 
+    estornar_movimentacao(session, dps)
     session.delete(dps)
     session.commit()
 
 
 @router_dps.post("/{id_dps}/confirmar")
-def confirmar_recebimento_dps(
+async def confirmar_recebimento_dps(
     id_dps: int,
-    session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_user)
+    escopo: Escopo = Depends(recebimento_dps)
 ):
-    if current_user.tipo != "sus" and current_user.tipo != "admin":
-        raise HTTPException(status_code=403, detail="Acesso restrito a SUS")
-    
-    if not current_user.ativo:
-        raise HTTPException(status_code=403, detail="Finalize seu cadastro")
-    
-    dps = session.get(DistribuidorParaSUS, id_dps)
-    if not dps:
-        raise HTTPException(status_code=404, detail="Movimentação não encontrada")
-    
-    if current_user.tipo == "sus":
-        sus = session.exec(select(SUS).where(SUS.id_usuario == current_user.id)).first()
-        if not sus:
-            raise HTTPException(status_code=404, detail="SUS não encontrado")
-        if dps.id_sus != sus.id_sus:
-            raise HTTPException(status_code=403, detail="Você não é o destinatário desta movimentação")
+    # Admin (id_perfil None) confirma qualquer movimentação; os demais só as destinadas a eles
+    return await run_db(_confirmar_recebimento, DistribuidorParaSUS, id_dps, "id_sus", escopo.id_perfil)
 
-    dps.status = "recebido"
-    dps.data_recebimento = datetime.now()
 
-    session.add(dps)
-    session.commit()
-    return {"message": "Recebimento confirmado com sucesso"}
+@router_dps.post("/confirmar", response_model=List[ResultadoConfirmacao])
+async def confirmar_recebimentos_dps(
+    confirmacao: ConfirmacaoEmMassa,
+    escopo: Escopo = Depends(recebimento_dps)
+):
+    """Confirma o recebimento de várias movimentações; o resultado vem por id, na ordem enviada"""
+    _verificar_quantidade(confirmacao.ids)
+    return await run_db(_confirmar_em_massa, DistribuidorParaSUS, "id_dps", confirmacao.ids, "id_sus", escopo.id_perfil)
 
 
 # ==========================================================
@@ -218,23 +433,15 @@ def confirmar_recebimento_dps(
 @router_spu.post("/", response_model=SUSParaUBS, status_code=status.HTTP_201_CREATED)
 def create_spu(
     spu: SUSParaUBSBase,  # ← Mudança aqui
-    session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_user)
+    escopo: Escopo = Depends(envio_spu),
+    session: Session = Depends(get_session)
 ):
-    if current_user.tipo not in ["admin", "sus"]:
-        raise HTTPException(status_code=403, detail="Acesso restrito a SUS e administradores")
-    
-    if not current_user.ativo:
-        raise HTTPException(status_code=403, detail="Finalize seu cadastro")
-
     # Cria dict com os dados
     spu_data = spu.model_dump()
     
-    if current_user.tipo == "sus":
-        sus = session.exec(select(SUS).where(SUS.id_usuario == current_user.id)).first()
-        if not sus:
-            raise HTTPException(status_code=404, detail="SUS não encontrado")
-        spu_data["id_sus"] = sus.id_sus
+    if not escopo.admin:
+        spu_data["id_sus"] = escopo.id_perfil
+    _validar_destino(session, _destinos_spu(spu_data["id_sus"], [spu.id_ubs]), ERRO_DESTINO_SPU)
 
     spu_data["data_envio"] = datetime.now()
     spu_data["status"] = "em transito"
@@ -243,43 +450,57 @@ def create_spu(
     db_spu = SUSParaUBS(**spu_data)
     
     session.add(db_spu)
+    aplicar_movimentacao(session, db_spu)
     session.commit()
     session.refresh(db_spu)
     return db_spu
 
 
-@router_spu.get("/", response_model=List[SUSParaUBS])
-def list_spu(session: Session = Depends(get_session), current_user: User = Depends(get_current_user)):
-    if not current_user.ativo:
-        raise HTTPException(status_code=403, detail="Finalize seu cadastro")
-    
-    query = select(SUSParaUBS)
+@router_spu.post("/em-massa", response_model=List[SUSParaUBS], status_code=status.HTTP_201_CREATED)
+async def create_spu_em_massa(
+    envio: EnvioEmMassa,
+    escopo: Escopo = Depends(envio_spu)
+):
+    """Remessa do SUS para várias UBS da sua região (id_destino: id_ubs)"""
+    id_sus = _origem_do_envio(escopo, envio)
+    destinos = _destinos_spu(id_sus, {item.id_destino for item in envio.itens})
 
-    if current_user.tipo == "sus":
-        sus = session.exec(select(SUS).where(SUS.id_usuario == current_user.id)).first()
-    
-        if not sus:
-            raise HTTPException(404, "SUS não encontrado")
-        query = query.where(SUSParaUBS.id_sus == sus.id_sus)
+    return await run_db(
+        _enviar_em_massa, SUSParaUBS,
+        SUS if escopo.admin else None,
+        "id_sus", id_sus, "id_ubs",
+        destinos, ERRO_DESTINO_SPU, envio
+    )
 
-    if current_user.tipo == "ubs":
-        ubs = session.exec(select(UBS).where(UBS.id_usuario == current_user.id)).first()
-    
-        if not ubs:
-            raise HTTPException(404, "UBS não encontrada")
-        query = query.where(SUSParaUBS.id_ubs == ubs.id_ubs)
 
-    if current_user.tipo not in ["admin", "sus", "ubs"]:
-        raise HTTPException(403, "Sem permissão")
+@router_spu.get("/", response_model=List[SUSParaUBS])
+async def list_spu(
+    response: Response,
+    filtros: FiltrosMovimentacao = Depends(),
+    paginacao: Paginacao = Depends(),
+    escopo: Escopo = Depends(leitura_spu)
+):
+    query = filtros.aplicar(escopo.consulta(SUSParaUBS), SUSParaUBS)
+    return await run_db(paginar, query, SUSParaUBS.id_spu, paginacao, response, leitura=True)
 
-    return session.exec(query).all()
+
+@router_spu.get("/exportar")
+def exportar_spu(
+    formato: str = Depends(parametro_formato),
+    filtros: FiltrosMovimentacao = Depends(),
+    escopo: Escopo = Depends(leitura_spu)
+):
+    """Exporta todas as movimentações visíveis em NDJSON ou CSV, transmitidas aos poucos"""
+    query = filtros.aplicar(escopo.consulta(SUSParaUBS), SUSParaUBS)
+    return exportar(query, SUSParaUBS, formato, "sus-ubs")
 
 
 @router_spu.get("/{id_spu}", response_model=SUSParaUBS)
 def get_spu(
     id_spu: int,
     session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    perfil = Depends(get_current_profile)
 ):
     if not current_user.ativo:
         raise HTTPException(status_code=403, detail="Finalize seu cadastro")
@@ -294,7 +515,7 @@ def get_spu(
 
     # SUS só vê movimentações enviadas por ele
     if current_user.tipo == "sus":
-        sus = session.exec(select(SUS).where(SUS.id_usuario == current_user.id)).first()
+        sus = perfil
     
         if not sus:
             raise HTTPException(404, "SUS não encontrado")
@@ -304,7 +525,7 @@ def get_spu(
 
     # UBS só vê movimentação destinada a ela
     if current_user.tipo == "ubs":
-        ubs = session.exec(select(UBS).where(UBS.id_usuario == current_user.id)).first()
+        ubs = perfil
     
         if not ubs:
             raise HTTPException(404, "UBS não encontrada")
@@ -320,7 +541,8 @@ def update_spu(
     id_spu: int,
     spu_data: SUSParaUBSBase,
     session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    perfil = Depends(get_current_profile)
 ):
     if not current_user.ativo:
         raise HTTPException(status_code=403, detail="Finalize seu cadastro")
@@ -335,15 +557,14 @@ def update_spu(
 
     # SUS só pode alterar suas próprias movimentações
     if current_user.tipo == "sus":
-        sus = session.exec(select(SUS).where(SUS.id_usuario == current_user.id)).first()
+        sus = perfil
     
         if not sus:
             raise HTTPException(404, "SUS não encontrado")
         if spu.id_sus != sus.id_sus:
             raise HTTPException(403, "Você só pode alterar movimentações enviadas pelo seu SUS")
 
-    for k, v in spu_data.model_dump(exclude_unset=True, exclude={"id_spu"}).items():
-        setattr(spu, k, v)
+    refazer_movimentacao(session, spu, spu_data.model_dump(exclude_unset=True, exclude={"id_spu"}))
 
     session.add(spu)
     session.commit()
@@ -355,7 +576,8 @@ def update_spu(
 def delete_spu(
     id_spu: int,
     session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    perfil = Depends(get_current_profile)
 ):
     if not current_user.ativo:
         raise HTTPException(status_code=403, detail="Finalize seu cadastro")
@@ -370,48 +592,35 @@ def delete_spu(
 
     # SUS só pode excluir as suas
     if current_user.tipo == "sus":
-        sus = session.exec(select(SUS).where(SUS.id_usuario == current_user.id)).first()
+        sus = perfil
     
         if not sus:
             raise HTTPException(404, "SUS não encontrado")
         if spu.id_sus != sus.id_sus:
             raise HTTPException(403, "Você só pode excluir suas próprias movimentações")
 
+    estornar_movimentacao(session, spu)
     session.delete(spu)
     session.commit()
 
 
 @router_spu.post("/{id_spu}/confirmar")
-def confirmar_recebimento_spu(
+async def confirmar_recebimento_spu(
     id_spu: int,
-    session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_user)
+    escopo: Escopo = Depends(recebimento_spu)
 ):
-    if current_user.tipo != "ubs" and current_user.tipo != "admin":
-        raise HTTPException(status_code=403, detail="Acesso restrito a UBS")
-    
-    if not current_user.ativo:
-        raise HTTPException(status_code=403, detail="Finalize seu cadastro")
-    
-    # BUSCAR MOVIMENTAÇÃO PRIMEIRO
-    spu = session.get(SUSParaUBS, id_spu)
-    if not spu:
-        raise HTTPException(status_code=404, detail="Movimentação não encontrada")
-    
-    # SÓ BUSCA UBS SE NÃO FOR ADMIN
-    if current_user.tipo == "ubs":
-        ubs = session.exec(select(UBS).where(UBS.id_usuario == current_user.id)).first()
-        if not ubs:
-            raise HTTPException(status_code=404, detail="UBS não encontrada")
-        if spu.id_ubs != ubs.id_ubs:
-            raise HTTPException(status_code=403, detail="Você não é o destinatário desta movimentação")
+    # Admin (id_perfil None) confirma qualquer movimentação; os demais só as destinadas a eles
+    return await run_db(_confirmar_recebimento, SUSParaUBS, id_spu, "id_ubs", escopo.id_perfil)
 
-    spu.status = "recebido"
-    spu.data_recebimento = datetime.now()
 
-    session.add(spu)
-    session.commit()
-    return {"message": "Recebimento confirmado com sucesso"}
+@router_spu.post("/confirmar", response_model=List[ResultadoConfirmacao])
+async def confirmar_recebimentos_spu(
+    confirmacao: ConfirmacaoEmMassa,
+    escopo: Escopo = Depends(recebimento_spu)
+):
+    """Confirma o recebimento de várias movimentações; o resultado vem por id, na ordem enviada"""
+    _verificar_quantidade(confirmacao.ids)
+    return await run_db(_confirmar_em_massa, SUSParaUBS, "id_spu", confirmacao.ids, "id_ubs", escopo.id_perfil)
 
 
 # ==========================================================
@@ -421,62 +630,68 @@ def confirmar_recebimento_spu(
 @router_upp.post("/", response_model=UBSParaPaciente, status_code=status.HTTP_201_CREATED)
 def create_upp(
     upp: UBSParaPaciente,
-    session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_user)
+    escopo: Escopo = Depends(envio_upp),
+    session: Session = Depends(get_session)
 ):
-    if current_user.tipo not in ["admin", "ubs"]:
-        raise HTTPException(status_code=403, detail="Acesso restrito a UBS e administradores")
-    
-    if not current_user.ativo:
-        raise HTTPException(status_code=403, detail="Finalize seu cadastro")
-
-    if current_user.tipo == "ubs":
-        ubs = session.exec(select(UBS).where(UBS.id_usuario == current_user.id)).first()
-        if not ubs:
-            raise HTTPException(status_code=404, detail="UBS não encontrada")
-        upp.id_ubs = ubs.id_ubs
+    if not escopo.admin:
+        upp.id_ubs = escopo.id_perfil
+    _validar_destino(session, _destinos_upp(upp.id_ubs, [upp.id_paciente]), ERRO_DESTINO_UPP)
 
     upp.data_envio = datetime.now()
     upp.status = "em transito"
 
     session.add(upp)
+    aplicar_movimentacao(session, upp)
     session.commit()
     session.refresh(upp)
     return upp
 
 
-@router_upp.get("/", response_model=List[UBSParaPaciente])
-def list_upp(session: Session = Depends(get_session), current_user: User = Depends(get_current_user)):
-    if not current_user.ativo:
-        raise HTTPException(status_code=403, detail="Finalize seu cadastro")
+@router_upp.post("/em-massa", response_model=List[UBSParaPaciente], status_code=status.HTTP_201_CREATED)
+async def create_upp_em_massa(
+    envio: EnvioEmMassa,
+    escopo: Escopo = Depends(envio_upp)
+):
+    """Dispensação da UBS para vários pacientes cadastrados nela (id_destino: id_paciente)"""
+    id_ubs = _origem_do_envio(escopo, envio)
+    destinos = _destinos_upp(id_ubs, {item.id_destino for item in envio.itens})
 
-    query = select(UBSParaPaciente)
+    return await run_db(
+        _enviar_em_massa, UBSParaPaciente,
+        UBS if escopo.admin else None,
+        "id_ubs", id_ubs, "id_paciente",
+        destinos, ERRO_DESTINO_UPP, envio
+    )
 
-    if current_user.tipo == "ubs":
-        ubs = session.exec(select(UBS).where(UBS.id_usuario == current_user.id)).first()
-    
-        if not ubs:
-            raise HTTPException(404, "UBS não encontrada")
-        query = query.where(UBSParaPaciente.id_ubs == ubs.id_ubs)
 
-    if current_user.tipo == "paciente":
-        paciente = session.exec(select(Paciente).where(Paciente.id_usuario == current_user.id)).first()
-    
-        if not paciente:
-            raise HTTPException(404, "Paciente não encontrado")
-        query = query.where(UBSParaPaciente.id_paciente == paciente.id_paciente)
+@router_upp.get("/", response_model=List[UBSParaPaciente])
+async def list_upp(
+    response: Response,
+    filtros: FiltrosMovimentacao = Depends(),
+    paginacao: Paginacao = Depends(),
+    escopo: Escopo = Depends(leitura_upp)
+):
+    query = filtros.aplicar(escopo.consulta(UBSParaPaciente), UBSParaPaciente)
+    return await run_db(paginar, query, UBSParaPaciente.id_upp, paginacao, response, leitura=True)
 
-    if current_user.tipo not in ["admin", "ubs", "paciente"]:
-        raise HTTPException(403, "Sem permissão")
 
-    return session.exec(query).all()
+@router_upp.get("/exportar")
+def exportar_upp(
+    formato: str = Depends(parametro_formato),
+    filtros: FiltrosMovimentacao = Depends(),
+    escopo: Escopo = Depends(leitura_upp)
+):
+    """Exporta todas as movimentações visíveis em NDJSON ou CSV, transmitidas aos poucos"""
+    query = filtros.aplicar(escopo.consulta(UBSParaPaciente), UBSParaPaciente)
+    return exportar(query, UBSParaPaciente, formato, "ubs-pacientes")
 
 
 @router_upp.get("/{id_upp}", response_model=UBSParaPaciente)
 def get_upp(
     id_upp: int,
     session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    perfil = Depends(get_current_profile)
 ):
     if not current_user.ativo:
         raise HTTPException(status_code=403, detail="Finalize seu cadastro")
@@ -489,7 +704,7 @@ def get_upp(
         return upp
 
     if current_user.tipo == "ubs":
-        ubs = session.exec(select(UBS).where(UBS.id_usuario == current_user.id)).first()
+        ubs = perfil
     
         if not ubs:
             raise HTTPException(404, "UBS não encontrada")
@@ -498,7 +713,7 @@ def get_upp(
         return upp
 
     if current_user.tipo == "paciente":
-        paciente = session.exec(select(Paciente).where(Paciente.id_usuario == current_user.id)).first()
+        paciente = perfil
     
         if not paciente:
             raise HTTPException(404, "Paciente não encontrado")
@@ -514,7 +729,8 @@ def update_upp(
     id_upp: int,
     upp_data: UBSParaPaciente,
     session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    perfil = Depends(get_current_profile)
 ):
     if not current_user.ativo:
         raise HTTPException(status_code=403, detail="Finalize seu cadastro")
@@ -527,15 +743,14 @@ def update_upp(
         raise HTTPException(403, "Sem permissão")
 
     if current_user.tipo == "ubs":
-        ubs = session.exec(select(UBS).where(UBS.id_usuario == current_user.id)).first()
+        ubs = perfil
     
         if not ubs:
             raise HTTPException(404, "UBS não encontrada")
         if upp.id_ubs != ubs.id_ubs:
             raise HTTPException(403, "Você só pode alterar movimentações da sua UBS")
 
-    for k, v in upp_data.model_dump(exclude_unset=True, exclude={"id_upp"}).items():
-        setattr(upp, k, v)
+    refazer_movimentacao(session, upp, upp_data.model_dump(exclude_unset=True, exclude={"id_upp"}))
 
     session.add(upp)
     session.commit()
@@ -547,7 +762,8 @@ def update_upp(
 def delete_upp(
     id_upp: int,
     session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    perfil = Depends(get_current_profile)
 ):
     if not current_user.ativo:
         raise HTTPException(status_code=403, detail="Finalize seu cadastro")
@@ -560,49 +776,32 @@ def delete_upp(
         raise HTTPException(403, "Sem permissão")
 
     if current_user.tipo == "ubs":
-        ubs = session.exec(select(UBS).where(UBS.id_usuario == current_user.id)).first()
+        ubs = perfil
     
         if not ubs:
             raise HTTPException(404, "UBS não encontrada")
         if upp.id_ubs != ubs.id_ubs:
             raise HTTPException(403, "Você só pode excluir movimentações da sua UBS")
 
+    estornar_movimentacao(session, upp)
     session.delete(upp)
     session.commit()
 
 
 @router_upp.post("/{id_upp}/confirmar")
-def confirmar_recebimento_upp(
+async def confirmar_recebimento_upp(
     id_upp: int,
-    session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_user)
+    escopo: Escopo = Depends(recebimento_upp)
 ):
-    if current_user.tipo != "paciente" and current_user.tipo != "admin":
-        raise HTTPException(status_code=403, detail="Acesso restrito a pacientes")
-    
-    if not current_user.ativo:
-        raise HTTPException(status_code=403, detail="Finalize seu cadastro")
-    
-    # ✅ BUSCAR MOVIMENTAÇÃO PRIMEIRO
-    upp = session.get(UBSParaPaciente, id_upp)
-    if not upp:
-        raise HTTPException(status_code=404, detail="Movimentação não encontrada")
-    
-    # ✅ SÓ BUSCA PACIENTE SE NÃO FOR ADMIN
-    if current_user.tipo == "paciente":
-        paciente = session.exec(
-            select(Paciente).where(Paciente.id_usuario == current_user.id)
-        ).first()
-
-        if not paciente:
-            raise HTTPException(status_code=404, detail="Paciente não encontrado")
-        
-        if upp.id_paciente != paciente.id_paciente:
-            raise HTTPException(status_code=403, detail="Você não é o destinatário desta movimentação")
+    # Admin (id_perfil None) confirma qualquer movimentação; os demais só as destinadas a eles
+    return await run_db(_confirmar_recebimento, UBSParaPaciente, id_upp, "id_paciente", escopo.id_perfil)
 
-    upp.status = "recebido"
-    upp.data_recebimento = datetime.now()
 
-    session.add(upp)
-    session.commit()
-    return {"message": "Recebimento confirmado com sucesso"}
\ No newline at end of file
+@router_upp.post("/confirmar", response_model=List[ResultadoConfirmacao])
+async def confirmar_recebimentos_upp(
+    confirmacao: ConfirmacaoEmMassa,
+    escopo: Escopo = Depends(recebimento_upp)
+):
+    """Confirma o recebimento de várias movimentações; o resultado vem por id, na ordem enviada"""
+    _verificar_quantidade(confirmacao.ids)
+    return await run_db(_confirmar_em_massa, UBSParaPaciente, "id_upp", confirmacao.ids, "id_paciente", escopo.id_perfil)
@@ -1,9 +1,12 @@
-from fastapi import APIRouter, HTTPException, Depends
-from sqlmodel import Session, select
-from typing import List
-from auth.dependencies import get_current_user
+from fastapi import APIRouter, HTTPException, Depends, Response
+from sqlmodel import Session
+from typing import List, Optional
+from auth.dependencies import get_current_user, get_current_profile, invalidar_perfil, invalidar_usuario
+from auth.permissions import Escopo, UserType, exigir_escopo
 from models import Paciente, UBS, SUS, PacienteCreate, User
-from database import get_session
+from database import get_session, run_db
+from paginacao import HEADER_TOTAL, Paginacao, paginar
+from services.pacientes import invalidar_total_sus, invalidar_total_ubs, total_pacientes_sus
 
 router = APIRouter(prefix="/pacientes", tags=["Pacientes"])
 
@@ -40,63 +43,44 @@ def create_paciente(
     session.commit()
     session.refresh(novo_paciente)
     session.refresh(user)
+    invalidar_usuario(current_user.id)
+    invalidar_total_ubs(session, novo_paciente.id_ubs)
 
     return novo_paciente
 
 
 @router.get("/", response_model=List[Paciente])
-def list_pacientes(
-    session: Session = Depends(get_session),
-    current_user = Depends(get_current_user)
+async def list_pacientes(
+    response: Response,
+    id_ubs: Optional[int] = None,
+    paginacao: Paginacao = Depends(),
+    escopo: Escopo = Depends(exigir_escopo(
+        Paciente, detail="Acesso restrito a UBS, SUS, pacientes e administradores"
+    ))
 ):
-    if current_user.tipo not in ["admin","sus", "ubs", "paciente"]:
-        raise HTTPException(status_code=403, detail="Acesso restrito a UBS, SUS, pacientes e administradores")
-    
-    if not current_user.ativo:
-        raise HTTPException(status_code=403, detail="Finalize seu cadastro")
+    # SUS: semi-join com as UBS da região, na mesma consulta
+    query = escopo.consulta(Paciente)
 
-    if current_user.tipo == "admin":
-        return session.exec(select(Paciente)).all()
+    if id_ubs is not None:
+        query = query.where(Paciente.id_ubs == id_ubs)
 
-    if current_user.tipo == "sus":
-        sus = session.exec(
-            select(SUS).where(SUS.id_usuario == current_user.id)
-        ).first()
-        if not sus:
-            raise HTTPException(status_code=404, detail="SUS não encontrado")
-
-        ubs_ids = session.exec(
-            select(UBS.id_ubs).where(UBS.id_sus == sus.id_sus)
-        ).all()
-
-        return session.exec(
-            select(Paciente).where(Paciente.id_ubs.in_(ubs_ids))
-        ).all()
-
-    if current_user.tipo == "ubs":
-        ubs = session.exec(
-            select(UBS).where(UBS.id_usuario == current_user.id)
-        ).first()
-        if not ubs:
-            raise HTTPException(status_code=404, detail="UBS não encontrada")
+    # Total da região só na listagem completa do SUS (contagem em cache por SUS)
+    id_sus = escopo.id_perfil if escopo.tipo == UserType.SUS.value and id_ubs is None else None
+    return await run_db(_listar_pacientes, query, paginacao, response, id_sus, leitura=True)
 
-        return session.exec(
-            select(Paciente).where(Paciente.id_ubs == ubs.id_ubs)
-        ).all()
 
-    if current_user.tipo == "paciente":
-        return session.exec(
-            select(Paciente).where(Paciente.id_usuario == current_user.id)
-        ).all()
-
-    raise HTTPException(status_code=403, detail="Acesso negado")
+def _listar_pacientes(session: Session, query, paginacao: Paginacao, response: Response, id_sus: Optional[int]):
+    if id_sus is not None:
+        response.headers[HEADER_TOTAL] = str(total_pacientes_sus(session, id_sus))
+    return paginar(session, query, Paciente.id_paciente, paginacao, response)
 
 
 @router.get("/{paciente_id}", response_model=Paciente)
 def get_paciente(
     paciente_id: int,
     session: Session = Depends(get_session),
-    current_user = Depends(get_current_user)
+    current_user = Depends(get_current_user),
+    perfil = Depends(get_current_profile)
 ):
     if current_user.tipo not in ["admin","sus", "ubs", "paciente"]:
         raise HTTPException(status_code=403, detail="Acesso restrito a UBS, SUS, pacientes e administradores")
@@ -112,9 +96,7 @@ def get_paciente(
         return paciente
 
     if current_user.tipo == "sus":
-        sus = session.exec(
-            select(SUS).where(SUS.id_usuario == current_user.id)
-        ).first()
+        sus = perfil
         if not sus:
             raise HTTPException(status_code=404, detail="SUS não encontrado")
 
@@ -123,9 +105,7 @@ def get_paciente(
             raise HTTPException(status_code=403, detail="Acesso negado")
 
     if current_user.tipo == "ubs":
-        ubs = session.exec(
-            select(UBS).where(UBS.id_usuario == current_user.id)
-        ).first()
+        ubs = perfil
         if not ubs or paciente.id_ubs != ubs.id_ubs:
             raise HTTPException(status_code=403, detail="Acesso negado")
 
@@ -140,7 +120,8 @@ def update_paciente(
     paciente_id: int,
     paciente: Paciente,
     session: Session = Depends(get_session),
-    current_user = Depends(get_current_user)
+    current_user = Depends(get_current_user),
+    perfil = Depends(get_current_profile)
 ):
     db_paciente = session.get(Paciente, paciente_id)
     if not db_paciente:
@@ -153,15 +134,15 @@ def update_paciente(
         raise HTTPException(status_code=403, detail="Finalize seu cadastro")
 
     if current_user.tipo == "ubs":
-        ubs = session.exec(
-            select(UBS).where(UBS.id_usuario == current_user.id)
-        ).first()
+        ubs = perfil
         if not ubs or db_paciente.id_ubs != ubs.id_ubs:
             raise HTTPException(status_code=403, detail="Você não pode atualizar este paciente")
 
     if current_user.tipo == "paciente" and db_paciente.id_usuario != current_user.id:
         raise HTTPException(status_code=403, detail="Você só pode atualizar seu próprio cadastro")
 
+    id_usuario_anterior = db_paciente.id_usuario
+    id_ubs_anterior = db_paciente.id_ubs
     paciente_data = paciente.model_dump(exclude_unset=True, exclude={"id_paciente"})
     for key, value in paciente_data.items():
         setattr(db_paciente, key, value)
@@ -169,6 +150,9 @@ def update_paciente(
     session.add(db_paciente)
     session.commit()
     session.refresh(db_paciente)
+    invalidar_perfil(id_usuario_anterior, db_paciente.id_usuario)
+    if db_paciente.id_ubs != id_ubs_anterior:
+        invalidar_total_ubs(session, id_ubs_anterior, db_paciente.id_ubs)
     return db_paciente
 
 
@@ -176,7 +160,8 @@ def update_paciente(
 def delete_paciente(
     paciente_id: int,
     session: Session = Depends(get_session),
-    current_user = Depends(get_current_user)
+    current_user = Depends(get_current_user),
+    perfil = Depends(get_current_profile)
 ):
     paciente = session.get(Paciente, paciente_id)
     if not paciente:
@@ -189,9 +174,7 @@ def delete_paciente(
         raise HTTPException(status_code=403, detail="Finalize seu cadastro")
 
     if current_user.tipo == "ubs":
-        ubs = session.exec(
-            select(UBS).where(UBS.id_usuario == current_user.id)
-        ).first()
+        ubs = perfil
         if not ubs or paciente.id_ubs != ubs.id_ubs:
             raise HTTPException(status_code=403, detail="Você não pode deletar este paciente")
 
@@ -200,4 +183,6 @@ def delete_paciente(
 
     session.delete(paciente)
     session.commit()
+    invalidar_perfil(paciente.id_usuario)
+    invalidar_total_ubs(session, paciente.id_ubs)
     return {"message": "Paciente deletado com sucesso"}
\ No newline at end of file
@@ -1,9 +1,10 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request
 from sqlmodel import Session, select
 from typing import List
-from auth.dependencies import get_current_user
+from auth.dependencies import get_current_user, get_current_profile, invalidar_perfil, invalidar_usuario
 from models import SUS, SUSCreate, User
-from database import get_session
+from database import get_session, get_read_session
+from cache_respostas import cache_respostas
 
 router = APIRouter(prefix="/sus", tags=["SUS"])
 
@@ -38,14 +39,18 @@ def create_sus(
     session.commit()
     session.refresh(novo_sus)
     session.refresh(user)
+    invalidar_usuario(current_user.id)
+    cache_respostas.invalidar("sus")
 
     return novo_sus
 
 
 @router.get("/", response_model=List[SUS])
 def list_sus(
-    session: Session = Depends(get_session),
-    current_user = Depends(get_current_user)
+    request: Request,
+    session: Session = Depends(get_read_session),
+    current_user = Depends(get_current_user),
+    perfil = Depends(get_current_profile)
 ):
     if current_user.tipo not in ["admin", "sus"]:
         raise HTTPException(status_code=403, detail="Acesso restrito a administradores e SUS")
@@ -54,14 +59,14 @@ def list_sus(
         raise HTTPException(status_code=403, detail="Finalize seu cadastro")
 
     if current_user.tipo == "admin":
-        sus_list = session.exec(select(SUS)).all()
-        return sus_list
+        em_cache, chave = cache_respostas.buscar(request, "sus", "admin")
+        if em_cache:
+            return em_cache
 
-    sus_list = session.exec(
-        select(SUS).where(SUS.id_usuario == current_user.id)
-    ).all()
+        sus_list = session.exec(select(SUS)).all()
+        return cache_respostas.guardar(request, chave, sus_list, List[SUS], escopo="admin")
 
-    return sus_list
+    return [perfil] if perfil else []
 
 
 @router.get("/{sus_id}", response_model=SUS)
@@ -106,6 +111,7 @@ def update_sus(
     if current_user.tipo == "sus" and db_sus.id_usuario != current_user.id:
         raise HTTPException(status_code=403, detail="Você só pode alterar seu próprio registro")
 
+    id_usuario_anterior = db_sus.id_usuario
     sus_data = sus.model_dump(exclude_unset=True, exclude={"id_sus"})
     for key, value in sus_data.items():
         setattr(db_sus, key, value)
@@ -113,6 +119,8 @@ def update_sus(
     session.add(db_sus)
     session.commit()
     session.refresh(db_sus)
+    invalidar_perfil(id_usuario_anterior, db_sus.id_usuario)
+    cache_respostas.invalidar("sus")
     return db_sus
 
 
@@ -137,4 +145,6 @@ def delete_sus(
 
     session.delete(sus)
     session.commit()
+    invalidar_perfil(sus.id_usuario)
+    cache_respostas.invalidar("sus")
     return {"message": "SUS deletado com sucesso"}
\ No newline at end of file
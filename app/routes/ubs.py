@@ -1,9 +1,11 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request
 from sqlmodel import Session, select
 from typing import List
-from auth.dependencies import get_current_user
+from auth.dependencies import get_current_user, get_current_profile, invalidar_perfil, invalidar_usuario
 from models import SUS, UBS, UBSCreate, User
-from database import get_session
+from database import get_session, get_read_session
+from cache_respostas import cache_respostas
+from services.pacientes import invalidar_total_sus
 
 router = APIRouter(prefix="/ubs", tags=["UBS"])
 
@@ -39,14 +41,18 @@ def create_ubs(
     session.commit()
     session.refresh(nova_ubs)
     session.refresh(user)
+    invalidar_usuario(current_user.id)
+    cache_respostas.invalidar("ubs")
 
     return nova_ubs
 
 
 @router.get("/", response_model=List[UBS])
 def list_ubs(
-    session: Session = Depends(get_session),
-    current_user = Depends(get_current_user)
+    request: Request,
+    session: Session = Depends(get_read_session),
+    current_user = Depends(get_current_user),
+    perfil = Depends(get_current_profile)
 ):
     if current_user.tipo not in ["admin", "sus", "ubs"]:
         raise HTTPException(status_code=403, detail="Acesso restrito")
@@ -54,25 +60,32 @@ def list_ubs(
     if not current_user.ativo:
         raise HTTPException(status_code=403, detail="Finalize seu cadastro")
 
-    if current_user.tipo == "admin":
-        return session.exec(select(UBS)).all()
+    if current_user.tipo == "ubs":
+        return [perfil] if perfil else []
+
+    query = select(UBS)
+    escopo = "admin"
 
     if current_user.tipo == "sus":
-        sus = session.exec(
-            select(SUS).where(SUS.id_usuario == current_user.id)
-        ).first()
+        sus = perfil
         if not sus:
             raise HTTPException(status_code=404, detail="SUS não encontrado")
-        return session.exec(select(UBS).where(UBS.id_sus == sus.id_sus)).all()
+        query = query.where(UBS.id_sus == sus.id_sus)
+        escopo = f"sus:{sus.id_sus}"
+
+    em_cache, chave = cache_respostas.buscar(request, "ubs", escopo)
+    if em_cache:
+        return em_cache
 
-    return session.exec(select(UBS).where(UBS.id_usuario == current_user.id)).all()
+    return cache_respostas.guardar(request, chave, session.exec(query).all(), List[UBS], escopo=escopo)
 
 
 @router.get("/{ubs_id}", response_model=UBS)
 def get_ubs(
     ubs_id: int,
     session: Session = Depends(get_session),
-    current_user = Depends(get_current_user)
+    current_user = Depends(get_current_user),
+    perfil = Depends(get_current_profile)
 ):
     ubs = session.get(UBS, ubs_id)
     if not ubs:
@@ -85,9 +98,7 @@ def get_ubs(
         raise HTTPException(status_code=403, detail="Finalize seu cadastro")
 
     if current_user.tipo == "sus":
-        sus = session.exec(
-            select(SUS).where(SUS.id_usuario == current_user.id)
-        ).first()
+        sus = perfil
         if not sus or ubs.id_sus != sus.id_sus:
             raise HTTPException(status_code=403, detail="Você não pode acessar esta UBS")
 
@@ -102,7 +113,8 @@ def update_ubs(
     ubs_id: int,
     ubs: UBS,
     session: Session = Depends(get_session),
-    current_user = Depends(get_current_user)
+    current_user = Depends(get_current_user),
+    perfil = Depends(get_current_profile)
 ):
     db_ubs = session.get(UBS, ubs_id)
     if not db_ubs:
@@ -118,12 +130,12 @@ def update_ubs(
         raise HTTPException(status_code=403, detail="Você só pode atualizar sua própria UBS")
 
     if current_user.tipo == "sus":
-        sus = session.exec(
-            select(SUS).where(SUS.id_usuario == current_user.id)
-        ).first()
+        sus = perfil
         if not sus or db_ubs.id_sus != sus.id_sus:
             raise HTTPException(status_code=403, detail="Você não pode atualizar esta UBS")
 
+    id_usuario_anterior = db_ubs.id_usuario
+    id_sus_anterior = db_ubs.id_sus
     ubs_data = ubs.model_dump(exclude_unset=True, exclude={"id_ubs"})
     for key, value in ubs_data.items():
         setattr(db_ubs, key, value)
@@ -131,6 +143,10 @@ def update_ubs(
     session.add(db_ubs)
     session.commit()
     session.refresh(db_ubs)
+    invalidar_perfil(id_usuario_anterior, db_ubs.id_usuario)
+    cache_respostas.invalidar("ubs")
+    if db_ubs.id_sus != id_sus_anterior:
+        invalidar_total_sus(id_sus_anterior, db_ubs.id_sus)
     return db_ubs
 
 
@@ -138,7 +154,8 @@ def update_ubs(
 def delete_ubs(
     ubs_id: int,
     session: Session = Depends(get_session),
-    current_user = Depends(get_current_user)
+    current_user = Depends(get_current_user),
+    perfil = Depends(get_current_profile)
 ):
     ubs = session.get(UBS, ubs_id)
     if not ubs:
@@ -154,9 +171,7 @@ def delete_ubs(
         raise HTTPException(status_code=403, detail="Finalize seu cadastro")
 
     if current_user.tipo == "sus":
-        sus = session.exec(
-            select(SUS).where(SUS.id_usuario == current_user.id)
-        ).first()
+        sus = perfil
         if not sus or ubs.id_sus != sus.id_sus:
             raise HTTPException(status_code=403, detail="Você não pode deletar esta UBS")
 
@@ -165,4 +180,7 @@ def delete_ubs(
 
     session.delete(ubs)
     session.commit()
+    invalidar_perfil(ubs.id_usuario)
+    cache_respostas.invalidar("ubs")
+    invalidar_total_sus(ubs.id_sus)
     return {"message": "UBS deletada com sucesso"}
\ No newline at end of file
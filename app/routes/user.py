@@ -1,12 +1,16 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Response
 from sqlmodel import Session, select
-from typing import List
-from auth.dependencies import get_current_user
+from typing import List, Optional
+from auth.dependencies import invalidar_usuario
+from auth.permissions import exigir_tipos, UserType
 from models import User, UserBase
-from database import get_session
+from database import get_session, run_db
+from paginacao import Paginacao, paginar
 
 router = APIRouter(prefix="/users", tags=["Users"])
 
+apenas_admin = exigir_tipos(UserType.ADMIN, detail="Acesso restrito a administradores")
+
 # meio que a register já faz isso
 # @router.post("/", response_model=User)
 # def create_user(user: UserBase, session: Session = Depends(get_session)):
@@ -18,19 +22,24 @@ router = APIRouter(prefix="/users", tags=["Users"])
 
 
 @router.get("/", response_model=List[User])
-def list_users(session: Session = Depends(get_session), current_user = Depends(get_current_user)):
-    if current_user.tipo != "admin":
-        raise HTTPException(status_code=403, detail="Acesso restrito a administradores")
-    
-    users = session.exec(select(User)).all()
-    return users
+async def list_users(
+    response: Response,
+    tipo: Optional[str] = None,
+    ativo: Optional[bool] = None,
+    paginacao: Paginacao = Depends(),
+    current_user = Depends(apenas_admin)
+):
+    query = select(User)
+    if tipo is not None:
+        query = query.where(User.tipo == tipo)
+    if ativo is not None:
+        query = query.where(User.ativo == ativo)
+
+    return await run_db(paginar, query, User.id, paginacao, response, leitura=True)
 
 
 @router.get("/{user_id}", response_model=User)
-def get_user(user_id: int, session: Session = Depends(get_session), current_user = Depends(get_current_user)):
-    if current_user.tipo != "admin":
-        raise HTTPException(status_code=403, detail="Acesso restrito a administradores")
-    
+def get_user(user_id: int, session: Session = Depends(get_session), current_user = Depends(apenas_admin)):
     user = session.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="Usuário não encontrado")
@@ -38,33 +47,32 @@ def get_user(user_id: int, session: Session = Depends(get_session), current_user
 
 
 @router.put("/{user_id}", response_model=User)
-def update_user(user_id: int, user: UserBase, session: Session = Depends(get_session), current_user = Depends(get_current_user)):
-    if current_user.tipo != "admin":
-        raise HTTPException(status_code=403, detail="Acesso restrito a administradores")
-    
+def update_user(user_id: int, user: UserBase, session: Session = Depends(get_session), current_user = Depends(apenas_admin)):
     db_user = session.get(User, user_id)
     if not db_user:
         raise HTTPException(status_code=404, detail="Usuário não encontrado")
     
     user_data = user.model_dump(exclude_unset=True)
+    # Tokens emitidos com o tipo antigo deixam de valer
+    if user_data.get("tipo", db_user.tipo) != db_user.tipo:
+        db_user.versao_token += 1
     for key, value in user_data.items():
         setattr(db_user, key, value)
     
     session.add(db_user)
     session.commit()
     session.refresh(db_user)
+    invalidar_usuario(db_user.id)
     return db_user
 
 
 @router.delete("/{user_id}")
-def delete_user(user_id: int, session: Session = Depends(get_session), current_user = Depends(get_current_user)):
-    if current_user.tipo != "admin":
-        raise HTTPException(status_code=403, detail="Acesso restrito a administradores")
-    
+def delete_user(user_id: int, session: Session = Depends(get_session), current_user = Depends(apenas_admin)):
     user = session.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="Usuário não encontrado")
     
     session.delete(user)
     session.commit()
+    invalidar_usuario(user_id)
     return {"message": "Usuário deletado com sucesso"}
\ No newline at end of file
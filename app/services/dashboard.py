@@ -0,0 +1,389 @@
+from sqlmodel import Session, select, func
+from sqlalchemy import case, true
+from typing import Optional
+from datetime import datetime
+from models import (
+    Medicamento, Lote, DistribuidorParaSUS, SUSParaUBS, UBSParaPaciente, Feedback,
+    UBS, Paciente, Estoque
+)
+from services.validade import SITUACOES_PROXIMAS_30_DIAS, SITUACOES_PROXIMAS_60_DIAS
+
+
+def _saldo(tipo_detentor: str, id_detentor: Optional[int]):
+    """Unidades em estoque segundo o saldo mantido pelas movimentações"""
+    query = select(
+        func.coalesce(func.sum(Estoque.quantidade), 0).label("em_estoque")
+    ).where(Estoque.tipo_detentor == tipo_detentor)
+    if id_detentor is not None:
+        query = query.where(Estoque.id_detentor == id_detentor)
+    return query
+
+
+def _linha_unica(session: Session, *agregados) -> dict:
+    """
+    Executa vários agregados de uma linha como uma única consulta.
+    Cada agregado devolve exatamente uma linha: o produto entre eles é uma linha só.
+    """
+    agregados = [agregado.subquery() for agregado in agregados]
+    origem = agregados[0]
+    for agregado in agregados[1:]:
+        origem = origem.join(agregado, true())
+
+    query = select(*[coluna for agregado in agregados for coluna in agregado.c]).select_from(origem)
+    return dict(session.exec(query).one()._mapping)
+
+
+# -------------------------
+# FARMACÊUTICA
+# -------------------------
+def kpis_farmaceutica(session: Session, id_farmaceutica: Optional[int] = None) -> dict:
+    """
+    Calcula todos os indicadores do dashboard da farmacêutica em uma única consulta.
+    Sem id_farmaceutica (admin) os indicadores consideram todos os registros.
+    """
+    # Lotes visíveis: todos (admin) ou apenas os dos medicamentos da farmacêutica
+    lotes = select(Lote.id_lote, Lote.situacao_validade)
+    medicamentos = select(func.count(Medicamento.id_medicamento).label("total_medicamentos"))
+    feedbacks = select(func.count(Feedback.id_feedback).label("total_feedbacks"))
+
+    if id_farmaceutica is not None:
+        lotes = lotes.join(Medicamento).where(Medicamento.id_farmaceutica == id_farmaceutica)
+        medicamentos = medicamentos.where(Medicamento.id_farmaceutica == id_farmaceutica)
+        feedbacks = feedbacks.join(Medicamento).where(Medicamento.id_farmaceutica == id_farmaceutica)
+
+    lotes = lotes.cte("lotes_escopo")
+
+    def _por_status(tabela, coluna_id, coluna_lote, colunas: dict):
+        """Conta movimentações por status restritas aos lotes visíveis"""
+        query = select(*[
+            func.count(case((tabela.status == status, coluna_id))).label(nome)
+            for nome, status in colunas.items()
+        ])
+        if id_farmaceutica is not None:
+            query = query.select_from(tabela).join(lotes, coluna_lote == lotes.c.id_lote)
+        return query
+
+    agregado_lotes = select(
+        func.count(lotes.c.id_lote).label("lotes_total"),
+        func.count(case((lotes.c.situacao_validade == "vencido", lotes.c.id_lote))).label("lotes_vencidos"),
+        func.count(
+            case((lotes.c.situacao_validade.in_(SITUACOES_PROXIMAS_30_DIAS), lotes.c.id_lote))
+        ).label("lotes_proximos_vencimento"),
+    )
+
+    agregado_dps = _por_status(
+        DistribuidorParaSUS, DistribuidorParaSUS.id_dps, DistribuidorParaSUS.id_lote,
+        {"em_distribuidor": "em transito"}
+    )
+    agregado_spu = _por_status(
+        SUSParaUBS, SUSParaUBS.id_spu, SUSParaUBS.id_lote,
+        {"em_sus": "em transito"}
+    )
+    agregado_upp = _por_status(
+        UBSParaPaciente, UBSParaPaciente.id_upp, UBSParaPaciente.id_lote,
+        {"em_ubs": "em transito", "chegou_paciente": "recebido"}
+    )
+    return _linha_unica(
+        session,
+        medicamentos, agregado_lotes, agregado_dps,
+        agregado_spu, agregado_upp, feedbacks
+    )
+
+
+# -------------------------
+# DISTRIBUIDOR
+# -------------------------
+def entregas_distribuidor(session: Session, id_distribuidor: Optional[int] = None) -> dict:
+    """
+    Entregas pendentes e concluídas do distribuidor e o total do histórico.
+    Sem id_distribuidor (admin) considera todas as entregas.
+    """
+    pendentes = select(DistribuidorParaSUS).where(DistribuidorParaSUS.status == "em transito")
+    concluidas = select(DistribuidorParaSUS).where(DistribuidorParaSUS.status == "recebido")
+    total = select(func.count(DistribuidorParaSUS.id_dps))
+
+    if id_distribuidor is not None:
+        pendentes = pendentes.where(DistribuidorParaSUS.id_distribuidor == id_distribuidor)
+        concluidas = concluidas.where(DistribuidorParaSUS.id_distribuidor == id_distribuidor)
+        total = total.where(DistribuidorParaSUS.id_distribuidor == id_distribuidor)
+
+    return {
+        "pendentes": session.exec(pendentes).all(),
+        "concluidas": session.exec(concluidas).all(),
+        "total_entregas": session.exec(total).one(),
+    }
+
+
+# -------------------------
+# SUS
+# -------------------------
+def kpis_sus(session: Session, id_sus: Optional[int] = None) -> dict:
+    """
+    Indicadores do dashboard do SUS calculados no banco, sem carregar as movimentações.
+    Sem id_sus (admin) os indicadores consideram todos os registros.
+    """
+    dps = select(
+        func.count(case((DistribuidorParaSUS.status == "recebido", DistribuidorParaSUS.id_dps))).label("recebidos"),
+        func.count(case((DistribuidorParaSUS.status == "em transito", DistribuidorParaSUS.id_dps))).label("aguardando_recebimento"),
+    )
+    spu = select(func.count(SUSParaUBS.id_spu).label("distribuidos_ubs"))
+    ubs = select(func.count(UBS.id_ubs).label("total_ubs"))
+    lotes = select(Lote).where(Lote.situacao_validade.in_(SITUACOES_PROXIMAS_60_DIAS))
+
+    if id_sus is not None:
+        dps = dps.where(DistribuidorParaSUS.id_sus == id_sus)
+        spu = spu.where(SUSParaUBS.id_sus == id_sus)
+        ubs = ubs.where(UBS.id_sus == id_sus)
+        # Lotes com atenção: apenas os que o SUS já recebeu do distribuidor
+        lotes = lotes.where(
+            Lote.id_lote.in_(
+                select(DistribuidorParaSUS.id_lote).where(
+                    DistribuidorParaSUS.id_sus == id_sus,
+                    DistribuidorParaSUS.status == "recebido"
+                )
+            )
+        )
+
+    atencao = lotes.subquery()
+    alertas = select(
+        func.count(atencao.c.id_lote).label("lotes_vencimento_proximo"),
+        func.count(case((atencao.c.quantidade > 100, atencao.c.id_lote))).label("necessita_remanejamento"),
+    )
+
+    kpis = _linha_unica(session, dps, spu, ubs, alertas, _saldo("sus", id_sus))
+
+    # Apenas os 10 lotes que vencem primeiro
+    kpis["lotes_atencao"] = session.exec(
+        lotes.order_by(Lote.data_vencimento, Lote.id_lote).limit(10)
+    ).all()
+    return kpis
+
+
+# -------------------------
+# UBS
+# -------------------------
+def kpis_ubs(session: Session, id_ubs: Optional[int] = None) -> dict:
+    """
+    Indicadores do dashboard da UBS calculados no banco, sem carregar as movimentações.
+    Sem id_ubs (admin) os indicadores consideram todos os registros.
+    """
+    spu = select(
+        func.count(case((SUSParaUBS.status == "recebido", SUSParaUBS.id_spu))).label("total_recebido"),
+        func.count(case((SUSParaUBS.status == "em transito", SUSParaUBS.id_spu))).label("aguardando_sus"),
+    )
+    upp = select(
+        func.count(UBSParaPaciente.id_upp).label("distribuido_pacientes"),
+        func.count(func.distinct(UBSParaPaciente.id_paciente)).label("pacientes_atendidos"),
+    )
+    pacientes = select(func.count(Paciente.id_paciente).label("total_pacientes"))
+    recentes = select(UBSParaPaciente)
+
+    if id_ubs is not None:
+        spu = spu.where(SUSParaUBS.id_ubs == id_ubs)
+        upp = upp.where(UBSParaPaciente.id_ubs == id_ubs)
+        pacientes = pacientes.where(Paciente.id_ubs == id_ubs)
+        recentes = recentes.where(UBSParaPaciente.id_ubs == id_ubs)
+
+    kpis = _linha_unica(session, spu, upp, pacientes, _saldo("ubs", id_ubs))
+
+    # Últimas 10 distribuições, em ordem cronológica
+    ultimas = session.exec(
+        recentes.order_by(UBSParaPaciente.id_upp.desc()).limit(10)
+    ).all()
+    kpis["distribuicoes_recentes"] = list(reversed(ultimas))
+    return kpis
+
+
+# -------------------------
+# PACIENTE
+# -------------------------
+def _entregas_paciente(id_paciente: int, status: str):
+    """Entregas do paciente já unidas ao lote e ao medicamento correspondentes"""
+    return (
+        select(UBSParaPaciente, Lote, Medicamento)
+        .join(Lote, UBSParaPaciente.id_lote == Lote.id_lote)
+        .join(Medicamento, Lote.id_medicamento == Medicamento.id_medicamento)
+        .where(
+            UBSParaPaciente.id_paciente == id_paciente,
+            UBSParaPaciente.status == status
+        )
+    )
+
+
+def kpis_paciente(session: Session, id_paciente: int) -> dict:
+    """
+    Indicadores do dashboard do paciente em um número constante de consultas,
+    independente de quantas entregas ele possui.
+    """
+    entregas = select(
+        func.count(case((UBSParaPaciente.status == "recebido", UBSParaPaciente.id_upp))).label("total_medicamentos_recebidos"),
+        func.count(case((UBSParaPaciente.status == "em transito", UBSParaPaciente.id_upp))).label("em_transito"),
+        func.count(UBSParaPaciente.id_upp).label("total_entregas_historico"),
+    ).where(UBSParaPaciente.id_paciente == id_paciente)
+    feedbacks = select(
+        func.count(Feedback.id_feedback).label("feedbacks_dados")
+    ).where(Feedback.id_paciente == id_paciente)
+
+    kpis = _linha_unica(session, entregas, feedbacks)
+
+    # Últimas 10 entregas recebidas, em ordem cronológica
+    recebidos = session.exec(
+        _entregas_paciente(id_paciente, "recebido")
+        .order_by(UBSParaPaciente.id_upp.desc())
+        .limit(10)
+    ).all()
+    kpis["recebidos"] = list(reversed(recebidos))
+
+    kpis["em_transito_detalhes"] = session.exec(
+        _entregas_paciente(id_paciente, "em transito").order_by(UBSParaPaciente.id_upp)
+    ).all()
+    return kpis
+
+
+# -------------------------
+# PAINÉIS (resposta completa de cada dashboard, guardada nos snapshots)
+# -------------------------
+def painel_farmaceutica(session: Session, id_farmaceutica: Optional[int] = None) -> dict:
+    """Dashboard da farmacêutica: jornada dos seus medicamentos"""
+    kpis = kpis_farmaceutica(session, id_farmaceutica)
+    total_lotes = kpis["lotes_total"]
+    chegou_paciente = kpis["chegou_paciente"]
+
+    return {
+        "medicamentos": {
+            "total": kpis["total_medicamentos"],
+            "lotes_total": total_lotes,
+            "lotes_vencidos": kpis["lotes_vencidos"],
+            "lotes_proximos_vencimento": kpis["lotes_proximos_vencimento"]
+        },
+        "rastreamento": {
+            "em_distribuidor": kpis["em_distribuidor"],
+            "em_sus": kpis["em_sus"],
+            "em_ubs": kpis["em_ubs"],
+            "chegou_paciente": chegou_paciente,
+            "taxa_entrega": round((chegou_paciente / total_lotes * 100) if total_lotes > 0 else 0, 2)
+        }
+        # "feedbacks_e_conteudos": {
+        #     "total_feedbacks": kpis["total_feedbacks"], 
+        #     "conteudo_educacional": conteudo_educacional
+        # }
+    }
+
+
+def painel_distribuidor(session: Session, id_distribuidor: Optional[int] = None) -> dict:
+    """Dashboard do distribuidor: logística de entregas"""
+    entregas = entregas_distribuidor(session, id_distribuidor)
+    pendentes = entregas["pendentes"]
+    concluidas = entregas["concluidas"]
+    total_entregas = entregas["total_entregas"]
+
+    # Calcula tempo médio
+    tempos_entrega = []
+    for mov in concluidas:
+        if mov.data_recebimento and mov.data_envio:
+            delta = mov.data_recebimento - mov.data_envio
+            tempos_entrega.append(delta.days)
+    
+    tempo_medio = sum(tempos_entrega) / len(tempos_entrega) if tempos_entrega else 0
+    
+    # Taxa de eficiência
+    taxa_entrega = round((len(concluidas) / total_entregas * 100) if total_entregas > 0 else 0, 2)
+    
+    return {
+        "entregas": {
+            "pendentes": len(pendentes),
+            "concluidas": len(concluidas),
+            "total_historico": total_entregas,
+            "tempo_medio_dias": round(tempo_medio, 1),
+            "taxa_eficiencia": taxa_entrega
+        },
+        "pendentes_detalhes": [
+            {
+                "id": p.id_dps,
+                "id_lote": p.id_lote,
+                "id_sus": p.id_sus,
+                "quantidade": p.quantidade,
+                "data_envio": p.data_envio,
+                "dias_em_transito": (datetime.now() - p.data_envio).days,
+                "status": p.status
+            }
+            for p in pendentes[:10]
+        ]
+    }
+
+
+def painel_sus(session: Session, id_sus: Optional[int] = None) -> dict:
+    """Dashboard do SUS: gestão de estoque e distribuição"""
+    kpis = kpis_sus(session, id_sus)
+    recebidos = kpis["recebidos"]
+    distribuidos_ubs = kpis["distribuidos_ubs"]
+    
+    # Unidades em posse do SUS, mantidas pelo estoque a cada movimentação
+    em_estoque = kpis["em_estoque"]
+    taxa_distribuicao = round((distribuidos_ubs / recebidos * 100) if recebidos else 0, 2)
+    
+    return {
+        "estoque": {
+            "recebidos": recebidos,
+            "aguardando_recebimento": kpis["aguardando_recebimento"],
+            "distribuidos_ubs": distribuidos_ubs,
+            "em_estoque": max(0, em_estoque),
+            "taxa_distribuicao": taxa_distribuicao
+        },
+        "rede": {
+            "total_ubs_vinculadas": kpis["total_ubs"]
+        },
+        "alertas": {
+            "lotes_vencimento_proximo": kpis["lotes_vencimento_proximo"],
+            "necessita_remanejamento": kpis["necessita_remanejamento"]
+        },
+        "lotes_atencao": [
+            {
+                "id_lote": l.id_lote,
+                "codigo": l.codigo_lote,
+                "quantidade": l.quantidade,
+                "vencimento": l.data_vencimento,
+                "dias_restantes": (l.data_vencimento - datetime.now()).days
+            }
+            for l in kpis["lotes_atencao"]
+        ]
+    }
+
+
+def painel_ubs(session: Session, id_ubs: Optional[int] = None) -> dict:
+    """Dashboard da UBS: estoque e distribuição aos pacientes"""
+    kpis = kpis_ubs(session, id_ubs)
+    total_recebido = kpis["total_recebido"]
+    distribuido_pacientes = kpis["distribuido_pacientes"]
+    pacientes_atendidos = kpis["pacientes_atendidos"]
+    total_pacientes = kpis["total_pacientes"]
+    
+    # Unidades em posse da UBS, mantidas pelo estoque a cada movimentação
+    em_estoque = kpis["em_estoque"]
+    taxa_atendimento = round((pacientes_atendidos / total_pacientes * 100) if total_pacientes > 0 else 0, 2)
+    
+    return {
+        "estoque": {
+            "total_recebido": total_recebido,
+            "aguardando_sus": kpis["aguardando_sus"],
+            "distribuido_pacientes": distribuido_pacientes,
+            "em_estoque": max(0, em_estoque)
+        },
+        "pacientes": {
+            "total_cadastrados": total_pacientes,
+            "atendidos": pacientes_atendidos,
+            "taxa_atendimento": taxa_atendimento
+        },
+        "distribuicoes_recentes": [
+            {
+                "id": d.id_upp,
+                "id_paciente": d.id_paciente,
+                "id_lote": d.id_lote,
+                "data_envio": d.data_envio,
+                "data_recebimento": d.data_recebimento,
+                "status": d.status,
+                "dias_para_entrega": (d.data_recebimento - d.data_envio).days if d.data_recebimento else None
+            }
+            for d in kpis["distribuicoes_recentes"]
+        ]
+    }
@@ -0,0 +1,262 @@
+from sqlmodel import Session, select, update, delete, func
+from collections import defaultdict
+from models import Estoque, Lote, DistribuidorParaSUS, SUSParaUBS, UBSParaPaciente
+from services.snapshots import marcar_movimentacoes
+from sqlalchemy.dialects import postgresql, sqlite
+
+# INSERT ... ON CONFLICT de cada banco suportado
+INSERT_COM_CONFLITO = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+
+# Para cada etapa: (detentor de origem, campo da origem, detentor de destino, campo do destino).
+# O distribuidor não tem entrada registrada no sistema (retira direto do lote),
+# então só acompanhamos o que ele tem em trânsito.
+ETAPAS = {
+    DistribuidorParaSUS: ("distribuidor", "id_distribuidor", "sus", "id_sus"),
+    SUSParaUBS: ("sus", "id_sus", "ubs", "id_ubs"),
+    UBSParaPaciente: ("ubs", "id_ubs", None, None),
+}
+
+# O saldo ainda não distribuído de cada lote fica no estoque, em uma linha do detentor
+# "lote" (id_detentor = id_lote). Lote.quantidade continua sendo o total fabricado.
+DETENTOR_LOTE = "lote"
+
+
+class EstoqueInsuficiente(Exception):
+    """A origem não tem saldo para o envio; faltas: (detentor, id do detentor, id do lote)"""
+
+    def __init__(self, faltas: list):
+        self.faltas = faltas
+        super().__init__("Estoque insuficiente para o envio")
+
+
+def _chave_reserva(tipo_detentor: str, id_detentor: int, id_lote: int) -> tuple:
+    """Linha do estoque de onde sai o envio: o saldo do lote para o distribuidor, o próprio para os demais"""
+    if tipo_detentor == "distribuidor":
+        return (DETENTOR_LOTE, id_lote, id_lote)
+    return (tipo_detentor, id_detentor, id_lote)
+
+
+def _reservar(session: Session, tipo_detentor: str, id_detentor: int, id_lote: int, quantidade: int) -> bool:
+    """
+    Baixa atômica do saldo disponível na linha do estoque, só se ele cobre a quantidade.
+    O UPDATE condicional trava a linha, então envios concorrentes do mesmo saldo nunca
+    o deixam negativo.
+    """
+    comando = (
+        update(Estoque)
+        .where(
+            Estoque.tipo_detentor == tipo_detentor,
+            Estoque.id_detentor == id_detentor,
+            Estoque.id_lote == id_lote,
+            Estoque.quantidade >= quantidade
+        )
+        .values(quantidade=Estoque.quantidade - quantidade)
+    )
+    return session.exec(comando.execution_options(synchronize_session=False)).rowcount == 1
+
+
+# Ordem de travamento, a mesma em todos os caminhos que lançam movimentações:
+#   1. reservas e devoluções de saldo nas origens (reservar), em ordem de chave;
+#   2. lançamentos no estoque (_lancar), em ordem de chave;
+#   3. snapshots dos dashboards (marcar_movimentacoes), por último.
+# Com uma única ordem, duas transações concorrentes nunca esperam uma pela outra em
+# sentidos opostos (deadlock).
+def reservar(session: Session, reservas: dict):
+    """
+    Reserva de uma vez {(detentor, id, lote): quantidade}, em ordem de chave; quantidades
+    negativas são devolvidas à origem. Se faltar saldo em alguma, levanta EstoqueInsuficiente
+    com todas as faltas; quem chama desfaz a transação (rollback).
+    """
+    faltas = []
+    for chave in sorted(reservas, key=lambda chave: (_chave_reserva(*chave), chave)):
+        quantidade = reservas[chave]
+        if quantidade < 0:
+            movimentar_estoque(session, *_chave_reserva(*chave), quantidade=-quantidade)
+        elif quantidade > 0 and not _reservar(session, *_chave_reserva(*chave), quantidade):
+            faltas.append(chave)
+    if faltas:
+        raise EstoqueInsuficiente(faltas)
+
+
+def movimentar_estoque(
+    session: Session,
+    tipo_detentor: str,
+    id_detentor: int,
+    id_lote: int,
+    quantidade: int = 0,
+    em_transito: int = 0
+):
+    """Aplica uma variação ao saldo do detentor no lote (sem commit)"""
+    if not quantidade and not em_transito:
+        return
+
+    # Upsert atômico: dois primeiros lançamentos concorrentes na mesma chave somam em vez de
+    # um deles violar a restrição única
+    comando = INSERT_COM_CONFLITO[session.get_bind().dialect.name](Estoque).values(
+        tipo_detentor=tipo_detentor,
+        id_detentor=id_detentor,
+        id_lote=id_lote,
+        quantidade=quantidade,
+        em_transito=em_transito
+    )
+    session.exec(comando.on_conflict_do_update(
+        index_elements=["tipo_detentor", "id_detentor", "id_lote"],
+        set_={
+            "quantidade": Estoque.quantidade + comando.excluded.quantidade,
+            "em_transito": Estoque.em_transito + comando.excluded.em_transito,
+        }
+    ))
+
+
+def criar_saldo_lote(session: Session, id_lote: int, quantidade: int):
+    """Abre a linha com o saldo não distribuído de um lote recém-criado (sem commit)"""
+    session.add(Estoque(tipo_detentor=DETENTOR_LOTE, id_detentor=id_lote, id_lote=id_lote, quantidade=quantidade))
+
+
+def ajustar_saldo_lote(session: Session, id_lote: int, variacao: int):
+    """
+    Aplica ao saldo não distribuído a mudança da quantidade do lote. Uma redução maior que
+    o saldo levanta EstoqueInsuficiente: o lote não pode ficar abaixo do que já foi enviado.
+    """
+    if variacao < 0:
+        if not _reservar(session, DETENTOR_LOTE, id_lote, id_lote, -variacao):
+            raise EstoqueInsuficiente([(DETENTOR_LOTE, id_lote, id_lote)])
+    else:
+        movimentar_estoque(session, DETENTOR_LOTE, id_lote, id_lote, quantidade=variacao)
+
+
+def remover_saldo_lote(session: Session, id_lote: int):
+    """Remove a linha de saldo de um lote que será excluído (sem commit)"""
+    session.exec(
+        delete(Estoque)
+        .where(Estoque.tipo_detentor == DETENTOR_LOTE, Estoque.id_lote == id_lote)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def aplicar_movimentacao(session: Session, movimentacao, sinal: int = 1):
+    """Lança no estoque o efeito de uma movimentação no seu status atual"""
+    _lancar_efeitos(session, [(movimentacao, sinal)])
+
+
+def estornar_movimentacao(session: Session, movimentacao):
+    """Desfaz no estoque o efeito de uma movimentação (antes de excluir)"""
+    aplicar_movimentacao(session, movimentacao, sinal=-1)
+
+
+def refazer_movimentacao(session: Session, movimentacao, alteracoes: dict):
+    """
+    Altera a movimentação refazendo o seu lançamento no estoque: o efeito anterior é
+    estornado e o novo aplicado de uma vez, na ordem de travamento (sem commit).
+    """
+    anterior = type(movimentacao)(**movimentacao.model_dump())
+    for campo, valor in alteracoes.items():
+        setattr(movimentacao, campo, valor)
+    _lancar_efeitos(session, [(anterior, -1), (movimentacao, 1)])
+
+
+def aplicar_envios(session: Session, movimentacoes: list):
+    """
+    Lança no estoque várias movimentações recém-enviadas (em trânsito) de uma vez:
+    as quantidades são somadas e reservadas uma única vez por detentor e lote.
+    """
+    _lancar_efeitos(session, [(movimentacao, 1) for movimentacao in movimentacoes])
+
+
+def _lancar_efeitos(session: Session, efeitos: list):
+    """Reserva, lança no estoque e marca os snapshots de [(movimentação, sinal)], nessa ordem"""
+    reservas = defaultdict(int)
+    variacoes = defaultdict(lambda: [0, 0])
+    for movimentacao, sinal in efeitos:
+        origem, campo_origem, _, _ = ETAPAS[type(movimentacao)]
+        quantidade = movimentacao.quantidade * sinal
+        chave_origem = (origem, getattr(movimentacao, campo_origem), movimentacao.id_lote)
+
+        # Envio: reserva o saldo da origem (ou o devolve, ao desfazer) e fica em trânsito
+        reservas[chave_origem] += quantidade
+        variacoes[chave_origem][1] += quantidade
+        if movimentacao.status == "recebido":
+            _somar_recebimento(variacoes, movimentacao, sinal)
+
+    reservar(session, reservas)
+    _lancar(session, variacoes)
+    marcar_movimentacoes(session, [movimentacao for movimentacao, _ in efeitos])
+
+
+def registrar_recebimentos(session: Session, movimentacoes: list):
+    """
+    Como registrar_recebimento para várias movimentações, com um lançamento por detentor
+    e lote, na mesma ordem de travamento dos envios
+    """
+    variacoes = defaultdict(lambda: [0, 0])
+    for movimentacao in movimentacoes:
+        _somar_recebimento(variacoes, movimentacao, 1)
+
+    _lancar(session, variacoes)
+    marcar_movimentacoes(session, movimentacoes)
+
+
+def _lancar(session: Session, variacoes: dict):
+    """Aplica variações somadas por (detentor, id, lote): [quantidade, em_transito], em ordem de chave"""
+    for tipo_detentor, id_detentor, id_lote in sorted(variacoes):
+        quantidade, em_transito = variacoes[(tipo_detentor, id_detentor, id_lote)]
+        movimentar_estoque(
+            session, tipo_detentor, id_detentor, id_lote,
+            quantidade=quantidade, em_transito=em_transito
+        )
+
+
+def registrar_recebimento(session: Session, movimentacao):
+    """Tira a movimentação do trânsito da origem e credita no destino; snapshots por último"""
+    registrar_recebimentos(session, [movimentacao])
+
+
+def _somar_recebimento(variacoes: dict, movimentacao, sinal: int):
+    """Acumula em variacoes a saída do trânsito da origem e a entrada no destino"""
+    origem, campo_origem, destino, campo_destino = ETAPAS[type(movimentacao)]
+    quantidade = movimentacao.quantidade * sinal
+
+    variacoes[(origem, getattr(movimentacao, campo_origem), movimentacao.id_lote)][1] -= quantidade
+    if destino:
+        variacoes[(destino, getattr(movimentacao, campo_destino), movimentacao.id_lote)][0] += quantidade
+
+
+def recalcular_estoque(session: Session):
+    """Reconstrói todo o estoque a partir do histórico de movimentações (sem commit)"""
+    saldos = defaultdict(lambda: [0, 0])
+    for id_lote, quantidade in session.exec(select(Lote.id_lote, Lote.quantidade)).all():
+        saldos[(DETENTOR_LOTE, id_lote, id_lote)][0] = quantidade
+
+    for modelo, (origem, campo_origem, destino, campo_destino) in ETAPAS.items():
+        coluna_origem = getattr(modelo, campo_origem)
+        colunas = [coluna_origem, modelo.id_lote, modelo.status]
+        if destino:
+            colunas.append(getattr(modelo, campo_destino))
+
+        linhas = session.exec(
+            select(*colunas, func.sum(modelo.quantidade)).group_by(*colunas)
+        ).all()
+
+        for linha in linhas:
+            id_origem, id_lote, status = linha[0], linha[1], linha[2]
+            quantidade = linha[-1] or 0
+
+            saldos[_chave_reserva(origem, id_origem, id_lote)][0] -= quantidade
+            if status == "recebido":
+                if destino:
+                    saldos[(destino, linha[3], id_lote)][0] += quantidade
+            else:
+                saldos[(origem, id_origem, id_lote)][1] += quantidade
+
+    session.exec(delete(Estoque))
+    for (tipo_detentor, id_detentor, id_lote), (quantidade, em_transito) in saldos.items():
+        session.add(Estoque(
+            tipo_detentor=tipo_detentor,
+            id_detentor=id_detentor,
+            id_lote=id_lote,
+            quantidade=quantidade,
+            em_transito=em_transito
+        ))
@@ -0,0 +1,115 @@
+import csv
+import io
+from typing import Iterable, List, Optional, Tuple
+from pydantic import ValidationError
+from sqlmodel import Session, select, insert
+from sqlalchemy.exc import DataError, IntegrityError
+from models import Estoque, Lote, LoteBase, Medicamento, LinhaImportacao, ResultadoImportacao
+from services.snapshots import marcar_lote
+from services.estoque import DETENTOR_LOTE
+from services.validade import situacao_validade
+
+# Linhas por INSERT de várias linhas
+LINHAS_POR_INSERT = 1000
+
+# Registros a importar: (número da linha, dados brutos)
+Registro = Tuple[int, dict]
+
+
+def ler_csv(conteudo: bytes) -> List[Registro]:
+    """Registros de um CSV com cabeçalho (colunas de LoteBase), numerados pela linha do arquivo"""
+    leitor = csv.DictReader(io.StringIO(conteudo.decode("utf-8-sig")))
+    return [(leitor.line_num, dict(linha)) for linha in leitor]
+
+
+def _erro_validacao(erro: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(parte) for parte in detalhe['loc'])}: {detalhe['msg']}"
+        for detalhe in erro.errors()
+    )
+
+
+def _inserir(session: Session, linhas: List[Tuple[int, dict]], resultados: dict):
+    """
+    INSERT de várias linhas com RETURNING, mais o saldo de cada lote no estoque; se o banco
+    recusar o bloco, isola as linhas com erro
+    """
+    comando = insert(Lote).returning(Lote.id_lote, sort_by_parameter_order=True)
+    try:
+        with session.begin_nested():
+            ids = session.exec(comando, params=[dados for _, dados in linhas]).scalars().all()
+            # Saldo ainda não distribuído de cada lote (ver services.estoque)
+            session.exec(insert(Estoque), params=[
+                {
+                    "tipo_detentor": DETENTOR_LOTE, "id_detentor": id_lote, "id_lote": id_lote,
+                    "quantidade": dados["quantidade"], "em_transito": 0
+                }
+                for (_, dados), id_lote in zip(linhas, ids)
+            ])
+    except (IntegrityError, DataError):
+        if len(linhas) == 1:
+            numero, _ = linhas[0]
+            resultados[numero] = LinhaImportacao(linha=numero, erro="Lote recusado pelo banco de dados.")
+            return
+        # Uma a uma, para que só as linhas com problema fiquem de fora
+        for linha in linhas:
+            _inserir(session, [linha], resultados)
+        return
+
+    for (numero, _), id_lote in zip(linhas, ids):
+        resultados[numero] = LinhaImportacao(linha=numero, id_lote=id_lote)
+
+
+def importar_lotes(
+    session: Session,
+    registros: Iterable[Registro],
+    id_farmaceutica: Optional[int] = None
+) -> ResultadoImportacao:
+    """
+    Valida e insere lotes em lote. Linhas inválidas ou de medicamentos de outra
+    farmacêutica (id_farmaceutica None: admin) são reportadas sem interromper as demais.
+    """
+    resultados = {}
+    validos = []
+    for numero, dados in registros:
+        try:
+            validos.append((numero, LoteBase.model_validate(dados)))
+        except ValidationError as erro:
+            resultados[numero] = LinhaImportacao(linha=numero, erro=_erro_validacao(erro))
+
+    # Dono de todos os medicamentos referenciados em uma única consulta
+    ids_medicamento = {lote.id_medicamento for _, lote in validos}
+    donos = dict(session.exec(
+        select(Medicamento.id_medicamento, Medicamento.id_farmaceutica)
+        .where(Medicamento.id_medicamento.in_(ids_medicamento))
+    ).all()) if ids_medicamento else {}
+
+    a_inserir = []
+    for numero, lote in validos:
+        if lote.id_medicamento not in donos:
+            resultados[numero] = LinhaImportacao(linha=numero, erro="Medicamento não encontrado.")
+        elif id_farmaceutica is not None and donos[lote.id_medicamento] != id_farmaceutica:
+            resultados[numero] = LinhaImportacao(
+                linha=numero,
+                erro="Você não pode criar lotes para medicamentos de outras farmacêuticas."
+            )
+        else:
+            a_inserir.append((
+                numero, {**lote.model_dump(), "situacao_validade": situacao_validade(lote.data_vencimento)}
+            ))
+
+    for inicio in range(0, len(a_inserir), LINHAS_POR_INSERT):
+        _inserir(session, a_inserir[inicio:inicio + LINHAS_POR_INSERT], resultados)
+
+    linhas = [resultados[numero] for numero in sorted(resultados)]
+    inseridos = sum(1 for linha in linhas if linha.id_lote is not None)
+    if inseridos:
+        marcar_lote(session, *{dados["id_medicamento"] for _, dados in a_inserir})
+        session.commit()
+
+    return ResultadoImportacao(
+        total=len(linhas),
+        inseridos=inseridos,
+        erros=len(linhas) - inseridos,
+        linhas=linhas
+    )
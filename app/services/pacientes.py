@@ -0,0 +1,36 @@
+from sqlmodel import Session, select, func
+import os
+from cache import CacheTTL
+from models import Paciente, UBS
+
+# Total de pacientes por SUS (todas as UBS da região), para o header X-Total-Count.
+# Escritas neste processo invalidam na hora; nos demais workers a contagem pode ficar
+# desatualizada até o TTL.
+cache_total_pacientes_sus = CacheTTL(
+    maxsize=int(os.getenv("CACHE_TOTAL_PACIENTES_MAX", "1024")),
+    ttl=float(os.getenv("CACHE_TOTAL_PACIENTES_TTL", "60"))
+)
+
+
+def total_pacientes_sus(session: Session, id_sus: int) -> int:
+    """Quantidade de pacientes nas UBS do SUS (join pelos índices de id_sus e id_ubs)"""
+    total = cache_total_pacientes_sus.get(id_sus)
+    if total is None:
+        total = session.exec(
+            select(func.count(Paciente.id_paciente))
+            .join(UBS, Paciente.id_ubs == UBS.id_ubs)
+            .where(UBS.id_sus == id_sus)
+        ).one()
+        cache_total_pacientes_sus.set(id_sus, total)
+    return total
+
+
+def invalidar_total_sus(*ids_sus: int):
+    """Descarta a contagem dos SUS (chamar após mudar UBS de região ou excluir UBS)"""
+    cache_total_pacientes_sus.invalidate(*ids_sus)
+
+
+def invalidar_total_ubs(session: Session, *ids_ubs: int):
+    """Descarta a contagem dos SUS das UBS (chamar após criar, mover ou excluir pacientes)"""
+    ids_sus = session.exec(select(UBS.id_sus).where(UBS.id_ubs.in_(set(ids_ubs)))).all()
+    invalidar_total_sus(*ids_sus)
@@ -0,0 +1,231 @@
+from sqlmodel import Session, select, update
+from sqlalchemy import and_, or_
+from sqlalchemy.exc import IntegrityError
+from fastapi.encoders import jsonable_encoder
+from typing import Dict, Iterable, List, Optional, Tuple
+from collections import defaultdict
+from datetime import datetime, timedelta
+import os
+import time
+from models import (
+    DashboardSnapshot, Estoque, Medicamento, Lote, DistribuidorParaSUS, SUSParaUBS, UBSParaPaciente
+)
+from services.dashboard import painel_farmaceutica, painel_distribuidor, painel_sus, painel_ubs
+
+# Cálculo de cada painel a partir do id da entidade (None: visão do admin)
+PAINEIS = {
+    "farmaceutica": painel_farmaceutica,
+    "distribuidor": painel_distribuidor,
+    "sus": painel_sus,
+    "ubs": painel_ubs,
+}
+
+# id_escopo dos snapshots do admin, que consideram todos os registros
+ESCOPO_ADMIN = 0
+
+# Indicadores que dependem da data (vencimentos, dias em trânsito) ou de cadastros
+# (UBS, pacientes, medicamentos) são recalculados quando o snapshot passa desta idade
+IDADE_MAXIMA = float(os.getenv("DASHBOARD_SNAPSHOT_IDADE_MAXIMA", "300"))
+
+# Os snapshots do admin somam todos os registros: marcá-los em cada escrita faria toda
+# transação travar a mesma linha. Eles são recalculados só por idade, com limite menor.
+IDADE_MAXIMA_ADMIN = float(os.getenv("DASHBOARD_SNAPSHOT_IDADE_MAXIMA_ADMIN", "60"))
+
+# Snapshots que ninguém consulta não são recalculados por idade: só os lidos neste worker
+# nos últimos JANELA_LEITURA segundos. Os sujos são sempre recalculados.
+JANELA_LEITURA = float(os.getenv("DASHBOARD_SNAPSHOT_JANELA_LEITURA", "900"))
+
+# Última leitura de cada snapshot neste worker: (painel, id_escopo) -> time.monotonic()
+_lidos: Dict[Tuple[str, int], float] = {}
+
+# Painéis afetados por cada etapa das movimentações: (painel, campo com o id da entidade)
+PAINEIS_DA_ETAPA = {
+    DistribuidorParaSUS: [("distribuidor", "id_distribuidor"), ("sus", "id_sus")],
+    SUSParaUBS: [("sus", "id_sus"), ("ubs", "id_ubs")],
+    UBSParaPaciente: [("ubs", "id_ubs")],
+}
+
+
+def _resposta(snapshot: DashboardSnapshot) -> dict:
+    """Dados do snapshot acrescidos de quão atualizados eles estão"""
+    idade = (datetime.now() - snapshot.atualizado_em).total_seconds()
+    idade_maxima = IDADE_MAXIMA_ADMIN if snapshot.id_escopo == ESCOPO_ADMIN else IDADE_MAXIMA
+    return {
+        **snapshot.dados,
+        "snapshot": {
+            "atualizado_em": snapshot.atualizado_em,
+            "idade_segundos": round(idade, 1),
+            "desatualizado": snapshot.sujo or idade > idade_maxima
+        }
+    }
+
+
+def _calcular(session: Session, painel: str, id_escopo: int) -> dict:
+    return jsonable_encoder(PAINEIS[painel](session, id_escopo or None))
+
+
+def _lidos_recentemente() -> Dict[str, List[int]]:
+    """Escopos lidos dentro da janela, por painel (e esquece os mais antigos)"""
+    limite = time.monotonic() - JANELA_LEITURA
+    por_painel = defaultdict(list)
+    for (painel, id_escopo), instante in list(_lidos.items()):
+        if instante < limite:
+            _lidos.pop((painel, id_escopo), None)
+        else:
+            por_painel[painel].append(id_escopo)
+    return por_painel
+
+
+def ler_snapshot(session: Session, painel: str, id_escopo: Optional[int]) -> Optional[dict]:
+    """Resposta guardada do painel (uma busca por chave primária), ou None se ainda não existe"""
+    _lidos[(painel, id_escopo or ESCOPO_ADMIN)] = time.monotonic()
+    snapshot = session.get(DashboardSnapshot, (painel, id_escopo or ESCOPO_ADMIN))
+    return _resposta(snapshot) if snapshot else None
+
+
+def gerar_snapshot(session: Session, painel: str, id_escopo: Optional[int]) -> dict:
+    """Calcula o painel e grava o snapshot (primeiro acesso ao escopo)"""
+    id_escopo = id_escopo or ESCOPO_ADMIN
+    snapshot = DashboardSnapshot(
+        painel=painel,
+        id_escopo=id_escopo,
+        dados=_calcular(session, painel, id_escopo),
+        atualizado_em=datetime.now()
+    )
+    session.add(snapshot)
+    try:
+        session.commit()
+    except IntegrityError:
+        # Outra requisição gravou o mesmo snapshot ao mesmo tempo: vale o dela
+        session.rollback()
+        return ler_snapshot(session, painel, id_escopo)
+    return _resposta(snapshot)
+
+
+def atualizar_snapshots(session: Session, limite: int = 100) -> int:
+    """
+    Recalcula até `limite` snapshots, um por transação: primeiro os sujos, depois os lidos
+    recentemente neste worker que passaram de IDADE_MAXIMA (IDADE_MAXIMA_ADMIN para os do
+    admin, que não são marcados pelas escritas). Cada um é reservado com FOR UPDATE SKIP
+    LOCKED, então workers simultâneos não recalculam o mesmo snapshot. Um snapshot marcado
+    de novo durante o cálculo continua sujo para a próxima rodada.
+    """
+    agora = datetime.now()
+    vencido = or_(
+        DashboardSnapshot.atualizado_em < agora - timedelta(seconds=IDADE_MAXIMA),
+        and_(
+            DashboardSnapshot.id_escopo == ESCOPO_ADMIN,
+            DashboardSnapshot.atualizado_em < agora - timedelta(seconds=IDADE_MAXIMA_ADMIN)
+        )
+    )
+    condicoes = [DashboardSnapshot.sujo == True] + [
+        and_(DashboardSnapshot.painel == painel, DashboardSnapshot.id_escopo.in_(ids), vencido)
+        for painel, ids in _lidos_recentemente().items()
+    ]
+    proximo = (
+        select(DashboardSnapshot.painel, DashboardSnapshot.id_escopo, DashboardSnapshot.versao)
+        .where(or_(*condicoes))
+        .order_by(DashboardSnapshot.sujo.desc(), DashboardSnapshot.atualizado_em)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+    )
+
+    atualizados = 0
+    while atualizados < limite:
+        pendente = session.exec(proximo).first()
+        if pendente is None:
+            break
+        painel, id_escopo, versao = pendente
+        session.exec(
+            update(DashboardSnapshot)
+            .where(
+                DashboardSnapshot.painel == painel,
+                DashboardSnapshot.id_escopo == id_escopo,
+                DashboardSnapshot.versao == versao
+            )
+            .values(dados=_calcular(session, painel, id_escopo), atualizado_em=datetime.now(), sujo=False)
+        )
+        session.commit()
+        atualizados += 1
+    return atualizados
+
+
+def marcar_sujos(session: Session, *alvos):
+    """
+    Marca para recálculo os snapshots afetados por uma escrita, na mesma transação (sem commit).
+    alvos: (painel, id da entidade, coleção ou subconsulta de ids, ou None para todas).
+    Os snapshots do admin nunca são marcados (ver IDADE_MAXIMA_ADMIN).
+    """
+    condicoes = []
+    for painel, escopo in alvos:
+        if escopo is None:
+            filtro = DashboardSnapshot.id_escopo != ESCOPO_ADMIN
+        else:
+            filtro = DashboardSnapshot.id_escopo.in_([escopo] if isinstance(escopo, int) else escopo)
+        condicoes.append(and_(DashboardSnapshot.painel == painel, filtro))
+
+    session.exec(
+        update(DashboardSnapshot)
+        .where(or_(*condicoes))
+        .values(sujo=True, versao=DashboardSnapshot.versao + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _farmaceutica_do_medicamento(*ids_medicamento: int):
+    return select(Medicamento.id_farmaceutica).where(Medicamento.id_medicamento.in_(ids_medicamento))
+
+
+def marcar_movimentacao(session: Session, movimentacao):
+    """Snapshots afetados por uma movimentação: as duas pontas e a farmacêutica do lote"""
+    farmaceutica = (
+        select(Medicamento.id_farmaceutica)
+        .join(Lote, Lote.id_medicamento == Medicamento.id_medicamento)
+        .where(Lote.id_lote == movimentacao.id_lote)
+    )
+    marcar_sujos(
+        session,
+        ("farmaceutica", farmaceutica),
+        *[
+            (painel, getattr(movimentacao, campo))
+            for painel, campo in PAINEIS_DA_ETAPA[type(movimentacao)]
+        ]
+    )
+
+
+def marcar_lote(session: Session, *ids_medicamento: int, ids_lote: Iterable[int] = ()):
+    """
+    Snapshots afetados por lotes: as farmacêuticas donas e, para lotes já existentes (ids_lote),
+    só os SUS que têm estoque deles (lotes perto do vencimento). Lotes novos não estão em
+    nenhum SUS; a mudança de faixa pela data fica com a idade do snapshot.
+    """
+    alvos = [("farmaceutica", _farmaceutica_do_medicamento(*ids_medicamento))]
+    if ids_lote:
+        alvos.append(("sus", select(Estoque.id_detentor).where(
+            Estoque.tipo_detentor == "sus", Estoque.id_lote.in_(ids_lote)
+        )))
+    marcar_sujos(session, *alvos)
+
+
+def marcar_feedback(session: Session, id_medicamento: int):
+    """Snapshots afetados por um feedback: a farmacêutica do medicamento"""
+    marcar_sujos(session, ("farmaceutica", _farmaceutica_do_medicamento(id_medicamento)))
+
+
+def marcar_movimentacoes(session: Session, movimentacoes: list):
+    """Como marcar_movimentacao para várias movimentações da mesma etapa, em um único UPDATE"""
+    if not movimentacoes:
+        return
+    farmaceuticas = (
+        select(Medicamento.id_farmaceutica)
+        .join(Lote, Lote.id_medicamento == Medicamento.id_medicamento)
+        .where(Lote.id_lote.in_({movimentacao.id_lote for movimentacao in movimentacoes}))
+    )
+    marcar_sujos(
+        session,
+        ("farmaceutica", farmaceuticas),
+        *[
+            (painel, {getattr(movimentacao, campo) for movimentacao in movimentacoes})
+            for painel, campo in PAINEIS_DA_ETAPA[type(movimentacoes[0])]
+        ]
+    )
@@ -0,0 +1,62 @@
+from sqlmodel import Session, update
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+import os
+from models import Lote
+
+# Faixas de vencimento dos lotes, da mais próxima para a mais distante:
+# (situação, dias até o vencimento em que a faixa termina; None: sem limite)
+FAIXAS = [
+    ("vencido", 0),
+    ("vence_em_30_dias", 30),
+    ("vence_em_60_dias", 60),
+    ("valido", None),
+]
+
+SITUACOES_PROXIMAS_30_DIAS = ["vence_em_30_dias"]
+SITUACOES_PROXIMAS_60_DIAS = ["vence_em_30_dias", "vence_em_60_dias"]
+
+# Intervalo (segundos) entre as varreduras de validade; 0 desliga
+INTERVALO_VARREDURA = float(os.getenv("LOTE_VALIDADE_INTERVALO", "3600"))
+
+
+def situacao_validade(data_vencimento: datetime, agora: Optional[datetime] = None) -> str:
+    """Faixa de vencimento de um lote (usada ao criar e alterar lotes)"""
+    agora = agora or datetime.now()
+    for situacao, dias in FAIXAS:
+        if dias is None or data_vencimento < agora + timedelta(days=dias):
+            return situacao
+
+
+def atualizar_situacao_lotes(session: Session) -> Dict[str, List[int]]:
+    """
+    Move para a faixa correta os lotes cujo vencimento se aproximou, um UPDATE por faixa
+    (pelo índice de data_vencimento). Devolve os lotes que mudaram, por nova situação:
+    cada transição aparece uma única vez, mesmo com vários workers varrendo.
+    Os snapshots dos painéis não são marcados: indicadores de vencimento já são
+    recalculados pela idade do snapshot (IDADE_MAXIMA).
+    """
+    agora = datetime.now()
+    transicoes = {}
+    inicio = None
+    for situacao, dias in FAIXAS:
+        fim = agora + timedelta(days=dias) if dias is not None else None
+        condicoes = [Lote.situacao_validade != situacao]
+        if inicio is not None:
+            condicoes.append(Lote.data_vencimento >= inicio)
+        if fim is not None:
+            condicoes.append(Lote.data_vencimento < fim)
+
+        alterados = session.exec(
+            update(Lote)
+            .where(*condicoes)
+            .values(situacao_validade=situacao)
+            .returning(Lote.id_lote)
+            .execution_options(synchronize_session=False)
+        ).scalars().all()
+        if alterados:
+            transicoes[situacao] = list(alterados)
+        inicio = fim
+
+    session.commit()
+    return transicoes
@@ -0,0 +1,153 @@
+"""
+Compara sob carga as rotas quentes com e sem DB_ASYNC.
+
+Sobe a aplicação (uvicorn, um worker) uma vez em cada modo sobre o mesmo banco e dispara
+requisições concorrentes aos dashboards e às listagens, medindo vazão e latência.
+
+    python bench/carga_db_async.py                      # SQLite temporário
+    DATABASE_URL=postgresql://... python bench/carga_db_async.py --requisicoes 5000
+
+O banco informado recebe as migrações e alguns cadastros (usuários bench-*@carga).
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PORTA = 8765
+URL = f"http://127.0.0.1:{PORTA}"
+
+# Rotas medidas, pelo perfil que as chama
+ROTAS = [
+    ("sus", "/dashboard/sus/gerencial"),
+    ("sus", "/distribuidores-sus/?limit=50"),
+    ("farmaceutica", "/dashboard/farmaceutica/overview"),
+    ("farmaceutica", "/lotes/?limit=50"),
+]
+
+
+def _ambiente(db_async: bool) -> dict:
+    return {
+        **os.environ,
+        "DB_ASYNC": "true" if db_async else "false",
+        "DB_PROFILE": "prod",
+        "DASHBOARD_SNAPSHOT_INTERVALO": "0",
+        "LOTE_VALIDADE_INTERVALO": "0",
+    }
+
+
+def _subir(db_async: bool) -> subprocess.Popen:
+    servidor = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", os.path.join(RAIZ, "app"),
+         "--port", str(PORTA), "--timeout-keep-alive", "60", "--log-level", "warning"],
+        env=_ambiente(db_async)
+    )
+    for _ in range(100):
+        try:
+            httpx.get(f"{URL}/docs", timeout=1)
+            return servidor
+        except httpx.TransportError:
+            time.sleep(0.2)
+    servidor.kill()
+    raise RuntimeError("A aplicação não respondeu")
+
+
+def _entrar(cliente: httpx.Client, email: str, tipo: str, perfil=None) -> dict:
+    cliente.post("/auth/register", json={"nome": email, "email": email, "senha": "carga", "tipo": tipo})
+    token = cliente.post("/auth/login", json={"email": email, "senha": "carga"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    if perfil:
+        rota, corpo = perfil
+        cliente.post(rota, headers=headers, json=corpo)
+    return headers
+
+
+def _preparar() -> dict:
+    """Cadastros usados pela carga (só na primeira vez) e os tokens de cada perfil"""
+    with httpx.Client(base_url=URL, timeout=30) as cliente:
+        farmaceutica = _entrar(cliente, "bench-f@carga", "farmaceutica", (
+            "/farmaceuticas/", {"nome": "F", "cnpj": "1", "contato": "c"}
+        ))
+        sus = _entrar(cliente, "bench-s@carga", "sus", (
+            "/sus/", {"regiao": "R", "contato_gestor": "c", "nome_gestor": "n"}
+        ))
+        if not cliente.get("/lotes/?limit=1", headers=farmaceutica).json():
+            medicamento = cliente.post("/medicamentos/", headers=farmaceutica, json={
+                "nome": "M", "preco": 1, "alto_custo": False, "id_farmaceutica": 0
+            }).json()
+            for indice in range(50):
+                cliente.post("/lotes/", headers=farmaceutica, json={
+                    "codigo_lote": f"L{indice}", "data_fabricacao": "2024-01-01T00:00:00",
+                    "data_vencimento": "2099-01-01T00:00:00", "quantidade": 1000,
+                    "id_medicamento": medicamento["id_medicamento"]
+                })
+    return {"farmaceutica": farmaceutica, "sus": sus}
+
+
+async def _carga(tokens: dict, requisicoes: int, concorrencia: int) -> dict:
+    latencias = []
+    erros = 0
+    semaforo = asyncio.Semaphore(concorrencia)
+    limites = httpx.Limits(max_connections=concorrencia, max_keepalive_connections=concorrencia)
+
+    async with httpx.AsyncClient(base_url=URL, limits=limites, timeout=60) as cliente:
+        async def requisitar(indice: int):
+            nonlocal erros
+            perfil, rota = ROTAS[indice % len(ROTAS)]
+            async with semaforo:
+                inicio = time.perf_counter()
+                try:
+                    resposta = await cliente.get(rota, headers=tokens[perfil])
+                except httpx.TransportError:
+                    erros += 1
+                    return
+                latencias.append(time.perf_counter() - inicio)
+                if resposta.status_code != 200:
+                    erros += 1
+
+        inicio = time.perf_counter()
+        await asyncio.gather(*(requisitar(indice) for indice in range(requisicoes)))
+        duracao = time.perf_counter() - inicio
+
+    latencias.sort()
+    return {
+        "req/s": round(requisicoes / duracao, 1),
+        "p50 ms": round(statistics.median(latencias) * 1000, 1),
+        "p95 ms": round(latencias[int(len(latencias) * 0.95)] * 1000, 1),
+        "erros": erros,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requisicoes", type=int, default=2000)
+    parser.add_argument("--concorrencia", type=int, default=100)
+    args = parser.parse_args()
+
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'carga.sqlite')}")
+    subprocess.run(
+        [sys.executable, os.path.join(RAIZ, "app", "migrate.py"), "upgrade"],
+        env=_ambiente(False), check=True, stdout=subprocess.DEVNULL
+    )
+
+    for db_async in (False, True):
+        servidor = _subir(db_async)
+        try:
+            tokens = _preparar()
+            asyncio.run(_carga(tokens, 200, args.concorrencia))  # aquecimento
+            resultado = asyncio.run(_carga(tokens, args.requisicoes, args.concorrencia))
+        finally:
+            servidor.terminate()
+            servidor.wait()
+        print(f"DB_ASYNC={'true ' if db_async else 'false'}", resultado)
+
+
+if __name__ == "__main__":
+    main()
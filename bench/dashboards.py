@@ -0,0 +1,138 @@
+"""
+Mede o cálculo de cada dashboard sobre uma massa de dados: comandos SQL por chamada e
+latência (p50/p95), no escopo de uma entidade e no do admin (todos os registros).
+
+O cálculo é o que roda no primeiro acesso a um escopo e a cada recálculo do snapshot; as
+requisições comuns só leem o snapshot (linha "snapshot"). Para comparação, a linha
+"farmaceutica (por indicador)" refaz o dashboard da farmacêutica como era antes, com uma
+contagem por indicador.
+
+    python bench/dashboards.py                          # SQLite temporário
+    DATABASE_URL=postgresql://... python bench/dashboards.py --escala 5 --repeticoes 200
+
+O banco informado recebe as migrações e a massa de dados (use um banco descartável).
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _farmaceutica_por_indicador(session, id_farmaceutica):
+    """Indicadores da farmacêutica com uma contagem por indicador (implementação anterior)"""
+    from sqlmodel import select, func
+    from models import Medicamento, Lote, DistribuidorParaSUS, SUSParaUBS, UBSParaPaciente, Feedback
+
+    agora = datetime.now()
+
+    def contar(coluna, *joins, **filtros):
+        query = select(func.count(coluna))
+        for modelo in joins:
+            query = query.join(modelo)
+        if id_farmaceutica is not None and (joins or coluna.class_ is Medicamento):
+            query = query.where(Medicamento.id_farmaceutica == id_farmaceutica)
+        for condicao in filtros.values():
+            query = query.where(condicao)
+        return session.exec(query).one()
+
+    return {
+        "total_medicamentos": contar(Medicamento.id_medicamento),
+        "total_lotes": contar(Lote.id_lote, Medicamento),
+        "lotes_vencidos": contar(Lote.id_lote, Medicamento, v=Lote.data_vencimento < agora),
+        "lotes_proximos_vencimento": contar(
+            Lote.id_lote, Medicamento, v=Lote.data_vencimento.between(agora, agora + timedelta(days=30))
+        ),
+        "em_distribuidor": contar(DistribuidorParaSUS.id_dps, Lote, Medicamento, s=DistribuidorParaSUS.status == "em transito"),
+        "em_sus": contar(SUSParaUBS.id_spu, Lote, Medicamento, s=SUSParaUBS.status == "em transito"),
+        "em_ubs": contar(UBSParaPaciente.id_upp, Lote, Medicamento, s=UBSParaPaciente.status == "em transito"),
+        "chegou_paciente": contar(UBSParaPaciente.id_upp, Lote, Medicamento, s=UBSParaPaciente.status == "recebido"),
+        "total_feedbacks": contar(Feedback.id_feedback, Medicamento),
+    }
+
+
+def _medir(engine, funcao, escopos: list, repeticoes: int) -> dict:
+    """Chama funcao(session, escopo) alternando os escopos; comandos por chamada e latência"""
+    from sqlalchemy import event
+    from sqlmodel import Session
+
+    comandos = 0
+
+    def contar(*args, **kwargs):
+        nonlocal comandos
+        comandos += 1
+
+    latencias = []
+    with Session(engine) as session:
+        funcao(session, escopos[0])  # aquecimento
+        event.listen(engine, "before_cursor_execute", contar)
+        try:
+            for indice in range(repeticoes):
+                inicio = time.perf_counter()
+                funcao(session, escopos[indice % len(escopos)])
+                latencias.append(time.perf_counter() - inicio)
+                session.rollback()
+        finally:
+            event.remove(engine, "before_cursor_execute", contar)
+
+    latencias.sort()
+    return {
+        "comandos": round(comandos / repeticoes, 1),
+        "p50 ms": round(statistics.median(latencias) * 1000, 2),
+        "p95 ms": round(latencias[int(len(latencias) * 0.95)] * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--escala", type=int, default=1)
+    parser.add_argument("--repeticoes", type=int, default=100)
+    args = parser.parse_args()
+
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'carga.sqlite')}")
+    os.environ.setdefault("DB_ECHO", "false")
+    subprocess.run(
+        [sys.executable, os.path.join(RAIZ, "app", "migrate.py"), "upgrade"],
+        check=True, stdout=subprocess.DEVNULL
+    )
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from sqlmodel import Session
+    from massa import povoar
+    import database
+    from services.dashboard import kpis_paciente
+    from services.snapshots import PAINEIS, gerar_snapshot, ler_snapshot
+
+    with Session(database.engine) as session:
+        inicio = time.perf_counter()
+        ids = povoar(session, args.escala)
+        print(f"massa gravada em {time.perf_counter() - inicio:.1f}s")
+
+    # Algumas entidades de cada tipo, alternadas entre as chamadas
+    medicoes = [
+        (f"{painel} (entidade)", funcao, ids[painel][:10])
+        for painel, funcao in PAINEIS.items()
+    ] + [
+        (f"{painel} (admin)", funcao, [None])
+        for painel, funcao in PAINEIS.items()
+    ] + [
+        ("farmaceutica (por indicador)", _farmaceutica_por_indicador, ids["farmaceutica"][:10]),
+        ("farmaceutica admin (por indicador)", _farmaceutica_por_indicador, [None]),
+        ("paciente", kpis_paciente, ids["paciente"][:10]),
+    ]
+
+    with Session(database.engine) as session:
+        gerar_snapshot(session, "sus", ids["sus"][0])
+    medicoes.append(("snapshot", lambda session, id_sus: ler_snapshot(session, "sus", id_sus), ids["sus"][:1]))
+
+    for nome, funcao, escopos in medicoes:
+        print(f"{nome:36}", _medir(database.engine, funcao, escopos, args.repeticoes))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Mede a vazão dos envios em massa nas três etapas (distribuidor → SUS, SUS → UBS e UBS →
+paciente) com remessas de 1000 itens, e a compara com o mesmo número de itens enviados um
+por requisição, em sequência, pela rota individual. As latências (p50/p95) são por
+requisição: uma remessa inteira no envio em massa, um item no individual.
+
+Grava a massa de dados (bench/massa.py), credita saldo de sobra ao SUS e à UBS que enviam
+e sobe a aplicação (uvicorn, um worker).
+
+    python bench/envios_em_massa.py                     # SQLite temporário
+    DATABASE_URL=postgresql://... python bench/envios_em_massa.py --remessas 20
+
+O banco informado recebe as migrações e a massa de dados (use um banco descartável).
+"""
+import argparse
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PORTA = 8765
+URL = f"http://127.0.0.1:{PORTA}"
+
+
+def _ambiente() -> dict:
+    return {
+        **os.environ,
+        "DB_PROFILE": "prod",
+        "DASHBOARD_SNAPSHOT_INTERVALO": "0",
+        "LOTE_VALIDADE_INTERVALO": "0",
+    }
+
+
+def _subir() -> subprocess.Popen:
+    servidor = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", os.path.join(RAIZ, "app"),
+         "--port", str(PORTA), "--timeout-keep-alive", "60", "--log-level", "warning"],
+        env=_ambiente()
+    )
+    for _ in range(100):
+        try:
+            httpx.get(f"{URL}/docs", timeout=1)
+            return servidor
+        except httpx.TransportError:
+            time.sleep(0.2)
+    servidor.kill()
+    raise RuntimeError("A aplicação não respondeu")
+
+
+def _preparar(escala: int) -> dict:
+    """Massa de dados e saldo de sobra, em todos os lotes, para o primeiro SUS e a primeira UBS"""
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from sqlmodel import Session, delete
+    from massa import povoar
+    import database
+    from models import Estoque
+
+    with Session(database.engine) as session:
+        ids = povoar(session, escala)
+        for tipo, id_detentor in (("sus", ids["sus"][0]), ("ubs", ids["ubs"][0])):
+            session.exec(delete(Estoque).where(Estoque.tipo_detentor == tipo, Estoque.id_detentor == id_detentor))
+            session.add_all([
+                Estoque(tipo_detentor=tipo, id_detentor=id_detentor, id_lote=id_lote, quantidade=1_000_000)
+                for id_lote in ids["lote"]
+            ])
+        session.commit()
+    return ids
+
+
+def _etapas(ids: dict) -> list:
+    """(nome, perfil que envia, rota, campo de destino na rota individual, destinos válidos)"""
+    return [
+        ("distribuidor → SUS", "distribuidor", "/distribuidores-sus", "id_sus", ids["sus"]),
+        ("SUS → UBS", "sus", "/sus-ubs", "id_ubs", [
+            id_ubs for id_ubs, id_sus in zip(ids["ubs"], ids["sus_da_ubs"]) if id_sus == ids["sus"][0]
+        ]),
+        ("UBS → paciente", "ubs", "/ubs-pacientes", "id_paciente", [
+            id_paciente for id_paciente, id_ubs in zip(ids["paciente"], ids["ubs_do_paciente"]) if id_ubs == ids["ubs"][0]
+        ]),
+    ]
+
+
+def _entrar(cliente: httpx.Client, perfil: str) -> dict:
+    from massa import SENHA
+
+    resposta = cliente.post("/auth/login", json={"email": f"massa-{perfil}-0@bench", "senha": SENHA})
+    return {"Authorization": f"Bearer {resposta.json()['access_token']}"}
+
+
+def _resumo(itens: int, duracoes: list) -> dict:
+    duracoes.sort()
+    return {
+        "itens/s": round(itens / sum(duracoes), 1),
+        "p50 ms": round(statistics.median(duracoes) * 1000, 1),
+        "p95 ms": round(duracoes[int(len(duracoes) * 0.95)] * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--escala", type=int, default=1)
+    parser.add_argument("--itens", type=int, default=1000, help="itens por remessa")
+    parser.add_argument("--remessas", type=int, default=10, help="remessas medidas por etapa")
+    args = parser.parse_args()
+
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'carga.sqlite')}")
+    os.environ.setdefault("DB_ECHO", "false")
+    subprocess.run(
+        [sys.executable, os.path.join(RAIZ, "app", "migrate.py"), "upgrade"],
+        env=_ambiente(), check=True, stdout=subprocess.DEVNULL
+    )
+    ids = _preparar(args.escala)
+    aleatorio = random.Random(42)
+
+    servidor = _subir()
+    try:
+        with httpx.Client(base_url=URL, timeout=120) as cliente:
+            for nome, perfil, rota, campo_destino, destinos in _etapas(ids):
+                headers = _entrar(cliente, perfil)
+
+                duracoes = []
+                for indice in range(args.remessas + 1):
+                    itens = [
+                        {"id_destino": aleatorio.choice(destinos), "id_lote": aleatorio.choice(ids["lote"]), "quantidade": 1}
+                        for _ in range(args.itens)
+                    ]
+                    inicio = time.perf_counter()
+                    resposta = cliente.post(f"{rota}/em-massa", headers=headers, json={"itens": itens})
+                    if resposta.status_code != 201:
+                        raise RuntimeError(f"{rota}/em-massa: {resposta.status_code} {resposta.text[:200]}")
+                    if indice:  # a primeira remessa é o aquecimento
+                        duracoes.append(time.perf_counter() - inicio)
+                print(f"{nome:20} em massa   ", _resumo(args.itens * args.remessas, duracoes))
+
+                # Uma remessa de itens, um por requisição
+                duracoes = []
+                for _ in range(args.itens):
+                    # A origem (id 0) é trocada pelo perfil de quem envia
+                    corpo = {
+                        "id_distribuidor": 0, "id_sus": 0, "id_ubs": 0, "id_paciente": 0,
+                        "id_lote": aleatorio.choice(ids["lote"]), "quantidade": 1,
+                        "data_envio": "2024-01-01T00:00:00", "status": "em transito",
+                    }
+                    corpo[campo_destino] = aleatorio.choice(destinos)
+                    inicio = time.perf_counter()
+                    resposta = cliente.post(f"{rota}/", headers=headers, json=corpo)
+                    if resposta.status_code != 201:
+                        raise RuntimeError(f"{rota}/: {resposta.status_code} {resposta.text[:200]}")
+                    duracoes.append(time.perf_counter() - inicio)
+                print(f"{nome:20} individual ", _resumo(args.itens, duracoes))
+    finally:
+        servidor.terminate()
+        servidor.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Confere, com EXPLAIN, que as consultas quentes usam os índices da migração v0003, e mede
+cada uma sem e com os índices.
+
+Grava a massa de dados (bench/massa.py), remove os índices da v0003 ("antes"), mede e
+recria os índices pela própria migração ("depois"). Ao final lista as consultas cujo plano
+não usa o índice esperado e sai com código 1 se houver alguma.
+
+    python bench/indices.py                             # SQLite temporário
+    DATABASE_URL=postgresql://... python bench/indices.py --escala 5
+
+O banco informado recebe as migrações e a massa de dados (use um banco descartável).
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Consultas das rotas, pelo índice que devem usar. Parâmetros: ids da massa de dados.
+CONSULTAS = [
+    ("ix_user_email", 'SELECT * FROM "user" WHERE email = :email', {"email": "massa-sus-0@bench"}),
+    ("ix_farmaceutica_id_usuario", "SELECT * FROM farmaceutica WHERE id_usuario = :usuario", {"usuario": 1}),
+    ("ix_sus_id_usuario", "SELECT * FROM sus WHERE id_usuario = :usuario", {"usuario": 1}),
+    ("ix_ubs_id_usuario", "SELECT * FROM ubs WHERE id_usuario = :usuario", {"usuario": 1}),
+    ("ix_paciente_id_usuario", "SELECT * FROM paciente WHERE id_usuario = :usuario", {"usuario": 1}),
+    ("ix_medicamento_id_farmaceutica", "SELECT * FROM medicamento WHERE id_farmaceutica = :farmaceutica", "farmaceutica"),
+    ("ix_lote_id_medicamento", "SELECT * FROM lote WHERE id_medicamento = :medicamento", "medicamento"),
+    ("ix_ubs_id_sus", "SELECT * FROM ubs WHERE id_sus = :sus", "sus"),
+    ("ix_paciente_id_ubs", "SELECT * FROM paciente WHERE id_ubs = :ubs", "ubs"),
+    ("ix_feedback_id_medicamento", "SELECT * FROM feedback WHERE id_medicamento = :medicamento", "medicamento"),
+    ("ix_feedback_id_paciente", "SELECT * FROM feedback WHERE id_paciente = :paciente", "paciente"),
+    ("ix_distribuidorparasus_id_lote", "SELECT * FROM distribuidorparasus WHERE id_lote = :lote", "lote"),
+    ("ix_distribuidorparasus_id_distribuidor_status",
+     "SELECT count(*) FROM distribuidorparasus WHERE id_distribuidor = :distribuidor AND status = 'em transito'", "distribuidor"),
+    ("ix_distribuidorparasus_id_sus_status",
+     "SELECT count(*) FROM distribuidorparasus WHERE id_sus = :sus AND status = 'em transito'", "sus"),
+    ("ix_susparaubs_id_lote", "SELECT * FROM susparaubs WHERE id_lote = :lote", "lote"),
+    ("ix_susparaubs_id_sus_status", "SELECT count(*) FROM susparaubs WHERE id_sus = :sus AND status = 'em transito'", "sus"),
+    ("ix_susparaubs_id_ubs_status", "SELECT count(*) FROM susparaubs WHERE id_ubs = :ubs AND status = 'em transito'", "ubs"),
+    ("ix_ubsparapaciente_id_lote", "SELECT * FROM ubsparapaciente WHERE id_lote = :lote", "lote"),
+    ("ix_ubsparapaciente_id_ubs_status",
+     "SELECT count(*) FROM ubsparapaciente WHERE id_ubs = :ubs AND status = 'em transito'", "ubs"),
+    ("ix_ubsparapaciente_id_paciente_status",
+     "SELECT count(*) FROM ubsparapaciente WHERE id_paciente = :paciente AND status = 'recebido'", "paciente"),
+]
+
+
+def _plano(conn, sql: str, parametros: dict) -> str:
+    from sqlalchemy import text
+
+    prefixo = "EXPLAIN QUERY PLAN " if conn.dialect.name == "sqlite" else "EXPLAIN "
+    linhas = conn.execute(text(prefixo + sql), parametros).all()
+    # SQLite: (id, pai, -, detalhe); PostgreSQL: uma coluna de texto por linha
+    return " | ".join(str(linha[-1]) for linha in linhas)
+
+
+def _tempo(conn, sql: str, parametros: dict, repeticoes: int) -> float:
+    """Mediana em ms"""
+    from sqlalchemy import text
+
+    latencias = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        conn.execute(text(sql), parametros).all()
+        latencias.append(time.perf_counter() - inicio)
+    return round(statistics.median(latencias) * 1000, 3)
+
+
+def _medir(conn, consultas: list, repeticoes: int) -> dict:
+    conn.exec_driver_sql("ANALYZE")
+    return {
+        indice: (_plano(conn, sql, parametros), _tempo(conn, sql, parametros, repeticoes))
+        for indice, sql, parametros in consultas
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--escala", type=int, default=1)
+    parser.add_argument("--repeticoes", type=int, default=20)
+    args = parser.parse_args()
+
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'carga.sqlite')}")
+    os.environ.setdefault("DB_ECHO", "false")
+    subprocess.run(
+        [sys.executable, os.path.join(RAIZ, "app", "migrate.py"), "upgrade"],
+        check=True, stdout=subprocess.DEVNULL
+    )
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from sqlmodel import Session
+    from massa import povoar
+    import database
+    from migrations import v0003_indices
+
+    with Session(database.engine) as session:
+        ids = povoar(session, args.escala)
+
+    # Parâmetros por entidade: um id do meio da massa
+    consultas = [
+        (indice, sql, parametros if isinstance(parametros, dict) else {
+            parametros: ids[parametros][len(ids[parametros]) // 2]
+        })
+        for indice, sql, parametros in CONSULTAS
+    ]
+
+    with database.engine.begin() as conn:
+        for nome, *_ in v0003_indices.INDICES:
+            conn.exec_driver_sql(f"DROP INDEX IF EXISTS {nome}")
+        antes = _medir(conn, consultas, args.repeticoes)
+        v0003_indices.upgrade(conn)
+        depois = _medir(conn, consultas, args.repeticoes)
+
+    sem_indice = []
+    for indice, _, _ in consultas:
+        plano, tempo_depois = depois[indice]
+        usa = indice in plano
+        if not usa:
+            sem_indice.append((indice, plano))
+        print(f"{indice:48} antes {antes[indice][1]:8.3f} ms  depois {tempo_depois:8.3f} ms  "
+              f"{'usa o índice' if usa else 'NÃO USA O ÍNDICE'}")
+
+    for indice, plano in sem_indice:
+        print(f"\n{indice}: {plano}")
+    sys.exit(1 if sem_indice else 0)
+
+
+if __name__ == "__main__":
+    main()
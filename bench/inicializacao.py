@@ -0,0 +1,121 @@
+"""
+Mede a partida a frio de um worker: importação da aplicação, startup do lifespan e o tempo
+até o uvicorn responder à primeira requisição. Cada medição roda em um processo novo.
+
+Compara o padrão (esquema aplicado no deploy, por python app/migrate.py upgrade) com
+DB_MIGRAR_AO_INICIAR=true, em que cada worker confere e aplica as migrações ao subir. A
+coluna "create_all ms" é o custo do SQLModel.metadata.create_all que cada worker rodava
+antes das migrações, medido no mesmo processo para referência.
+
+    python bench/inicializacao.py                       # SQLite temporário
+    DATABASE_URL=postgresql://... python bench/inicializacao.py --rodadas 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PORTA = 8765
+URL = f"http://127.0.0.1:{PORTA}"
+
+
+def _ambiente(migrar: bool) -> dict:
+    return {
+        **os.environ,
+        "DB_PROFILE": "prod",
+        "DB_MIGRAR_AO_INICIAR": "true" if migrar else "false",
+        "DASHBOARD_SNAPSHOT_INTERVALO": "0",
+        "LOTE_VALIDADE_INTERVALO": "0",
+    }
+
+
+def _medir_no_processo():
+    """Roda no processo filho: importa a aplicação e executa o startup do lifespan"""
+    inicio = time.perf_counter()
+    sys.path.insert(0, os.path.join(RAIZ, "app"))
+    import main
+    importado = time.perf_counter()
+
+    async def subir():
+        async with main.app.router.lifespan_context(main.app):
+            return time.perf_counter()
+
+    pronto = asyncio.run(subir())
+
+    from sqlmodel import SQLModel
+    antes = time.perf_counter()
+    SQLModel.metadata.create_all(main.engine)
+    print(json.dumps({
+        "importacao ms": (importado - inicio) * 1000,
+        "lifespan ms": (pronto - importado) * 1000,
+        "create_all ms": (time.perf_counter() - antes) * 1000,
+    }))
+
+
+def _primeira_resposta(migrar: bool) -> float:
+    """Do início do processo do uvicorn até a primeira resposta, em ms"""
+    inicio = time.perf_counter()
+    servidor = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", os.path.join(RAIZ, "app"),
+         "--port", str(PORTA), "--log-level", "warning"],
+        env=_ambiente(migrar)
+    )
+    try:
+        while True:
+            try:
+                httpx.get(f"{URL}/docs", timeout=1)
+                return (time.perf_counter() - inicio) * 1000
+            except httpx.TransportError:
+                if time.perf_counter() - inicio > 30:
+                    raise RuntimeError("A aplicação não respondeu")
+                time.sleep(0.01)
+    finally:
+        servidor.terminate()
+        servidor.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rodadas", type=int, default=10)
+    parser.add_argument("--filho", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.filho:
+        _medir_no_processo()
+        return
+
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'carga.sqlite')}")
+    os.environ.setdefault("DB_ECHO", "false")
+    subprocess.run(
+        [sys.executable, os.path.join(RAIZ, "app", "migrate.py"), "upgrade"],
+        env=_ambiente(False), check=True, stdout=subprocess.DEVNULL
+    )
+
+    for migrar in (False, True):
+        medicoes = []
+        for _ in range(args.rodadas):
+            saida = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--filho"],
+                env=_ambiente(migrar), check=True, capture_output=True, text=True
+            ).stdout
+            medicao = json.loads(saida.strip().splitlines()[-1])
+            medicao["primeira resposta ms"] = _primeira_resposta(migrar)
+            medicoes.append(medicao)
+
+        resultado = {
+            chave: round(statistics.median(medicao[chave] for medicao in medicoes), 1)
+            for chave in medicoes[0]
+        }
+        print(f"DB_MIGRAR_AO_INICIAR={'true ' if migrar else 'false'}", resultado)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Mede a vazão de /auth/login para cada custo do scrypt (SENHA_SCRYPT_N).
+
+Para cada custo sobe a aplicação (uvicorn, um worker), cadastra um usuário com hash desse
+custo e dispara logins concorrentes, medindo vazão e latência. Ajuda a escolher o maior
+custo que ainda atende ao pico de logins esperado por worker.
+
+    python bench/login_senhas.py                        # SQLite temporário, N = 2^14..2^16
+    python bench/login_senhas.py --custos 16384 65536 --logins 500 --concorrencia 50
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PORTA = 8765
+URL = f"http://127.0.0.1:{PORTA}"
+
+
+def _ambiente(custo: int) -> dict:
+    return {
+        **os.environ,
+        "DB_PROFILE": "prod",
+        "SENHA_SCRYPT_N": str(custo),
+        "DASHBOARD_SNAPSHOT_INTERVALO": "0",
+        "LOTE_VALIDADE_INTERVALO": "0",
+    }
+
+
+def _subir(custo: int) -> subprocess.Popen:
+    servidor = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", os.path.join(RAIZ, "app"),
+         "--port", str(PORTA), "--timeout-keep-alive", "60", "--log-level", "warning"],
+        env=_ambiente(custo)
+    )
+    for _ in range(100):
+        try:
+            httpx.get(f"{URL}/docs", timeout=1)
+            return servidor
+        except httpx.TransportError:
+            time.sleep(0.2)
+    servidor.kill()
+    raise RuntimeError("A aplicação não respondeu")
+
+
+async def _carga(email: str, logins: int, concorrencia: int) -> dict:
+    latencias = []
+    erros = 0
+    semaforo = asyncio.Semaphore(concorrencia)
+    limites = httpx.Limits(max_connections=concorrencia, max_keepalive_connections=concorrencia)
+    corpo = {"email": email, "senha": "carga"}
+
+    async with httpx.AsyncClient(base_url=URL, limits=limites, timeout=120) as cliente:
+        async def entrar():
+            nonlocal erros
+            async with semaforo:
+                inicio = time.perf_counter()
+                try:
+                    resposta = await cliente.post("/auth/login", json=corpo)
+                except httpx.TransportError:
+                    erros += 1
+                    return
+                latencias.append(time.perf_counter() - inicio)
+                if resposta.status_code != 200:
+                    erros += 1
+
+        inicio = time.perf_counter()
+        await asyncio.gather(*(entrar() for _ in range(logins)))
+        duracao = time.perf_counter() - inicio
+
+    latencias.sort()
+    return {
+        "logins/s": round(logins / duracao, 1),
+        "p50 ms": round(statistics.median(latencias) * 1000, 1),
+        "p95 ms": round(latencias[int(len(latencias) * 0.95)] * 1000, 1),
+        "erros": erros,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--custos", type=int, nargs="+", default=[2 ** 14, 2 ** 15, 2 ** 16])
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concorrencia", type=int, default=20)
+    args = parser.parse_args()
+
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'carga.sqlite')}")
+    subprocess.run(
+        [sys.executable, os.path.join(RAIZ, "app", "migrate.py"), "upgrade"],
+        env=_ambiente(args.custos[0]), check=True, stdout=subprocess.DEVNULL
+    )
+
+    for custo in args.custos:
+        servidor = _subir(custo)
+        try:
+            # Um usuário por custo, para que o hash guardado já tenha o custo medido
+            email = f"bench-login-{custo}@carga"
+            httpx.post(f"{URL}/auth/register", timeout=30, json={
+                "nome": email, "email": email, "senha": "carga", "tipo": "paciente"
+            })
+            asyncio.run(_carga(email, 10, args.concorrencia))  # aquecimento
+            resultado = asyncio.run(_carga(email, args.logins, args.concorrencia))
+        finally:
+            servidor.terminate()
+            servidor.wait()
+        print(f"SENHA_SCRYPT_N={custo}", resultado)
+
+
+if __name__ == "__main__":
+    main()
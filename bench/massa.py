@@ -0,0 +1,142 @@
+"""
+Massa de dados para os benchmarks: a cadeia inteira (farmacêuticas até pacientes), com
+movimentações em todas as etapas e o estoque reconstruído a partir delas.
+
+Usado pelos scripts de bench/ depois de aplicar as migrações ao banco de DATABASE_URL.
+Todos os usuários entram com o e-mail massa-<tipo>-<n>@bench e a senha SENHA.
+"""
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(RAIZ, "app"))
+
+SENHA = "carga"
+
+from sqlalchemy import insert
+from sqlmodel import Session
+
+from models import (
+    User, Farmaceutica, Medicamento, Lote, Distribuidor, SUS, UBS, Paciente,
+    DistribuidorParaSUS, SUSParaUBS, UBSParaPaciente, Feedback
+)
+from auth.senhas import gerar_hash
+from services.estoque import recalcular_estoque
+from services.validade import situacao_validade
+
+
+def _inserir(session: Session, modelo, chave, linhas: list) -> list:
+    """Insere as linhas em lote e devolve as chaves geradas, na ordem das linhas"""
+    if not linhas:
+        return []
+    return list(session.scalars(
+        insert(modelo).returning(chave, sort_by_parameter_order=True), linhas
+    ))
+
+
+def _usuarios(session: Session, tipo: str, quantidade: int, senha_hash: str) -> list:
+    return _inserir(session, User, User.id, [
+        {"nome": f"massa-{tipo}-{i}", "email": f"massa-{tipo}-{i}@bench", "senha_hash": senha_hash,
+         "tipo": tipo, "ativo": True, "versao_token": 0}
+        for i in range(quantidade)
+    ])
+
+
+def povoar(session: Session, escala: int = 1, semente: int = 42) -> dict:
+    """
+    Grava a massa (escala 1: 1000 lotes, 1000 pacientes e 30 mil movimentações) e devolve
+    os ids gerados por entidade. Cada movimentação tem metade de chance de estar recebida.
+    """
+    aleatorio = random.Random(semente)
+    agora = datetime.now()
+    # Um hash só para todos: o custo do scrypt não entra na gravação da massa
+    senha_hash = gerar_hash(SENHA)
+
+    farmaceuticas = _inserir(session, Farmaceutica, Farmaceutica.id_farmaceutica, [
+        {"nome": f"F{i}", "cnpj": f"massa-{i}", "contato": "c", "id_usuario": id_usuario}
+        for i, id_usuario in enumerate(_usuarios(session, "farmaceutica", 5 * escala, senha_hash))
+    ])
+    medicamentos = _inserir(session, Medicamento, Medicamento.id_medicamento, [
+        {"nome": f"M{i}", "preco": 1, "alto_custo": False, "id_farmaceutica": id_farmaceutica}
+        for id_farmaceutica in farmaceuticas for i in range(20)
+    ])
+    # Alguns vencidos e alguns perto do vencimento
+    vencimentos = [
+        (id_medicamento, i, agora + timedelta(days=aleatorio.randint(-60, 720)))
+        for id_medicamento in medicamentos for i in range(10)
+    ]
+    lotes = _inserir(session, Lote, Lote.id_lote, [
+        {
+            "codigo_lote": f"L{id_medicamento}-{i}", "data_fabricacao": agora - timedelta(days=400),
+            "data_vencimento": vencimento, "quantidade": 10_000, "id_medicamento": id_medicamento,
+            "situacao_validade": situacao_validade(vencimento, agora)
+        }
+        for id_medicamento, i, vencimento in vencimentos
+    ])
+    distribuidores = _inserir(session, Distribuidor, Distribuidor.id_distribuidor, [
+        {"nome": f"D{i}", "localizacao": "x", "contato": "c", "id_usuario": id_usuario}
+        for i, id_usuario in enumerate(_usuarios(session, "distribuidor", 5 * escala, senha_hash))
+    ])
+    sus = _inserir(session, SUS, SUS.id_sus, [
+        {"regiao": f"R{i}", "contato_gestor": "c", "nome_gestor": "n", "id_usuario": id_usuario}
+        for i, id_usuario in enumerate(_usuarios(session, "sus", 10 * escala, senha_hash))
+    ])
+    sus_da_ubs = [id_sus for id_sus in sus for _ in range(5)]
+    ubs = _inserir(session, UBS, UBS.id_ubs, [
+        {"nome": f"U{i}", "contato": "c", "endereco": "e", "id_sus": id_sus, "id_usuario": id_usuario}
+        for i, (id_sus, id_usuario) in enumerate(zip(sus_da_ubs, _usuarios(session, "ubs", len(sus_da_ubs), senha_hash)))
+    ])
+    ubs_do_paciente = [id_ubs for id_ubs in ubs for _ in range(20)]
+    pacientes = _inserir(session, Paciente, Paciente.id_paciente, [
+        {"nome": f"P{i}", "sobrenome": "S", "cpf": f"massa-{i}", "contato": "c",
+         "id_ubs": id_ubs, "id_usuario": id_usuario}
+        for i, (id_ubs, id_usuario) in enumerate(
+            zip(ubs_do_paciente, _usuarios(session, "paciente", len(ubs_do_paciente), senha_hash))
+        )
+    ])
+
+    def etapa(**campos) -> dict:
+        recebido = aleatorio.random() < 0.5
+        envio = agora - timedelta(days=aleatorio.randint(0, 30))
+        return {
+            **campos, "quantidade": 1, "data_envio": envio,
+            "data_recebimento": envio + timedelta(days=1) if recebido else None,
+            "status": "recebido" if recebido else "em transito",
+        }
+
+    movimentacoes = 10_000 * escala
+    _inserir(session, DistribuidorParaSUS, DistribuidorParaSUS.id_dps, [
+        etapa(id_distribuidor=aleatorio.choice(distribuidores), id_sus=aleatorio.choice(sus),
+              id_lote=aleatorio.choice(lotes))
+        for _ in range(movimentacoes)
+    ])
+    _inserir(session, SUSParaUBS, SUSParaUBS.id_spu, [
+        etapa(id_sus=id_sus, id_ubs=id_ubs, id_lote=aleatorio.choice(lotes))
+        for id_sus, id_ubs in (
+            (sus_da_ubs[indice], ubs[indice])
+            for indice in (aleatorio.randrange(len(ubs)) for _ in range(movimentacoes))
+        )
+    ])
+    _inserir(session, UBSParaPaciente, UBSParaPaciente.id_upp, [
+        etapa(id_ubs=id_ubs, id_paciente=id_paciente, id_lote=aleatorio.choice(lotes))
+        for id_ubs, id_paciente in (
+            (ubs_do_paciente[indice], pacientes[indice])
+            for indice in (aleatorio.randrange(len(pacientes)) for _ in range(movimentacoes))
+        )
+    ])
+    _inserir(session, Feedback, Feedback.id_feedback, [
+        {"comentario": "c", "tipo": "elogio", "id_paciente": aleatorio.choice(pacientes),
+         "id_medicamento": aleatorio.choice(medicamentos), "data": agora}
+        for _ in range(movimentacoes // 10)
+    ])
+
+    recalcular_estoque(session)
+    session.commit()
+    return {
+        "farmaceutica": farmaceuticas, "distribuidor": distribuidores, "sus": sus,
+        "ubs": ubs, "paciente": pacientes, "medicamento": medicamentos, "lote": lotes,
+        # Vínculos: SUS de cada UBS e UBS de cada paciente, na ordem das listas acima
+        "sus_da_ubs": sus_da_ubs, "ubs_do_paciente": ubs_do_paciente,
+    }
@@ -0,0 +1,89 @@
+import os
+import sys
+import tempfile
+
+# Banco dos testes: TEST_DATABASE_URL (ex.: um PostgreSQL descartável) ou um SQLite temporário.
+# Precisa estar definido antes de importar a aplicação.
+os.environ["DATABASE_URL"] = os.getenv(
+    "TEST_DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'testes.sqlite')}"
+)
+os.environ.setdefault("DB_ECHO", "false")
+os.environ.setdefault("SENHA_SCRYPT_N", "1024")
+os.environ.setdefault("DASHBOARD_SNAPSHOT_INTERVALO", "0")
+os.environ.setdefault("LOTE_VALIDADE_INTERVALO", "0")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "app"))
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import SQLModel, Session, select
+
+import database
+import main
+from auth.dependencies import cache_perfis, cache_usuarios, cache_versoes
+from migrations import aplicar_migracoes, schema_migracoes
+from models import Distribuidor, User
+
+
+@pytest.fixture
+def client():
+    """Cliente da aplicação sobre um banco recriado do zero pelas migrações, como no deploy"""
+    SQLModel.metadata.drop_all(database.engine)
+    schema_migracoes.drop(database.engine, checkfirst=True)
+    aplicar_migracoes(database.engine)
+    for cache in (cache_usuarios, cache_perfis, cache_versoes):
+        cache.clear()
+    with TestClient(main.app) as cliente:
+        yield cliente
+
+
+def registrar(client, email: str, tipo: str, perfil=None) -> dict:
+    """Cadastra e autentica um usuário; perfil: (rota, corpo) do cadastro do perfil"""
+    client.post("/auth/register", json={"nome": email, "email": email, "senha": "x", "tipo": tipo})
+    resposta = client.post("/auth/login", json={"email": email, "senha": "x"})
+    headers = {"Authorization": f"Bearer {resposta.json()['access_token']}"}
+    if perfil:
+        rota, corpo = perfil
+        resposta = client.post(rota, headers=headers, json=corpo)
+        assert resposta.status_code < 300, resposta.text
+    return headers
+
+
+@pytest.fixture
+def cenario(client):
+    """Farmacêutica com um medicamento e dois lotes de 1000 unidades, um distribuidor e um SUS"""
+    farmaceutica = registrar(client, "f@teste", "farmaceutica", ("/farmaceuticas/", {"nome": "F", "cnpj": "1", "contato": "c"}))
+    distribuidor = registrar(client, "d@teste", "distribuidor")
+    with Session(database.engine) as session:
+        usuario = session.exec(select(User).where(User.email == "d@teste")).one()
+        usuario.ativo = True
+        session.add(usuario)
+        session.add(Distribuidor(nome="D", localizacao="x", contato="c", id_usuario=usuario.id))
+        session.commit()
+    sus = registrar(client, "s@teste", "sus", ("/sus/", {"regiao": "R", "contato_gestor": "c", "nome_gestor": "n"}))
+
+    medicamento = client.post(
+        "/medicamentos/", headers=farmaceutica,
+        json={"nome": "M", "preco": 1, "alto_custo": False, "id_farmaceutica": 0}
+    ).json()
+    lotes = [
+        client.post("/lotes/", headers=farmaceutica, json={
+            "codigo_lote": codigo, "data_fabricacao": "2024-01-01T00:00:00",
+            "data_vencimento": "2099-01-01T00:00:00", "quantidade": 1000,
+            "id_medicamento": medicamento["id_medicamento"]
+        }).json()
+        for codigo in ("L1", "L2")
+    ]
+    return {"farmaceutica": farmaceutica, "distribuidor": distribuidor, "sus": sus, "lotes": lotes}
+
+
+@pytest.fixture
+def admin(client):
+    """Headers de um administrador ativo"""
+    headers = registrar(client, "a@teste", "admin")
+    with Session(database.engine) as session:
+        usuario = session.exec(select(User).where(User.email == "a@teste")).one()
+        usuario.ativo = True
+        session.add(usuario)
+        session.commit()
+    cache_usuarios.clear()
+    return headers
@@ -0,0 +1,52 @@
+from sqlmodel import Session, select
+
+import database
+from auth import dependencies
+from conftest import registrar
+from models import Distribuidor, User
+
+
+def _ativar_em_outro_processo(email: str):
+    """Ativa o usuário direto no banco, sem invalidar os caches deste processo"""
+    with Session(database.engine) as session:
+        usuario = session.exec(select(User).where(User.email == email)).one()
+        usuario.ativo = True
+        session.add(usuario)
+        session.add(Distribuidor(nome="D", localizacao="x", contato="c", id_usuario=usuario.id))
+        session.commit()
+
+
+def test_usuario_inativo_nao_fica_em_cache(client):
+    headers = registrar(client, "d@teste", "distribuidor")
+    assert client.get("/dashboard/distribuidor/logistica", headers=headers).status_code == 403
+
+    _ativar_em_outro_processo("d@teste")
+    assert client.get("/dashboard/distribuidor/logistica", headers=headers).status_code == 200
+
+
+def test_modo_stateless_nao_usa_dados_mutaveis_do_token(client, monkeypatch):
+    monkeypatch.setattr(dependencies, "AUTH_STATELESS", True)
+    headers = registrar(client, "d@teste", "distribuidor")
+    assert client.get("/dashboard/distribuidor/logistica", headers=headers).status_code == 403
+
+    _ativar_em_outro_processo("d@teste")
+    assert client.get("/dashboard/distribuidor/logistica", headers=headers).status_code == 200
+
+    with Session(database.engine) as session:
+        usuario = session.exec(select(User).where(User.email == "d@teste")).one()
+        usuario.nome = "Novo nome"
+        session.add(usuario)
+        session.commit()
+        dependencies.invalidar_usuario(usuario.id)
+    assert client.get("/auth/me", headers=headers).json()["nome"] == "Novo nome"
+
+
+def test_trocar_senha_revoga_os_tokens(client):
+    headers = registrar(client, "p@teste", "paciente")
+    resposta = client.post("/auth/change-password", headers=headers, params={"old_password": "y", "new_password": "z"})
+    assert resposta.status_code == 400
+
+    resposta = client.post("/auth/change-password", headers=headers, params={"old_password": "x", "new_password": "z"})
+    assert resposta.status_code == 200
+    assert client.get("/auth/me", headers=headers).status_code == 401
+    assert client.post("/auth/login", json={"email": "p@teste", "senha": "z"}).status_code == 200
@@ -0,0 +1,31 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlmodel import Session, select
+
+import database
+from models import Estoque
+
+
+def test_confirmacoes_concorrentes_creditam_uma_vez(client, cenario):
+    id_lote = cenario["lotes"][0]["id_lote"]
+    resposta = client.post("/distribuidores-sus/", headers=cenario["distribuidor"], json={
+        "id_distribuidor": 0, "id_sus": 1, "id_lote": id_lote,
+        "quantidade": 50, "data_envio": "2024-01-01T00:00:00", "status": "x"
+    })
+    id_dps = resposta.json()["id_dps"]
+
+    def confirmar(_) -> str:
+        return client.post(f"/distribuidores-sus/{id_dps}/confirmar", headers=cenario["sus"]).json()["message"]
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        mensagens = list(executor.map(confirmar, range(16)))
+
+    assert mensagens.count("Recebimento confirmado com sucesso") == 1
+
+    with Session(database.engine) as session:
+        saldos = {
+            estoque.tipo_detentor: (estoque.quantidade, estoque.em_transito)
+            for estoque in session.exec(select(Estoque).where(Estoque.id_lote == id_lote)).all()
+        }
+    assert saldos["sus"] == (50, 0)
+    assert saldos["distribuidor"] == (0, 0)
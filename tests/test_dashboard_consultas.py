@@ -0,0 +1,95 @@
+import pytest
+from sqlalchemy import event
+from sqlmodel import Session, delete
+
+import database
+from models import DashboardSnapshot
+from conftest import registrar
+
+# Máximo de comandos SQL por chamada, com o snapshot recalculado na hora (o pior caso),
+# já contando autenticação e perfil
+DASHBOARDS = [
+    ("/dashboard/farmaceutica/overview", "farmaceutica", 3),
+    ("/dashboard/distribuidor/logistica", "distribuidor", 5),
+    ("/dashboard/sus/gerencial", "sus", 4),
+    ("/dashboard/ubs/estoque", "ubs", 4),
+    ("/dashboard/paciente/meus-medicamentos", "paciente", 4),
+]
+
+
+class Contador:
+    """Conta os comandos enviados ao banco enquanto ativo"""
+
+    def __init__(self):
+        self.total = 0
+        # Com DB_ASYNC as rotas quentes consultam pelo engine assíncrono
+        self.engines = [database.engine]
+        if database.async_engine is not None:
+            self.engines.append(database.async_engine.sync_engine)
+
+    def __call__(self, *args, **kwargs):
+        self.total += 1
+
+    def __enter__(self):
+        for engine in self.engines:
+            event.listen(engine, "before_cursor_execute", self)
+        return self
+
+    def __exit__(self, *args):
+        for engine in self.engines:
+            event.remove(engine, "before_cursor_execute", self)
+
+
+def _movimentar(client, cenario: dict, entregas: int):
+    """Leva unidades do lote por toda a cadeia; o paciente recebe metade das entregas"""
+    id_lote = cenario["lotes"][0]["id_lote"]
+    etapas = [
+        ("/distribuidores-sus", "id_dps", "distribuidor", "sus"),
+        ("/sus-ubs", "id_spu", "sus", "ubs"),
+        ("/ubs-pacientes", "id_upp", "ubs", "paciente"),
+    ]
+    for rota, chave, origem, destino in etapas:
+        resposta = client.post(f"{rota}/em-massa", headers=cenario[origem], json={"itens": [
+            {"id_destino": 1, "id_lote": id_lote, "quantidade": 1} for _ in range(entregas)
+        ]})
+        assert resposta.status_code == 201, resposta.text
+        ids = [movimentacao[chave] for movimentacao in resposta.json()]
+        if destino == "paciente":
+            ids = ids[::2]
+        resposta = client.post(f"{rota}/confirmar", headers=cenario[destino], json={"ids": ids})
+        assert resposta.status_code == 200, resposta.text
+
+
+def _consultas(client, url: str, headers: dict) -> int:
+    """Comandos de uma chamada ao dashboard, sem snapshot pronto"""
+    with Session(database.engine) as session:
+        session.exec(delete(DashboardSnapshot))
+        session.commit()
+    with Contador() as contador:
+        resposta = client.get(url, headers=headers)
+    assert resposta.status_code == 200, resposta.text
+    return contador.total
+
+
+@pytest.fixture
+def cadeia(client, cenario):
+    """Cenário com UBS e paciente"""
+    cenario["ubs"] = registrar(client, "u@teste", "ubs", ("/ubs/", {"nome": "U", "contato": "c", "endereco": "e", "id_sus": 1}))
+    cenario["paciente"] = registrar(client, "p@teste", "paciente", (
+        "/pacientes/", {"nome": "P", "sobrenome": "S", "cpf": "1", "contato": "c", "id_ubs": 1}
+    ))
+    return cenario
+
+
+@pytest.mark.parametrize("url, perfil, limite", DASHBOARDS)
+def test_consultas_por_dashboard_nao_crescem_com_os_dados(client, cadeia, url, perfil, limite):
+    headers = cadeia[perfil]
+    client.get(url, headers=headers)  # aquece os caches de usuário e perfil
+
+    _movimentar(client, cadeia, 2)
+    poucos = _consultas(client, url, headers)
+    _movimentar(client, cadeia, 20)
+    muitos = _consultas(client, url, headers)
+
+    assert poucos == muitos
+    assert muitos <= limite
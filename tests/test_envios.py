@@ -0,0 +1,19 @@
+from conftest import registrar
+
+
+def test_sus_so_envia_para_ubs_da_propria_regiao(client, cenario):
+    outro_sus = registrar(client, "s2@teste", "sus", ("/sus/", {"regiao": "R2", "contato_gestor": "c", "nome_gestor": "n"}))
+    registrar(client, "u@teste", "ubs", ("/ubs/", {"nome": "U", "contato": "c", "endereco": "e", "id_sus": 1}))
+    id_lote = cenario["lotes"][0]["id_lote"]
+
+    individual = client.post("/sus-ubs/", headers=outro_sus, json={
+        "id_sus": 0, "id_ubs": 1, "id_lote": id_lote, "quantidade": 1, "data_envio": "2024-01-01T00:00:00", "status": "x"
+    })
+    em_massa = client.post("/sus-ubs/em-massa", headers=outro_sus, json={"itens": [
+        {"id_destino": 1, "id_lote": id_lote, "quantidade": 1}
+    ]})
+
+    assert individual.status_code == 400
+    assert individual.json()["detail"] == "UBS não encontrada na região deste SUS"
+    assert em_massa.status_code == 400
+    assert em_massa.json()["detail"] == [{"item": 0, "erro": "UBS não encontrada na região deste SUS"}]
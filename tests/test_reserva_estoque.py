@@ -0,0 +1,79 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlmodel import Session, func, select
+
+import database
+from models import DistribuidorParaSUS, Estoque, Lote
+from services.estoque import DETENTOR_LOTE
+
+
+def _saldo(session: Session, tipo_detentor: str, id_lote: int) -> tuple:
+    """(quantidade, em_transito) somados dos detentores do tipo no lote"""
+    return session.exec(
+        select(func.coalesce(func.sum(Estoque.quantidade), 0), func.coalesce(func.sum(Estoque.em_transito), 0))
+        .where(Estoque.tipo_detentor == tipo_detentor, Estoque.id_lote == id_lote)
+    ).one()
+
+
+@pytest.mark.skipif(
+    not os.getenv("TEST_DATABASE_URL", "").startswith("postgresql"),
+    reason="Concorrência real só no PostgreSQL: defina TEST_DATABASE_URL"
+)
+def test_envios_concorrentes_nao_ultrapassam_o_saldo(client, cenario):
+    """Envios individuais e em massa, em paralelo, sobre os mesmos dois lotes"""
+    headers = cenario["distribuidor"]
+    id_a, id_b = (lote["id_lote"] for lote in cenario["lotes"])
+
+    def enviar(indice: int) -> int:
+        if indice % 3 == 0:
+            resposta = client.post("/distribuidores-sus/em-massa", headers=headers, json={"itens": [
+                {"id_destino": 1, "id_lote": id_b, "quantidade": 4},
+                {"id_destino": 1, "id_lote": id_a, "quantidade": 3},
+            ]})
+        else:
+            resposta = client.post("/distribuidores-sus/", headers=headers, json={
+                "id_distribuidor": 0, "id_sus": 1, "id_lote": id_a if indice % 2 else id_b,
+                "quantidade": 7, "data_envio": "2024-01-01T00:00:00", "status": "x"
+            })
+        return resposta.status_code
+
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        codigos = list(executor.map(enviar, range(400)))
+
+    assert set(codigos) <= {201, 409}
+    assert codigos.count(409) > 0
+
+    with Session(database.engine) as session:
+        for id_lote in (id_a, id_b):
+            enviado = session.exec(
+                select(func.coalesce(func.sum(DistribuidorParaSUS.quantidade), 0))
+                .where(DistribuidorParaSUS.id_lote == id_lote)
+            ).one()
+            disponivel, _ = _saldo(session, DETENTOR_LOTE, id_lote)
+            _, em_transito = _saldo(session, "distribuidor", id_lote)
+
+            assert enviado <= 1000
+            assert disponivel == 1000 - enviado >= 0
+            assert em_transito == enviado
+            assert session.get(Lote, id_lote).quantidade == 1000
+
+
+def test_alterar_lote_preserva_o_que_ja_foi_enviado(client, cenario):
+    lote = cenario["lotes"][0]
+    resposta = client.post("/distribuidores-sus/", headers=cenario["distribuidor"], json={
+        "id_distribuidor": 0, "id_sus": 1, "id_lote": lote["id_lote"],
+        "quantidade": 600, "data_envio": "2024-01-01T00:00:00", "status": "x"
+    })
+    assert resposta.status_code == 201
+
+    corpo = {campo: lote[campo] for campo in ("codigo_lote", "data_fabricacao", "data_vencimento", "id_medicamento")}
+    resposta = client.put(f"/lotes/{lote['id_lote']}", headers=cenario["farmaceutica"], json={**corpo, "quantidade": 500})
+    assert resposta.status_code == 409
+
+    resposta = client.put(f"/lotes/{lote['id_lote']}", headers=cenario["farmaceutica"], json={**corpo, "quantidade": 1200})
+    assert resposta.status_code == 200
+
+    with Session(database.engine) as session:
+        assert _saldo(session, DETENTOR_LOTE, lote["id_lote"]) == (600, 0)
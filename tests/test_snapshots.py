@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta
+
+from sqlmodel import Session, select, update
+
+import database
+from models import DashboardSnapshot
+from services import snapshots
+from services.snapshots import ESCOPO_ADMIN, atualizar_snapshots
+
+
+def _sujos(painel: str) -> dict:
+    with Session(database.engine) as session:
+        return {
+            snapshot.id_escopo: snapshot.sujo
+            for snapshot in session.exec(select(DashboardSnapshot).where(DashboardSnapshot.painel == painel)).all()
+        }
+
+
+def _alterar_lote(client, cenario, lote: dict):
+    corpo = {campo: lote[campo] for campo in ("codigo_lote", "data_fabricacao", "id_medicamento", "quantidade")}
+    resposta = client.put(f"/lotes/{lote['id_lote']}", headers=cenario["farmaceutica"], json={
+        **corpo, "data_vencimento": "2000-01-01T00:00:00"
+    })
+    assert resposta.status_code == 200, resposta.text
+
+
+def test_alterar_lote_marca_so_os_sus_com_estoque_dele(client, cenario, admin):
+    lote_recebido, lote_parado = cenario["lotes"]
+    resposta = client.post("/distribuidores-sus/", headers=cenario["distribuidor"], json={
+        "id_distribuidor": 0, "id_sus": 1, "id_lote": lote_recebido["id_lote"],
+        "quantidade": 10, "data_envio": "2024-01-01T00:00:00", "status": "x"
+    })
+    client.post(f"/distribuidores-sus/{resposta.json()['id_dps']}/confirmar", headers=cenario["sus"])
+
+    client.get("/dashboard/sus/gerencial", headers=cenario["sus"])
+    client.get("/dashboard/sus/gerencial", headers=admin)
+    with Session(database.engine) as session:
+        atualizar_snapshots(session)
+    assert _sujos("sus") == {1: False, ESCOPO_ADMIN: False}
+
+    _alterar_lote(client, cenario, lote_parado)
+    assert _sujos("sus") == {1: False, ESCOPO_ADMIN: False}
+
+    _alterar_lote(client, cenario, lote_recebido)
+    assert _sujos("sus") == {1: True, ESCOPO_ADMIN: False}
+
+
+def test_atualizacao_prioriza_sujos_e_ignora_snapshots_nao_lidos(client, cenario):
+    client.get("/dashboard/farmaceutica/overview", headers=cenario["farmaceutica"])
+    client.get("/dashboard/sus/gerencial", headers=cenario["sus"])
+    client.get("/dashboard/distribuidor/logistica", headers=cenario["distribuidor"])
+
+    velho = datetime.now() - timedelta(days=1)
+    with Session(database.engine) as session:
+        session.exec(update(DashboardSnapshot).values(atualizado_em=velho))
+        session.exec(update(DashboardSnapshot).where(DashboardSnapshot.painel == "distribuidor").values(sujo=True))
+        session.commit()
+    snapshots._lidos.clear()
+    client.get("/dashboard/sus/gerencial", headers=cenario["sus"])
+
+    with Session(database.engine) as session:
+        # O sujo vem antes do velho lido; o velho que ninguém leu fica para quando for lido
+        assert atualizar_snapshots(session, limite=1) == 1
+        assert _sujos("distribuidor") == {1: False}
+        assert atualizar_snapshots(session) == 1
+        atualizados = {
+            snapshot.painel: snapshot.atualizado_em > velho
+            for snapshot in session.exec(select(DashboardSnapshot)).all()
+        }
+    assert atualizados == {"farmaceutica": False, "sus": True, "distribuidor": True}